@@ -3,13 +3,32 @@
 import streamlit as st
 import pandas as pd
 import plotly.express as px
-from plotly.subplots import make_subplots
 import plotly.graph_objects as go
 import matplotlib.pyplot as plt
 import altair as alt
+import numpy as np
 from typing import Tuple, List, Dict
 import os
 
+from dashboard.backtest import Backtester, composite_signals, metric_signals, screen_signals
+from dashboard.correlation import CorrelationEngine
+from dashboard.cube import MetricCube, WideTable
+from dashboard.data_store import dataset_version, load_dataset
+from dashboard.figure_cache import FigureCache
+from dashboard.figures import (MAX_SVG_POINTS, MAX_SVG_TRACES, RENDER_MODES, create_financial_plot,
+                               create_risk_plot)
+from dashboard.filter_index import FilterIndex
+from dashboard.growth import GrowthCube
+from dashboard.layout import RowLayout
+from dashboard.leaderboard import Leaderboards, metric_direction
+from dashboard.ranking import Rankings, ordinal
+from dashboard.risk import RiskScreen
+from dashboard.rolling import RollingStats
+from dashboard.rollups import TRIM, Rollups
+from dashboard.scoring import FACTORS, CompositeScorer
+from dashboard.screener import ScreenError, Screener
+from dashboard.similarity import SimilarityIndex
+
 
 ###############################################################################
 # Page configuration
@@ -42,6 +61,9 @@ st.markdown("""
         color: green;
         font-weight: bold;
     }
+    .metric-peer {
+        font-size: 14px;
+    }
     </style>
     """, unsafe_allow_html=True)
 
@@ -55,15 +77,270 @@ current_dir = os.path.dirname(__file__)
 data_path = os.path.join(current_dir, 'cleaned_data.csv') 
 
 # Function to load the dataset
-@st.cache_data
-def load_data() -> pd.DataFrame:
+@st.cache_resource
+def load_data(version: str) -> pd.DataFrame:
     """
     Loads data from a CSV file named 'cleaned_data.csv'.
 
+    The CSV is only parsed on the very first start; later cold starts memory-map
+    the columnar snapshot that `load_dataset` keeps next to it. The label columns are
+    categoricals and `year` is an int16 (see `dashboard.data_store.SCHEMA`). The frame
+    is shared read-only by all sessions, so it must never be modified in place.
+
+    Parameters:
+    version (str): Dataset version of the CSV, used as the cache key.
+
     Returns:
     pd.DataFrame: A pandas DataFrame containing the data from the CSV file.
     """
-    return pd.read_csv(data_path)
+    return load_dataset(data_path, version)
+
+# Function to build the dense company x metric x year cube of the dataset
+@st.cache_resource
+def load_cube(version: str) -> MetricCube:
+    """
+    Builds the dense company x metric x year array of the dataset once per dataset version.
+
+    Parameters:
+    version (str): Dataset version of the CSV, used as the cache key.
+
+    Returns:
+    MetricCube: The read-only cube shared by all sessions.
+    """
+    return MetricCube.from_frame(load_data(version))
+
+# Function to materialize the wide (year, company) x metric table of the dataset
+@st.cache_resource
+def load_wide_table(version: str) -> WideTable:
+    """
+    Materializes the (year, company) x metric table once per dataset version.
+
+    Parameters:
+    version (str): Dataset version of the CSV, used as the cache key.
+
+    Returns:
+    WideTable: The wide table shared by all sessions; views of it are row selections.
+    """
+    return WideTable(load_cube(version))
+
+# Function to rank every metric in every year
+@st.cache_resource
+def load_leaderboards(version: str) -> Leaderboards:
+    """
+    Precomputes the top-10 and bottom-10 companies of every (metric, year) pair once per dataset version.
+
+    Parameters:
+    version (str): Dataset version of the CSV, used as the cache key.
+
+    Returns:
+    Leaderboards: The leaderboards shared by all sessions.
+    """
+    return Leaderboards(load_cube(version))
+
+# Function to compound the growth metrics of every company
+@st.cache_resource
+def load_growth(version: str) -> GrowthCube:
+    """
+    Accumulates the log growth factors of every company and growth metric once per dataset version.
+
+    Parameters:
+    version (str): Dataset version of the CSV, used as the cache key.
+
+    Returns:
+    GrowthCube: The CAGR of any window of years, shared by all sessions.
+    """
+    return GrowthCube(load_cube(version))
+
+# Function to compute the trailing-window statistics of every metric
+@st.cache_resource
+def load_rolling(version: str) -> RollingStats:
+    """
+    Precomputes the trailing mean, std, min, max and slope of every window length once per dataset version.
+
+    Parameters:
+    version (str): Dataset version of the CSV, used as the cache key.
+
+    Returns:
+    RollingStats: The rolling statistics of every company and metric, shared by all sessions.
+    """
+    cube = load_cube(version)
+    return RollingStats(cube, windows=range(2, len(cube.years) + 1))
+
+# Function to evaluate the risk screens over a window of years
+@st.cache_resource
+def load_risk_screen(version: str, window: int = None) -> RiskScreen:
+    """
+    Evaluates the M-score, Z-score, F-score and financial distress screens once per dataset version and window.
+
+    Parameters:
+    version (str): Dataset version of the CSV, used as the cache key.
+    window (int, optional): Number of trailing years averaged over; all years when omitted.
+
+    Returns:
+    RiskScreen: Per-company averages, flags, flagged shares and flagged companies of every screen.
+    """
+    return RiskScreen(load_cube(version), window)
+
+# Function to place every value against the universe and its sector and subsector peers
+@st.cache_resource
+def load_rankings(version: str) -> Rankings:
+    """
+    Precomputes the per-year universe, sector and subsector percentiles and the peer z-scores once per dataset version.
+
+    Parameters:
+    version (str): Dataset version of the CSV, used as the cache key.
+
+    Returns:
+    Rankings: The percentiles and z-scores of every company and metric, shared by all sessions.
+    """
+    return Rankings(load_cube(version))
+
+# Function to summarize every sector or subsector
+@st.cache_resource
+def load_rollups(version: str, level: str) -> Rollups:
+    """
+    Materializes the count, mean, median, trimmed mean and quantiles of every group once per dataset version.
+
+    Parameters:
+    version (str): Dataset version of the CSV, used as the cache key.
+    level (str): 'sector' or 'subsector'.
+
+    Returns:
+    Rollups: The group statistics of every metric and year, shared by all sessions.
+    """
+    return Rollups(load_cube(version), level)
+
+# Function to set up the cached metric correlation matrices
+@st.cache_resource
+def load_correlations(version: str) -> CorrelationEngine:
+    """
+    Creates the correlation engine of the dataset once per dataset version.
+
+    Its matrices are cached by company subset, year range and method, so they are shared by all sessions.
+
+    Parameters:
+    version (str): Dataset version of the CSV, used as the cache key.
+
+    Returns:
+    CorrelationEngine: The correlation engine shared by all sessions.
+    """
+    return CorrelationEngine(load_cube(version))
+
+# Function to build the peer similarity index of the dataset
+@st.cache_resource
+def load_similarity(version: str) -> SimilarityIndex:
+    """
+    Standardizes the metric vector of every company and year once per dataset version.
+
+    Parameters:
+    version (str): Dataset version of the CSV, used as the cache key.
+
+    Returns:
+    SimilarityIndex: The nearest-peer index shared by all sessions.
+    """
+    return SimilarityIndex(load_cube(version))
+
+# Function to standardize the composite score factors of the dataset
+@st.cache_resource
+def load_scorer(version: str) -> CompositeScorer:
+    """
+    Standardizes the valuation, quality and risk factors of every year once per dataset version.
+
+    Parameters:
+    version (str): Dataset version of the CSV, used as the cache key.
+
+    Returns:
+    CompositeScorer: The composite scorer shared by all sessions.
+    """
+    return CompositeScorer(load_cube(version))
+
+# Function to set up the backtester of the dataset
+@st.cache_resource
+def load_backtester(version: str) -> Backtester:
+    """
+    Prepares the yearly returns of every company once per dataset version.
+
+    Parameters:
+    version (str): Dataset version of the CSV, used as the cache key.
+
+    Returns:
+    Backtester: The backtester shared by all sessions.
+    """
+    return Backtester(load_cube(version))
+
+# Function to backtest every metric and portfolio size over a view, once per view
+@st.cache_data(max_entries=64)
+def load_strategy_grid(version: str, years: Tuple[int, int], companies: Tuple[str, ...] = None) -> pd.DataFrame:
+    """
+    Backtests every metric with 1 to 50 companies held, so that the widgets of the backtest section do not rerun it.
+
+    Parameters:
+    version (str): Dataset version of the CSV, used as the cache key.
+    years (Tuple[int, int]): The first and last selected year; portfolios are held from the year after the first.
+    companies (Tuple[str, ...], optional): Companies that may be held; all companies when omitted.
+
+    Returns:
+    pd.DataFrame: The table of `Backtester.grid`.
+    """
+    return load_backtester(version).grid(load_cube(version).metrics, range(1, 51), (years[0] + 1, years[1]),
+                                         None if companies is None else list(companies))
+
+# Function to set up the stock screener of the dataset
+@st.cache_resource
+def load_screener(version: str) -> Screener:
+    """
+    Creates the stock screener of the dataset once per dataset version.
+
+    Screen results are cached by normalized expression and year, so they are shared by all sessions.
+
+    Parameters:
+    version (str): Dataset version of the CSV, used as the cache key.
+
+    Returns:
+    Screener: The screener shared by all sessions.
+    """
+    return Screener(load_cube(version))
+
+# Function to set up the figure cache shared by all sessions
+@st.cache_resource
+def load_figure_cache() -> FigureCache:
+    """
+    Creates the cache of serialized figures once for all sessions.
+
+    Its keys include the dataset version, so figures of older versions age out of it.
+
+    Returns:
+    FigureCache: The figure cache shared by all sessions.
+    """
+    return FigureCache()
+
+# Function to build the sidebar filter options of the dataset
+@st.cache_resource
+def load_filter_index(version: str) -> FilterIndex:
+    """
+    Builds the sector/subsector/company hierarchy of the sidebar options once per dataset version.
+
+    Parameters:
+    version (str): Dataset version of the CSV, used as the cache key.
+
+    Returns:
+    FilterIndex: The filter index shared by all sessions.
+    """
+    return FilterIndex(load_data(version))
+
+# Function to find the company and year boundaries of the clustered dataset
+@st.cache_resource
+def load_layout(version: str) -> RowLayout:
+    """
+    Locates the rows of every (company, year) pair of the clustered dataset once per dataset version.
+
+    Parameters:
+    version (str): Dataset version of the CSV, used as the cache key.
+
+    Returns:
+    RowLayout: Slice-based row selection shared by all sessions.
+    """
+    return RowLayout(load_data(version))
 
 def get_arrow(value: float) -> str:
     """
@@ -90,25 +367,42 @@ def get_arrow_color(value: float) -> str:
     """
     return "green" if value > 0 else "red"
 
-def find_top_performer(data: pd.DataFrame, metric: str) -> pd.Series:
+def find_top_performer(leaderboards: Leaderboards, metric: str, year: int, direction: str = 'max') -> pd.Series:
     """
     Finds the top performer based on a specified metric.
 
     Parameters:
-    data (pd.DataFrame): The DataFrame containing the data.
+    leaderboards (Leaderboards): The precomputed per-year leaderboards of the dataset.
     metric (str): The metric to evaluate.
+    year (int): The year to evaluate.
+    direction (str): 'max' for the highest value, 'min' for the lowest. Default is 'max'.
 
     Returns:
-    pd.Series: The row of the DataFrame corresponding to the top performer for the specified metric.
+    pd.Series: The 'company' and 'value' of the top performer for the specified metric.
     If no data is found for the metric, a warning is displayed and None is returned.
     """
-    filtered_data = data[data['metric'] == metric].dropna(subset=['value'])
-    if not filtered_data.empty:
-        return filtered_data.loc[filtered_data['value'].idxmax()]
-    else:
+    top_performer = leaderboards.leader(metric, year, direction)
+    if top_performer is None:
         st.warning(f"No data found for the metric: {metric}")
-        return None
+    return top_performer
 
+def peer_percentile(rankings: Rankings, cube: MetricCube, company: str, metric: str, year: int) -> str:
+    """
+    Describes where a company's value stands within its sector, the best value of the metric being the 100th percentile.
+
+    Parameters:
+    rankings (Rankings): The precomputed percentiles of the dataset.
+    cube (MetricCube): The dense company x metric x year array, for the company's sector.
+    company (str): The company.
+    metric (str): The metric.
+    year (int): The year.
+
+    Returns:
+    str: E.g. '92nd pct in Information Technology'.
+    """
+    position = cube.company_index[company]
+    sector_percentile = rankings.percentile(metric, year, 'sector')[position]
+    return f"{ordinal(sector_percentile)} pct in {cube.sectors[position]}"
 
 # Function to create a donut plot
 def make_donut(input_response: float, input_text1: str, input_text2: str, input_color: Dict[str, str]) -> plt.Figure:
@@ -177,150 +471,8 @@ def make_donut(input_response: float, input_text1: str, input_text2: str, input_
     return plot_bg + plot + text
 
 
-# Define a function to create line plot for select metrics
-def create_financial_plot(
-    pivot_df: pd.DataFrame, 
-    unique_companies: List[str], 
-    color_map: Dict[str, str], 
-    metric1: str, 
-    metric2: str, 
-    years: Tuple[int, int], 
-    subplot_titles: List[str], 
-    title: str
-) -> go.Figure:
-    """
-    Create a financial plot with two subplots for the specified metrics.
-
-    This function generates a 1x2 subplot figure displaying trends for two different
-    financial metrics across a specified year range for multiple companies.
-
-    Parameters:
-        pivot_df (pd.DataFrame): DataFrame containing financial data with 'year' and 'company' columns.
-        unique_companies (List[str]): List of unique company names to plot.
-        color_map (Dict[str, str]): Dictionary mapping company names to their respective colors for the plot.
-        metric1 (str): The first metric to be plotted on the first subplot.
-        metric2 (str): The second metric to be plotted on the second subplot.
-        years (Tuple[int, int]): A tuple containing the start and end years for filtering the data.
-        subplot_titles (List[str]): List of titles for the subplots.
-        title (str): The main title for the entire figure.
-
-    Returns:
-        go.Figure: A Plotly figure object containing the subplots with the specified metrics.
-    """
-    # Create a 1x2 subplot figure 
-    fig = make_subplots(rows=1, cols=2, subplot_titles=subplot_titles)
-
-    # Filter the DataFrame for the selected year range
-    filtered_df = pivot_df[pivot_df['year'].between(years[0], years[1])]
-
-    # Add traces for the first metric (metric1)
-    for company in unique_companies:
-        company_data = filtered_df[filtered_df['company'] == company]
-        if not company_data.empty:  # Check if company_data is not empty
-            fig.add_trace(go.Scatter(
-                x=company_data['year'],
-                y=company_data[metric1],
-                mode='lines',
-                name=company,
-                legendgroup=company,
-                line=dict(color=color_map[company])
-            ), row=1, col=1)
-
-    # Add traces for the second metric (metric2)
-    for company in unique_companies:
-        company_data = filtered_df[filtered_df['company'] == company]
-        if not company_data.empty:  # Check if company_data is not empty
-            fig.add_trace(go.Scatter(
-                x=company_data['year'],
-                y=company_data[metric2],
-                mode='lines',
-                name=company,
-                legendgroup=company,
-                showlegend=False,
-                line=dict(color=color_map[company])
-            ), row=1, col=2)
-
-    # Update layout to ensure x-axis ticks are integers
-    fig.update_xaxes(tickmode='linear', dtick=1)
-
-    # Update layout title
-    fig.update_layout(
-        title_text=title,
-        showlegend=True
-    )
-
-    return fig
-
-# Define a function to calculate average m_score and companies that carries risk of manipulation
-def avoid_mrisk(df: pd.DataFrame, m_threshold: float = -1.78) -> Tuple[float, List]:
-    """
-    Identify companies with an M-score below a specified threshold and calculate the percentage of such companies.
-
-    The M-score is a measure used to detect the likelihood of earnings manipulation. This function filters companies
-    based on their average M-score and identifies those that fall below the given threshold, indicating higher risk.
-
-    Parameters:
-    df (pd.DataFrame): DataFrame containing the following columns:
-        - 'company': The name of the company.
-        - 'metric': The type of metric (should include 'mscore').
-        - 'value': The value of the metric.
-    m_threshold (float): The threshold for the M-score to identify high-risk companies. Default is -1.78.
-
-    Returns:
-    Tuple[float, pd.Series]: A tuple containing:
-        - The percentage of companies with an M-score above the threshold.
-        - A Series of companies with an M-score above the threshold.
-    """
-    # Filter the DataFrame for M-score metrics
-    m_score = df[df['metric'] == 'mscore']
-    
-    # Calculate the mean M-score for each company
-    m = m_score.groupby('company').agg({'value': 'mean'})
-    
-    # Calculate the percentage of companies with an M-score below the threshold
-    risk_company_pc = round(len(m[m['value'] > m_threshold]) * 100. / len(m), 0)
-    
-    # Identify the companies with an M-score below the threshold
-    risk_company = m[m['value'] > m_threshold].index.to_list()
-    
-    return risk_company_pc, risk_company
-
-# Define a function to calculate average z_score and companies that carries risk of bankruptcy
-def avoid_zrisk(df: pd.DataFrame, z_threshold: float = 1.81) -> Tuple[float, List]:
-    """
-    Identify companies with an Z-score below a specified threshold and calculate the percentage of such companies.
-
-    The M-score is a measure used to detect the likelihood of earnings manipulation. This function filters companies
-    based on their average Z-score and identifies those that fall below the given threshold, indicating higher risk.
-
-    Parameters:
-    df (pd.DataFrame): DataFrame containing the following columns:
-        - 'company': The name of the company.
-        - 'metric': The type of metric (should include 'zscore').
-        - 'value': The value of the metric.
-    z_threshold (float): The threshold for the Z-score to identify high-risk companies. Default is 1.81.
-
-    Returns:
-    Tuple[float, pd.Series]: A tuple containing:
-        - The percentage of companies with an Z-score below the threshold.
-        - A Series of companies with an Z-score below the threshold.
-    """
-    # Filter the DataFrame for M-score metrics
-    z_score = df[df['metric'] == 'zscore']
-    
-    # Calculate the mean M-score for each company
-    z = z_score.groupby('company').agg({'value': 'mean'})
-    
-    # Calculate the percentage of companies with an M-score below the threshold
-    risk_company_pc = round(len(z[z['value'] < z_threshold]) * 100. / len(z), 0)
-    
-    # Identify the companies with an M-score below the threshold
-    risk_company = z[z['value'] < z_threshold].index.to_list()
-    
-    return risk_company_pc, risk_company
-
 # Define a function to calculate compound annual growth rate 
-def cagr(df: pd.DataFrame, cagr_period: int = 5) -> int:
+def cagr(growth: GrowthCube, cagr_period: int = 5) -> int:
     """
     Calculate the Compound Annual Growth Rate (CAGR) based on YoY EPS growth data.
 
@@ -330,7 +482,7 @@ def cagr(df: pd.DataFrame, cagr_period: int = 5) -> int:
     assets, investment portfolios, and anything that can rise or fall in value over time.
 
     Parameters:
-    - df (pandas.DataFrame): It contains columns value, metric and year.
+    - growth (GrowthCube): The precomputed growth accumulators of the dataset (should include 'yoy_eps_growth').
     - cagr_period: The number of years we would want to calculate cgar over.
         
 
@@ -338,29 +490,72 @@ def cagr(df: pd.DataFrame, cagr_period: int = 5) -> int:
     int: The CAGR expressed as a percentage.
     """
     # Get the most recent year in the dataset
-    current_year = df['year'].max()
+    current_year = growth.years[-1]
     
-    # Filter data for the past 5 years
-    df_filtered = df[(df['metric'] == 'yoy_eps_growth') & 
-    (df['year'].isin(range(current_year - cagr_period, current_year + 1)))]
+    # Compound the average YoY EPS growth across companies over the past 5 years
+    return int(growth.universe_cagr('yoy_eps_growth', current_year - cagr_period, current_year))
+
+# Function to let the user choose how a trend figure is drawn
+def render_mode_selector(key: str) -> str:
+    """
+    Adds a control choosing the rendering mode of one trend figure.
 
-    # Group by year and calculate the average YoY EPS growth for each year
-    annual_avg_growth = df_filtered.groupby('year')['value'].mean()
+    Parameters:
+    key (str): Widget key, unique per figure.
 
-    # Calculate the cumulative growth factor
-    cumulative_growth_factor = (1 + annual_avg_growth / 100).prod()
+    Returns:
+    str: The selected mode, one of RENDER_MODES.
+    """
+    return st.radio('Rendering', RENDER_MODES, horizontal=True, key=key,
+                    format_func={'auto': 'Auto', 'svg': 'SVG', 'webgl': 'WebGL'}.get,
+                    help=f"Auto switches to WebGL above {MAX_SVG_TRACES} lines or {MAX_SVG_POINTS:,} points, "
+                         "which keeps large selections responsive.")
+
+# Function to reuse a trend figure already built for the same view, in any session
+def cached_financial_plot(
+    version: str,
+    view_years: Tuple[int, int],
+    pivot_df: pd.DataFrame,
+    unique_companies: List[str],
+    color_map: Dict[str, str],
+    metric1: str,
+    metric2: str,
+    years: Tuple[int, int],
+    subplot_titles: List[str],
+    title: str,
+    render_mode: str = 'auto'
+) -> go.Figure:
+    """
+    Returns `create_financial_plot` of a view, building it only if no session has built it before.
 
-    # Calculate the CAGR
-    n = len(annual_avg_growth)
-    cagr = cumulative_growth_factor ** (1 / n) - 1
+    Parameters:
+    version (str): Dataset version of the CSV.
+    view_years (Tuple[int, int]): The year range `pivot_df` was selected for.
+    The other parameters are those of `create_financial_plot`.
 
-    # Return the CAGR as a percentage
-    return int(cagr * 100)
+    Returns:
+    go.Figure: The figure.
+    """
+    key = FigureCache.key(version, (metric1, metric2), unique_companies, view_years,
+                          tuple(years), tuple(subplot_titles), title, render_mode)
+    return load_figure_cache().figure(key, lambda: create_financial_plot(
+        pivot_df, unique_companies, color_map, metric1, metric2, years, subplot_titles, title, render_mode))
 
 
 ######################################################################
 # Load data
-df = load_data()
+data_version = dataset_version(data_path)
+df = load_data(data_version)
+cube = load_cube(data_version)
+leaderboards = load_leaderboards(data_version)
+rankings = load_rankings(data_version)
+wide_table = load_wide_table(data_version)
+filter_index = load_filter_index(data_version)
+layout = load_layout(data_version)
+similarity = load_similarity(data_version)
+risk_screen = load_risk_screen(data_version)
+growth = load_growth(data_version)
+rolling = load_rolling(data_version)
 
 ######################################################################
 # Sidebar: Filters for sector, subsector, and company
@@ -389,6 +584,8 @@ with st.sidebar:
             - **Select Company**: Choose a specific company to analyze.
             - **Select Year Range**: Filter data from 2017 to 2023.
 
+        - Pick a section below the top KPI performers to show its charts; only that section is computed.
+
         - You can click and unclick on legends in the plot to remove or restore specific metrics for better visualization.
         
         **Data Range:** The application provides data for the years 2017 to 2023.
@@ -397,52 +594,61 @@ with st.sidebar:
         for definitions and insights into their trends.
         """)
     # Dropdown for sector selection
-    sectors = df['sector'].unique()
+    sectors = filter_index.labels['sector']
     selected_sector = st.multiselect('Select sector', sectors)
 
     # Subsector filtering based on sector selection
-    if selected_sector:
-        filtered_subsectors = df[df['sector'].isin(selected_sector)]['subsector'].unique()
-    else:
-        filtered_subsectors = df['subsector'].unique()
+    filtered_subsectors = filter_index.subsector_options(selected_sector)
     selected_subsector = st.multiselect('Select subsector', filtered_subsectors)
 
     # Company filtering based on sector and/or subsector selection
-    if selected_sector and selected_subsector:
-        filtered_companies = df[(df['sector'].isin(selected_sector)) & (df['subsector'].isin(selected_subsector))]['company'].unique()
-    elif selected_sector:
-        filtered_companies = df[df['sector'].isin(selected_sector)]['company'].unique()
-    elif selected_subsector:
-        filtered_companies = df[df['subsector'].isin(selected_subsector)]['company'].unique()
-    else:
-        filtered_companies = df['company'].unique()
-    
+    filtered_companies = filter_index.company_options(selected_sector, selected_subsector)
     selected_company = st.multiselect('Select company', filtered_companies)
 
     # Date range selector
-    years = st.slider('Select Year Range', 2017, 2023, (2017, 2023))
+    first_year, last_year = int(cube.years[0]), int(cube.years[-1])
+    years = st.slider('Select Year Range', first_year, last_year, (first_year, last_year))
+
+    # Suggest the closest peers of each selected company across all metrics of the last selected year
+    if selected_company:
+        with st.expander(f"Companies like your selection in {years[1]}", expanded=True):
+            for company in selected_company:
+                peers = similarity.query(company, years[1], k=5, exclude=selected_company)
+                if peers.empty:
+                    st.write(f"**{company}**: no data for {years[1]}")
+                else:
+                    st.write(f"**{company}**: " + ", ".join(
+                        f"{peer} ({score:.2f})" for peer, score in zip(peers['company'], peers['cosine'])))
+            st.caption("Cosine similarity of the standardized metrics; add a peer to the selection to compare it.")
+
+    # Companies passing the sector, subsector and company filters (None when no filter is applied)
+    if selected_company:
+        filter_companies = [c for c in selected_company if c in set(filtered_companies)]
+    elif selected_sector or selected_subsector:
+        filter_companies = filtered_companies
+    else:
+        filter_companies = None
 
-    # Filter dataset based on the selection, taking into account that users can select any combination
-    filtered_df = df[
-        (df['year'].between(years[0], years[1])) & 
-        (df['sector'].isin(selected_sector) if selected_sector else True) & 
-        (df['subsector'].isin(selected_subsector) if selected_subsector else True) & 
-        (df['company'].isin(selected_company) if selected_company else True)
-    ]
+    # Filter dataset based on the selection, taking into account that users can select any combination;
+    # the rows of a company are contiguous, so this is a slice whenever the selection allows it
+    view_years = years
+    filtered_df = layout.select(filter_companies, view_years)
 
     # Only fallback to top 5 companies if no specific filters are applied, and filtered_df would otherwise be empty
     if filtered_df.empty:
         if not selected_sector and not selected_subsector and not selected_company:
             st.write(f"Displaying the top 5 companies for the year {years[1]} based on YoY revenue growth:")
-            top_companies = df[(df['metric'] == 'yoy_revenue_growth') & (df['year'] == years[1])].nlargest(5, 'value')['company']
-            filtered_df = df[df['company'].isin(top_companies) & (df['year'] == years[1])]
+            revenue_growth = pd.Series(cube.get('yoy_revenue_growth', years[1]), index=cube.companies)
+            filter_companies = revenue_growth.nlargest(5).index.to_list()
+            view_years = (years[1], years[1])
+            filtered_df = layout.select(filter_companies, view_years)
         else:
             st.write("No data available for the selected filters.")
     else:
         st.write(f"Data for years {years[0]} to {years[1]} using your filters:")
     
-    pivot_df = filtered_df.pivot_table(index=['year', 'company'], columns='metric', 
-                values='value').reset_index()
+    # Wide (year, company) x metric view of the same selection, taken from the materialized table
+    pivot_df = wide_table.select(filter_companies, view_years)
 
     # Display the filtered DataFrame
     st.dataframe(filtered_df)
@@ -463,11 +669,9 @@ st.markdown("<h1 style='text-align: center;'>NASDAQ-100 Financial \
             Indicators Dashboard</h1>", unsafe_allow_html=True)
 
 # Define top performers for KPIs
-current_df = df[df['year'] == years[1]].reset_index(drop=True)
-
-pe_top_performer = find_top_performer(current_df, 'price_to_earnings_ratio')
-revenue_top_performer = find_top_performer(current_df, 'yoy_revenue_growth')
-debt_equity_top_performer = find_top_performer(current_df, 'debt_to_equity')
+pe_top_performer = find_top_performer(leaderboards, 'price_to_earnings_ratio', years[1])
+revenue_top_performer = find_top_performer(leaderboards, 'yoy_revenue_growth', years[1])
+debt_equity_top_performer = find_top_performer(leaderboards, 'debt_to_equity', years[1], direction='min')
 
 # Display top KPI performers in 3 columns
 col1, col2, col3 = st.columns(3)
@@ -480,6 +684,7 @@ with col1:
         <div class="metric-delta">
             {get_arrow(pe_top_performer['value'])} {pe_top_performer['value']:.2f}
         </div>
+        <div class="metric-peer">{peer_percentile(rankings, cube, pe_top_performer['company'], 'price_to_earnings_ratio', years[1])}</div>
     </div>
     """, unsafe_allow_html=True)
 
@@ -491,17 +696,19 @@ with col2:
         <div class="metric-delta">
             {get_arrow(revenue_top_performer['value'])} {revenue_top_performer['value']:.2f}
         </div>
+        <div class="metric-peer">{peer_percentile(rankings, cube, revenue_top_performer['company'], 'yoy_revenue_growth', years[1])}</div>
     </div>
     """, unsafe_allow_html=True)
 
 with col3:
     st.markdown(f"""
     <div class="box">
-        <div class="metric-label">Lowest Debt to Equity (D/E)</div>
+        <div class="metric-label" title="Companies with negative equity, and so a negative D/E, are not ranked">Lowest Debt to Equity (D/E)</div>
         <div class="metric-value">{debt_equity_top_performer['company']}</div>
         <div class="metric-delta">
             {get_arrow(debt_equity_top_performer['value'])} {debt_equity_top_performer['value']:.2f}
         </div>
+        <div class="metric-peer">{peer_percentile(rankings, cube, debt_equity_top_performer['company'], 'debt_to_equity', years[1])}</div>
     </div>
     """, unsafe_allow_html=True)
 
@@ -530,43 +737,33 @@ with st.expander(f"Top KPI Performers for NASDAQ-100 Companies in {years[1]}"):
         - The D/E ratio is a measure of a company's financial leverage, calculated by dividing its total liabilities by its
           shareholders' equity. A lower ratio is generally considered better, as it indicates a lower level of debt relative to equity.
         - Companies with lower D/E ratios are typically less risky, as they rely less on borrowing and have a more stable financial structure.
+        - Companies with negative shareholders' equity have a negative D/E ratio; they are the most fragile balance sheets
+          rather than the least leveraged, so only D/E ratios of 0 and above are ranked.
         - The company with the lowest D/E ratio for {years[1]} is **{debt_equity_top_performer['company']}**, with a D/E 
         ratio of **{debt_equity_top_performer['value']:.2f}**.
     """)
 
+# Add expander with the top 10 companies for any metric in the selected year
+with st.expander(f"Top 10 NASDAQ-100 Companies by Metric in {years[1]}"):
+    leaderboard_metric = st.selectbox('Select metric', cube.metrics,
+                                      index=int(cube.metric_index['yoy_revenue_growth']))
+    leaderboard_order = st.radio('Rank by', ['Best', 'Highest', 'Lowest'], horizontal=True,
+                                 help="'Best' ranks lower values first for metrics where lower is better, "
+                                      "such as debt and valuation ratios. Negative valuation multiples and debt "
+                                      "ratios, which come from losses or negative equity, are not ranked.")
+    leaderboard_direction = {'Best': metric_direction(leaderboard_metric),
+                             'Highest': 'max', 'Lowest': 'min'}[leaderboard_order]
+    percentile_help = "The best value of the metric is at 100, whichever way it ranks; unranked values have none."
+    leaderboard_table = leaderboards.table(leaderboard_metric, years[1], leaderboard_direction).join(
+        rankings.table(leaderboard_metric, years[1]).set_index('company')[['universe_pct', 'sector_pct', 'sector_z']],
+        on='company')
+    st.dataframe(leaderboard_table, hide_index=True, use_container_width=True,
+                 column_config={'universe_pct': st.column_config.NumberColumn('NASDAQ-100 pct', format='%.0f',
+                                                                              help=percentile_help),
+                                'sector_pct': st.column_config.NumberColumn('Sector pct', format='%.0f',
+                                                                            help=percentile_help),
+                                'sector_z': st.column_config.NumberColumn('Sector z-score', format='%.2f')})
 
-# Section: Donut plots for risk metrics
-st.header("NASDAQ 100: Risk and Gain Metrics Over the Past 5 Years")
-col1, col2, col3 = st.columns(3)
-
-with col1:
-    st.altair_chart(make_donut(int(avoid_mrisk(df)[0]), "M-Score: Likely a Manipulator", "M-Score: Safe to Invest", 'red'), 
-    use_container_width=True)
-
-with col2:
-    st.altair_chart(make_donut(int(avoid_zrisk(df)[0]), "Z-Score: Likely Heading to Bankruptcy", "Z-Score: Safe to Invest", 'red'), 
-    use_container_width=True)
-
-with col3:
-    st.altair_chart(make_donut(cagr(df), "NASDAQ-100 Compound Annual Growth Rate", '', 'green'), use_container_width=True)
-
-# Add the "Read More" expander
-with st.expander("Read More about Investment Avoidance and Average Retuen on Investment"):
-    st.write(f"""
-        **Investment Avoidance Metrics:**
-        
-        - The M-Score and Z-Score are key financial ratios used to assess a company's risk for fraudulent or distress behavior. 
-        - Companies with a high M-Score are considered more likely to manipulate earnings, whereas a low Z-Score may indicate
-         financial distress.
-        - Avoidance percentages reflect how much of the total sample falls into these risky categories.
-        - Companies to avoid based on current M-score: {', '.join(avoid_mrisk(df)[1])}
-        - Companies to avoid based on current Z-score: {', '.join(avoid_zrisk(df)[1])}
-        
-        **Average Return for NASDAQ-100 Over Past 5 Years**
-        
-        - A high EPS growth rate is an indicator of a company's profitability and potential for long-term growth.
-         The overall average return on investment when invetsed in NASDAQ-100 over past 5 years is {cagr(df)} %.
-    """)
 
 #Define a dynamic color palette using Viridis
 # Generate a list of unique companies
@@ -585,304 +782,619 @@ color_map = {
     for company, color in zip(unique_companies, colors)
 }
 
-# Section 1: Performance & Profitability
-st.header("Performance & Profitability Metrics")
+# Section: Donut plots for risk metrics
+@st.fragment
+def risk_and_growth_section() -> None:
+    """
+    Renders the risk donuts, the threshold sensitivity of the risk screens and the compound growth rates.
+    """
+    st.header("NASDAQ 100: Risk and Gain Metrics Over the Past 5 Years")
+    nasdaq_cagr = cagr(growth)
+    col1, col2, col3 = st.columns(3)
 
-# Line chart for Asset Turnover and Gross Profit to Assets
-fig1 = create_financial_plot(pivot_df, unique_companies, color_map, 'asset_turnover', 
-        'gross_profit_to_assets', years, ('Assets Turnover', 'Gross Profit to Assets'), 
-        'Assets Turnover and Gross Profit to Assets')
+    with col1:
+        st.altair_chart(make_donut(int(risk_screen.percentages['mscore']), "M-Score: Likely a Manipulator", "M-Score: Safe to Invest", 'red'), 
+        use_container_width=True)
 
-st.plotly_chart(fig1)
+    with col2:
+        st.altair_chart(make_donut(int(risk_screen.percentages['zscore']), "Z-Score: Likely Heading to Bankruptcy", "Z-Score: Safe to Invest", 'red'), 
+        use_container_width=True)
+
+    with col3:
+        st.altair_chart(make_donut(nasdaq_cagr, "NASDAQ-100 Compound Annual Growth Rate", '', 'green'), use_container_width=True)
+
+    # Add the "Read More" expander
+    with st.expander("Read More about Investment Avoidance and Average Retuen on Investment"):
+        st.write(f"""
+            **Investment Avoidance Metrics:**
+        
+            - The M-Score and Z-Score are key financial ratios used to assess a company's risk for fraudulent or distress behavior. 
+            - Companies with a high M-Score are considered more likely to manipulate earnings, whereas a low Z-Score may indicate
+             financial distress.
+            - Avoidance percentages reflect how much of the total sample falls into these risky categories.
+            - Companies to avoid based on current M-score: {', '.join(risk_screen.flagged['mscore'])}
+            - Companies to avoid based on current Z-score: {', '.join(risk_screen.flagged['zscore'])}
+            - Companies with a weak average Piotroski F-score (below 4): {', '.join(risk_screen.flagged['fscore'])}
+            - Companies with a probability of financial distress above 1%: {', '.join(risk_screen.flagged['financial_distress'])}
+        
+            **Average Return for NASDAQ-100 Over Past 5 Years**
+        
+            - A high EPS growth rate is an indicator of a company's profitability and potential for long-term growth.
+             The overall average return on investment when invetsed in NASDAQ-100 over past 5 years is {nasdaq_cagr} %.
+        """)
+
+    # Add expander with the flagged share of the M-score and Z-score screens across thresholds
+    with st.expander("Threshold Sensitivity of the M-Score and Z-Score Screens"):
+        sensitivity_metric = st.radio('Screen', ['mscore', 'zscore'], horizontal=True, key='sensitivity_metric',
+                                      format_func=lambda m: {'mscore': 'M-Score', 'zscore': 'Z-Score'}[m])
+        sensitivity_screen = risk_screen.screens[sensitivity_metric]
+
+        # Thresholds spanning the bulk of the company averages and their flagged share, computed once per screen,
+        # so that moving the slider only counts the companies past the new threshold
+        low, high, sensitivity_curve = risk_screen.sweep(sensitivity_metric)
+        threshold = st.slider('Threshold', low, high, float(sensitivity_screen.threshold), step=0.01,
+                              key=f'threshold_{sensitivity_metric}')
+
+        def sensitivity_plot() -> go.Figure:
+            fig = go.Figure(go.Scatter(
+                x=sensitivity_curve['threshold'], y=sensitivity_curve['percentage'], mode='lines', name='Flagged',
+                hovertemplate='Threshold %{x:.2f}: %{y:.1f}% flagged<extra></extra>'
+            ))
+            fig.add_vline(x=sensitivity_screen.threshold, line_dash='dash', line_color='gray',
+                          annotation_text=f'Published cutoff {sensitivity_screen.threshold}')
+            fig.update_layout(xaxis_title=f'Average {sensitivity_metric} threshold',
+                              yaxis_title='Companies flagged (%)', height=350, margin=dict(t=30))
+            return fig
+
+        # The curve is built once per screen; only the line of the selected threshold is added on every rerun
+        fig_sensitivity = load_figure_cache().figure(
+            FigureCache.key(data_version, [sensitivity_metric], None,
+                            (risk_screen.years[0], risk_screen.years[-1]), 'sensitivity'),
+            sensitivity_plot)
+        fig_sensitivity.add_vline(x=threshold, line_color='red')
+        st.plotly_chart(fig_sensitivity, use_container_width=True)
+
+        # Counting the companies past the threshold is a binary search into the sorted averages
+        flagged_count = risk_screen.flagged_count(sensitivity_metric, threshold)
+        st.write(f"Average {sensitivity_metric} {sensitivity_screen.operator} {threshold:.2f} flags {flagged_count} "
+                 f"{'company' if flagged_count == 1 else 'companies'} "
+                 f"({flagged_count * 100. / len(cube.companies):.0f}%): "
+                 f"{', '.join(risk_screen.companies_at(sensitivity_metric, threshold))}")
+
+    # Add expander with the compound growth of every window ending in the latest year
+    with st.expander(f"Compound Annual Growth Rates up to {growth.years[-1]}"):
+        growth_metric = st.selectbox('Select growth metric', growth.metrics, format_func=lambda m: m.replace('_', ' '))
+        growth_by = st.radio('Group by', ['Company', 'Sector', 'Subsector'], horizontal=True)
+        if growth_by == 'Company':
+            growth_table = growth.table(growth_metric, filter_companies)
+        else:
+            growth_table = growth.sector_table(growth_metric, growth_by.lower(), filter_companies)
+        st.write("CAGR in percent over the last *n* years; years without data are skipped, and windows with a "
+                 "year of -100% growth or less are left blank.")
+        st.dataframe(growth_table, hide_index=True, use_container_width=True)
 
-# Create expander for Asset Turnover and Gross Profit to Assets Analysis
-with st.expander("Asset Turnover & Gross Profit to Assets Analysis"):
-    st.write(r'''
-    ### Asset Turnover
-    Asset Turnover is a financial metric that measures the efficiency of a company's use of its assets to generate sales revenue. 
-    It is calculated using the following formula:
+# Section 1: Performance & Profitability
+@st.fragment
+def performance_section() -> None:
+    """
+    Renders the asset turnover, gross profit, revenue growth and EPS growth charts and their analyses.
+    """
+    st.header("Performance & Profitability Metrics")
+
+    # Line chart for Asset Turnover and Gross Profit to Assets
+    render_mode1 = render_mode_selector('render_fig1')
+    fig1 = cached_financial_plot(data_version, view_years, pivot_df, unique_companies, color_map, 'asset_turnover', 
+            'gross_profit_to_assets', years, ('Assets Turnover', 'Gross Profit to Assets'), 
+            'Assets Turnover and Gross Profit to Assets', render_mode1)
+
+    st.plotly_chart(fig1)
+
+    # Create expander for Asset Turnover and Gross Profit to Assets Analysis
+    with st.expander("Asset Turnover & Gross Profit to Assets Analysis"):
+        st.write(r'''
+        ### Asset Turnover
+        Asset Turnover is a financial metric that measures the efficiency of a company's use of its assets to generate sales revenue. 
+        It is calculated using the following formula:
     
-    $$ 
-    \text{Asset Turnover} = \frac{\text{Net Sales}}{\text{Average Total Assets}} 
-    $$
-
-    A higher asset turnover ratio indicates that a company is utilizing its assets more efficiently. 
-    - **Good:** An asset turnover ratio above 1 suggests that the company is generating more than $1 
-             in sales for every dollar of assets.
-    - **Bad:** A ratio below 1 indicates that the company is not effectively using its assets to generate sales,
-              which could be a red flag for investors.
-
-    Over the years, a consistently high asset turnover ratio suggests that the company is maintaining 
-             its efficiency, whereas a declining ratio may signal operational issues or inefficiencies.
-    ''')
-
-    st.write(r'''
-    ### Gross Profit to Assets
-    Gross Profit to Assets measures the relationship between a company's gross profit and its total assets. 
-    It indicates how effectively a company is using its assets to generate gross profit. The formula is:
-
-    $$ 
-    \text{Gross Profit to Assets} = \frac{\text{Gross Profit}}{\text{Average Total Assets}} 
-    $$
-
-    A higher value indicates better performance in generating gross profit relative to the assets utilized. 
-    - **Good:** A ratio above 0.2 (or 20%) is often considered favorable, as it suggests the company is effectively 
-        converting its assets into gross profit.
-    - **Bad:** A ratio significantly below 0.1 (or 10%) may indicate that the company is struggling to convert its 
-        assets into gross profit, raising concerns about its profitability.
-
-    Year-over-year improvements in this metric can demonstrate effective management and strategic use of assets.
-     Conversely, a decline could indicate increased costs or inefficiencies that need to be addressed.
-    ''')
-
-    st.write(r'''
-    ### Summary
-    Both metrics provide valuable insights into a company's operational efficiency and asset utilization. 
-    Investors should monitor these ratios over time and compare them against industry benchmarks to assess a company's performance. 
-    Improvements in these ratios often correlate with a company's ability to manage its resources effectively and maximize profitability.
-    ''')
-
-
-# Line chart for Year-over-Year Revenue & EPS Growth
-fig2 = create_financial_plot(pivot_df, unique_companies, color_map, 'yoy_revenue_growth', 
-        'yoy_eps_growth', years, ("Year-over-Year Revenue Growth", "Year-over-Year EPS Growth"),
-          "Year-over-Year Revenue & EPS Growth")
-
-st.plotly_chart(fig2)
-
-# Create expander for YoY Revenue Growth and EPS Growth Analysis
-with st.expander("YoY Revenue Growth & EPS Growth Analysis"):
-    st.write(r'''
-    ### YoY Revenue Growth
-    Year-over-Year (YoY) Revenue Growth is a metric that compares a company's current revenue to its revenue from the same 
-    period in the previous year. It helps investors gauge how well a company is growing its sales over time. The formula is:
-
-    $$ 
-    \text{YoY Revenue Growth} = \frac{\text{Current Year Revenue} - \text{Previous Year Revenue}}{\text{Previous Year Revenue}} \times 100 
-    $$
-
-    A higher YoY revenue growth percentage indicates strong sales performance.
-    - **Good:** A positive growth rate suggests that the company is successfully increasing its sales, which is a positive sign for investors.
-    - **Bad:** A negative growth rate indicates a decline in sales, which may signal underlying issues in the business.
-
-    Consistent YoY revenue growth over multiple periods can indicate a strong market position and effective business strategies.
-    ''')
-
-    st.write(r'''
-    ### EPS Growth
-    Earnings Per Share (EPS) Growth measures the increase in a company's earnings on a per-share basis, allowing 
-             investors to assess profitability growth over time. The formula for EPS growth is:
-
-    $$ 
-    \text{EPS Growth} = \frac{\text{Current Year EPS} - \text{Previous Year EPS}}{\text{Previous Year EPS}} \times 100 
-    $$
-
-    A higher EPS growth indicates better profitability and is a key metric for investors. 
-    - **Good:** Positive EPS growth reflects a company that is effectively increasing its profits relative to the number of shares 
-        outstanding, which can drive stock prices higher.
-    - **Bad:** Negative EPS growth suggests declining profitability, raising concerns about the company's financial health.
-
-    Monitoring EPS growth alongside revenue growth can provide deeper insights into a company's operational efficiency and profitability.
-    ''')
-
-    st.write(r'''
-    ### Summary
-    Both YoY Revenue Growth and EPS Growth are critical indicators of a company's financial performance and potential for future success. 
-    Investors should analyze these metrics in conjunction with other financial data to make informed investment decisions. Consistent positive
-     growth in these areas is often indicative of a well-managed and financially sound company.
-    ''')
+        $$ 
+        \text{Asset Turnover} = \frac{\text{Net Sales}}{\text{Average Total Assets}} 
+        $$
+
+        A higher asset turnover ratio indicates that a company is utilizing its assets more efficiently. 
+        - **Good:** An asset turnover ratio above 1 suggests that the company is generating more than $1 
+                 in sales for every dollar of assets.
+        - **Bad:** A ratio below 1 indicates that the company is not effectively using its assets to generate sales,
+                  which could be a red flag for investors.
+
+        Over the years, a consistently high asset turnover ratio suggests that the company is maintaining 
+                 its efficiency, whereas a declining ratio may signal operational issues or inefficiencies.
+        ''')
+
+        st.write(r'''
+        ### Gross Profit to Assets
+        Gross Profit to Assets measures the relationship between a company's gross profit and its total assets. 
+        It indicates how effectively a company is using its assets to generate gross profit. The formula is:
+
+        $$ 
+        \text{Gross Profit to Assets} = \frac{\text{Gross Profit}}{\text{Average Total Assets}} 
+        $$
+
+        A higher value indicates better performance in generating gross profit relative to the assets utilized. 
+        - **Good:** A ratio above 0.2 (or 20%) is often considered favorable, as it suggests the company is effectively 
+            converting its assets into gross profit.
+        - **Bad:** A ratio significantly below 0.1 (or 10%) may indicate that the company is struggling to convert its 
+            assets into gross profit, raising concerns about its profitability.
+
+        Year-over-year improvements in this metric can demonstrate effective management and strategic use of assets.
+         Conversely, a decline could indicate increased costs or inefficiencies that need to be addressed.
+        ''')
+
+        st.write(r'''
+        ### Summary
+        Both metrics provide valuable insights into a company's operational efficiency and asset utilization. 
+        Investors should monitor these ratios over time and compare them against industry benchmarks to assess a company's performance. 
+        Improvements in these ratios often correlate with a company's ability to manage its resources effectively and maximize profitability.
+        ''')
+
+
+    # Line chart for Year-over-Year Revenue & EPS Growth
+    render_mode2 = render_mode_selector('render_fig2')
+    fig2 = cached_financial_plot(data_version, view_years, pivot_df, unique_companies, color_map, 'yoy_revenue_growth', 
+            'yoy_eps_growth', years, ("Year-over-Year Revenue Growth", "Year-over-Year EPS Growth"),
+              "Year-over-Year Revenue & EPS Growth", render_mode2)
+
+    st.plotly_chart(fig2)
+
+    # Create expander for YoY Revenue Growth and EPS Growth Analysis
+    with st.expander("YoY Revenue Growth & EPS Growth Analysis"):
+        st.write(r'''
+        ### YoY Revenue Growth
+        Year-over-Year (YoY) Revenue Growth is a metric that compares a company's current revenue to its revenue from the same 
+        period in the previous year. It helps investors gauge how well a company is growing its sales over time. The formula is:
+
+        $$ 
+        \text{YoY Revenue Growth} = \frac{\text{Current Year Revenue} - \text{Previous Year Revenue}}{\text{Previous Year Revenue}} \times 100 
+        $$
+
+        A higher YoY revenue growth percentage indicates strong sales performance.
+        - **Good:** A positive growth rate suggests that the company is successfully increasing its sales, which is a positive sign for investors.
+        - **Bad:** A negative growth rate indicates a decline in sales, which may signal underlying issues in the business.
+
+        Consistent YoY revenue growth over multiple periods can indicate a strong market position and effective business strategies.
+        ''')
+
+        st.write(r'''
+        ### EPS Growth
+        Earnings Per Share (EPS) Growth measures the increase in a company's earnings on a per-share basis, allowing 
+                 investors to assess profitability growth over time. The formula for EPS growth is:
+
+        $$ 
+        \text{EPS Growth} = \frac{\text{Current Year EPS} - \text{Previous Year EPS}}{\text{Previous Year EPS}} \times 100 
+        $$
+
+        A higher EPS growth indicates better profitability and is a key metric for investors. 
+        - **Good:** Positive EPS growth reflects a company that is effectively increasing its profits relative to the number of shares 
+            outstanding, which can drive stock prices higher.
+        - **Bad:** Negative EPS growth suggests declining profitability, raising concerns about the company's financial health.
+
+        Monitoring EPS growth alongside revenue growth can provide deeper insights into a company's operational efficiency and profitability.
+        ''')
+
+        st.write(r'''
+        ### Summary
+        Both YoY Revenue Growth and EPS Growth are critical indicators of a company's financial performance and potential for future success. 
+        Investors should analyze these metrics in conjunction with other financial data to make informed investment decisions. Consistent positive
+         growth in these areas is often indicative of a well-managed and financially sound company.
+        ''')
 
 
 # Section 3: Liquidity & Cash Management
-st.header("Liquidity & Cash Management Metrics")
+@st.fragment
+def liquidity_section() -> None:
+    """
+    Renders the cash ratio and current ratio chart and its analysis.
+    """
+    st.header("Liquidity & Cash Management Metrics")
 
-# Line chart for Cash Ratio and Current Ratio
-fig3 = create_financial_plot(pivot_df, unique_companies, color_map, 'cash_ratio', 
-        'current_ratio', years, ("Cash Ratio", "Current Ratio"),
-          "Cash Ratio and Current Ratio")
+    # Line chart for Cash Ratio and Current Ratio
+    render_mode3 = render_mode_selector('render_fig3')
+    fig3 = cached_financial_plot(data_version, view_years, pivot_df, unique_companies, color_map, 'cash_ratio', 
+            'current_ratio', years, ("Cash Ratio", "Current Ratio"),
+              "Cash Ratio and Current Ratio", render_mode3)
 
-st.plotly_chart(fig3)
+    st.plotly_chart(fig3)
 
-# Create expander for Cash Ratio and Current Ratio Analysis
-with st.expander("Cash Ratio & Current Ratio Analysis"):
-    st.write(r'''
-    ### Cash Ratio
-    The Cash Ratio is a liquidity metric that measures a company's ability to cover its short-term liabilities with its cash and
-     cash equivalents. This ratio provides a conservative view of a company's liquidity position. The formula is:
+    # Create expander for Cash Ratio and Current Ratio Analysis
+    with st.expander("Cash Ratio & Current Ratio Analysis"):
+        st.write(r'''
+        ### Cash Ratio
+        The Cash Ratio is a liquidity metric that measures a company's ability to cover its short-term liabilities with its cash and
+         cash equivalents. This ratio provides a conservative view of a company's liquidity position. The formula is:
 
-    $$ 
-    \text{Cash Ratio} = \frac{\text{Cash and Cash Equivalents}}{\text{Current Liabilities}} 
-    $$
+        $$ 
+        \text{Cash Ratio} = \frac{\text{Cash and Cash Equivalents}}{\text{Current Liabilities}} 
+        $$
 
-    A higher cash ratio indicates better liquidity.
-    - **Good:** A cash ratio greater than 1 suggests that the company has more cash than current liabilities, indicating a strong 
-        liquidity position.
-    - **Bad:** A cash ratio below 0.5 may raise concerns about a company’s ability to meet its short-term obligations.
+        A higher cash ratio indicates better liquidity.
+        - **Good:** A cash ratio greater than 1 suggests that the company has more cash than current liabilities, indicating a strong 
+            liquidity position.
+        - **Bad:** A cash ratio below 0.5 may raise concerns about a company’s ability to meet its short-term obligations.
 
-    This metric is especially important during times of financial uncertainty, as it shows how well a company can withstand 
-    short-term financial challenges.
-    ''')
+        This metric is especially important during times of financial uncertainty, as it shows how well a company can withstand 
+        short-term financial challenges.
+        ''')
 
-    st.write(r'''
-    ### Current Ratio
-    The Current Ratio is another liquidity metric that measures a company's ability to pay its short-term liabilities with its 
-    current assets. It provides a broader view of a company's financial health. The formula for the current ratio is:
+        st.write(r'''
+        ### Current Ratio
+        The Current Ratio is another liquidity metric that measures a company's ability to pay its short-term liabilities with its 
+        current assets. It provides a broader view of a company's financial health. The formula for the current ratio is:
 
-    $$ 
-    \text{Current Ratio} = \frac{\text{Current Assets}}{\text{Current Liabilities}} 
-    $$
+        $$ 
+        \text{Current Ratio} = \frac{\text{Current Assets}}{\text{Current Liabilities}} 
+        $$
 
-    A higher current ratio indicates better financial health.
-    - **Good:** A current ratio above 1 indicates that the company has more current assets than current liabilities, suggesting 
-        it can meet its short-term obligations.
-    - **Bad:** A current ratio below 1 may signal liquidity issues, as the company may not have enough current assets to cover its liabilities.
+        A higher current ratio indicates better financial health.
+        - **Good:** A current ratio above 1 indicates that the company has more current assets than current liabilities, suggesting 
+            it can meet its short-term obligations.
+        - **Bad:** A current ratio below 1 may signal liquidity issues, as the company may not have enough current assets to cover its liabilities.
 
-    Monitoring the current ratio alongside the cash ratio provides a more comprehensive view of a company’s liquidity position.
-    ''')
+        Monitoring the current ratio alongside the cash ratio provides a more comprehensive view of a company’s liquidity position.
+        ''')
 
-    st.write(r'''
-    ### Summary
-    Both the Cash Ratio and Current Ratio are essential indicators of a company's liquidity and financial stability. 
-    Investors should evaluate these ratios in the context of industry benchmarks and alongside other financial metrics to make 
-    informed decisions. Consistently high ratios are indicative of a company that can comfortably meet its short-term obligations.
-    ''')
+        st.write(r'''
+        ### Summary
+        Both the Cash Ratio and Current Ratio are essential indicators of a company's liquidity and financial stability. 
+        Investors should evaluate these ratios in the context of industry benchmarks and alongside other financial metrics to make 
+        informed decisions. Consistently high ratios are indicative of a company that can comfortably meet its short-term obligations.
+        ''')
 
 
 # Section 4: Debt & Leverage
-st.header("Debt & Leverage Metrics")
+@st.fragment
+def debt_section() -> None:
+    """
+    Renders the debt and leverage chart and its analysis.
+    """
+    st.header("Debt & Leverage Metrics")
+
+    # Line chart for Debt to Equity and Debt to Assets
+    render_mode4 = render_mode_selector('render_fig4')
+    fig4 = cached_financial_plot(data_version, view_years, pivot_df, unique_companies, color_map, 'cash_ratio', 
+            'current_ratio', years, ("Debt to Equity", "Debt to Assets"),
+              "Debt to Equity and Debt to Assets", render_mode4)
+
+    st.plotly_chart(fig4)
+
+    # Create expander for Asset Turnover and Gross Profit to Assets Analysis
+    with st.expander("Asset Turnover & Gross Profit to Assets Analysis"):
+        st.write(r'''
+        ### Asset Turnover
+        Asset Turnover is a financial metric that measures the efficiency of a company's use of its assets 
+        to generate sales revenue. It is calculated using the following formula:
+    
+        $$ 
+        \text{Asset Turnover} = \frac{\text{Net Sales}}{\text{Average Total Assets}} 
+        $$
+
+        A higher asset turnover ratio indicates that a company is utilizing its assets more efficiently. 
+        - **Good:** An asset turnover ratio above 1 suggests that the company is generating more than $1 in sales for every dollar of assets.
+        - **Bad:** A ratio below 1 indicates that the company is not effectively using its assets to generate sales, which could be a red flag
+                 for investors.
+
+        Over the years, a consistently high asset turnover ratio suggests that the company is maintaining its efficiency, whereas a 
+        declining ratio may signal operational issues or inefficiencies.
+        ''')
+
+        st.write(r'''
+        ### Gross Profit to Assets
+        Gross Profit to Assets measures the relationship between a company's gross profit and its total assets. It indicates how 
+        effectively a company is using its assets to generate gross profit. The formula is:
+
+        $$ 
+        \text{Gross Profit to Assets} = \frac{\text{Gross Profit}}{\text{Average Total Assets}} 
+        $$
+
+        A higher value indicates better performance in generating gross profit relative to the assets utilized. 
+        - **Good:** A ratio above 0.2 (or 20%) is often considered favorable, as it suggests the company is effectively converting 
+        its assets into gross profit.
+        - **Bad:** A ratio significantly below 0.1 (or 10%) may indicate that the company is struggling to convert its assets into gross 
+        profit, raising concerns about its profitability.
+
+        Year-over-year improvements in this metric can demonstrate effective management and strategic use of assets. Conversely, 
+        a decline could indicate increased costs or inefficiencies that need to be addressed.
+        ''')
+
+        st.write(r'''
+        ### Summary
+        Both metrics provide valuable insights into a company's operational efficiency and asset utilization. Investors should monitor 
+        these ratios over time and compare them against industry benchmarks to assess a company's performance. Improvements in these ratios 
+        often correlate with a company's ability to manage its resources effectively and maximize profitability.
+        ''')
 
-# Line chart for Debt to Equity and Debt to Assets
-fig4 = create_financial_plot(pivot_df, unique_companies, color_map, 'cash_ratio', 
-        'current_ratio', years, ("Debt to Equity", "Debt to Assets"),
-          "Debt to Equity and Debt to Assets")
 
-st.plotly_chart(fig4)
+# Section 5: Risk Metrics
+@st.fragment
+def risk_metrics_section() -> None:
+    """
+    Renders the average Z-scores and M-scores of the selected companies over a trailing window.
+    """
+    risk_header = st.empty()
+    risk_window = st.select_slider('Select number of years', options=rolling.windows, value=5)
+    risk_header.header(f"Average Risk Metrics over Past {risk_window} Years")
 
-# Create expander for Asset Turnover and Gross Profit to Assets Analysis
-with st.expander("Asset Turnover & Gross Profit to Assets Analysis"):
-    st.write(r'''
-    ### Asset Turnover
-    Asset Turnover is a financial metric that measures the efficiency of a company's use of its assets 
-    to generate sales revenue. It is calculated using the following formula:
-    
-    $$ 
-    \text{Asset Turnover} = \frac{\text{Net Sales}}{\text{Average Total Assets}} 
-    $$
-
-    A higher asset turnover ratio indicates that a company is utilizing its assets more efficiently. 
-    - **Good:** An asset turnover ratio above 1 suggests that the company is generating more than $1 in sales for every dollar of assets.
-    - **Bad:** A ratio below 1 indicates that the company is not effectively using its assets to generate sales, which could be a red flag
-             for investors.
-
-    Over the years, a consistently high asset turnover ratio suggests that the company is maintaining its efficiency, whereas a 
-    declining ratio may signal operational issues or inefficiencies.
-    ''')
-
-    st.write(r'''
-    ### Gross Profit to Assets
-    Gross Profit to Assets measures the relationship between a company's gross profit and its total assets. It indicates how 
-    effectively a company is using its assets to generate gross profit. The formula is:
-
-    $$ 
-    \text{Gross Profit to Assets} = \frac{\text{Gross Profit}}{\text{Average Total Assets}} 
-    $$
-
-    A higher value indicates better performance in generating gross profit relative to the assets utilized. 
-    - **Good:** A ratio above 0.2 (or 20%) is often considered favorable, as it suggests the company is effectively converting 
-    its assets into gross profit.
-    - **Bad:** A ratio significantly below 0.1 (or 10%) may indicate that the company is struggling to convert its assets into gross 
-    profit, raising concerns about its profitability.
-
-    Year-over-year improvements in this metric can demonstrate effective management and strategic use of assets. Conversely, 
-    a decline could indicate increased costs or inefficiencies that need to be addressed.
-    ''')
-
-    st.write(r'''
-    ### Summary
-    Both metrics provide valuable insights into a company's operational efficiency and asset utilization. Investors should monitor 
-    these ratios over time and compare them against industry benchmarks to assess a company's performance. Improvements in these ratios 
-    often correlate with a company's ability to manage its resources effectively and maximize profitability.
-    ''')
+    current_year = cube.years[-1]
 
+    # Average Z-score and M-score of the selected companies, taken from the risk screen of the same years
+    recent_risk_screen = load_risk_screen(data_version, risk_window)
+    agg_df = recent_risk_screen.table(unique_companies)
 
-# Section 5: Risk Metrics
-st.header("Average Risk Metrics over Past 5 Years")
-
-# Filter for the last 5 years and selected companies
-current_year = df['year'].max()
-score_df = df[(df['year'] >= current_year - 4) & (df['company'].isin(unique_companies))]
-
-pivot_df1 = score_df.pivot(index=['company', 'year'], columns='metric', values='value').reset_index()
-
-# Use Altman Z-Score and Beneish M-Score with color-coded bars to visualize risk levels
-agg_df = pivot_df1.groupby('company').agg({'mscore': 'mean', 'zscore': 'mean'}).reset_index()
-
-# Assuming pivot_df1 is already defined as per your existing code
-
-# Aggregate data to get average Z-score and M-score
-agg_df = pivot_df1.groupby('company').agg({'mscore': 'mean', 'zscore': 'mean'}).reset_index()
-
-# Identify companies to avoid
-companies_to_avoid = agg_df[
-    (agg_df['zscore'] < 1.81) |  # Generally, Z-score < 1.81 indicates financial distress
-    (agg_df['mscore'] > -1.78)      # Generally, M-score < -2 indicates potential earnings manipulation
-]['company'].tolist()
-
-# Create subplots for Z-score and M-score
-fig5 = make_subplots(rows=1, cols=2, subplot_titles=("Average Z-score", "Average M-score"))
-
-# Add bar traces for Z-scores
-for company in unique_companies:
-    company_data = pivot_df1[pivot_df1['company'] == company]
-    if not company_data.empty:
-        z_scores = company_data.filter(like='zscore').iloc[0].values
-        years = company_data.filter(like='zscore').columns.str.replace('_', ' ').str.replace('zscore', '').values
-        fig5.add_trace(go.Bar(x=years, y=z_scores, name=company, marker_color=color_map[company], 
-                              legendgroup= company, showlegend=True), row=1, col=1)
-
-# Add horizontal line for Z-score threshold
-fig5.add_trace(go.Scatter(
-    x=[years[0], years[-1]],  # Set x-values to match the year range
-    y=[1.81, 1.81],
-    mode='lines',
-    name='Z-Score Threshold (1.81)',
-    line=dict(color='red', dash='dash')
-), row=1, col=1)
-
-# Add bar traces for M-scores
-for company in unique_companies:
-    company_data = pivot_df1[pivot_df1['company'] == company]
-    if not company_data.empty:
-        m_scores = company_data.filter(like='mscore').iloc[0].values
-        years = company_data.filter(like='mscore').columns.str.replace('_', ' ').str.replace('mscore', '').values
-        fig5.add_trace(go.Bar(x=years, y=m_scores, name=company, marker_color=color_map[company],
-                        legendgroup= company, showlegend= False), row=1, col=2)
-
-# Add horizontal line for M-score threshold
-fig5.add_trace(go.Scatter(
-    x=[years[0], years[-1]],  # Set x-values to match the year range
-    y=[-1.78, -1.78],
-    mode='lines',
-    name='M-Score Threshold (-1.78)',
-    line=dict(color='red', dash='dash', width=2)
-), row=1, col=2)
-
-# Update layout for better presentation
-fig5.update_layout(title_text="Average Z-scores and M-scores",
-                   xaxis_title="Year",
-                   yaxis_title="Score",
-                   barmode='group')  # Group bars for better visibility
-
-# Display the plot in Streamlit
-st.plotly_chart(fig5)
-
-# Create expander for Altman Z-score and Beneish M-score
-with st.expander("Altman Z-Score & Beneish M-Score Analysis"):
-    st.write("The Altman Z-Score is a measure of a company's financial health and bankruptcy risk. A score below 1.81 \
-             suggests a higher likelihood of bankruptcy.")
-    st.write("The Beneish M-Score is used to detect earnings manipulation. A score above -1.78 indicates potential manipulation.")
-    st.write("#### Companies with higher investment risk:")
-    if companies_to_avoid:
-        st.write(", ".join(companies_to_avoid))
+    # Identify companies to avoid: Z-score < 1.81 indicates financial distress, M-score > -1.78 potential earnings manipulation
+    companies_to_avoid = recent_risk_screen.companies_flagged(['zscore', 'mscore'], unique_companies)
+
+    # One bar trace per score over the companies, in their colors of the other charts, with the thresholds
+    fig5 = create_risk_plot(agg_df, color_map, unique_companies)
+
+    # Display the plot in Streamlit
+    st.plotly_chart(fig5)
+
+    # Create expander for Altman Z-score and Beneish M-score
+    with st.expander("Altman Z-Score & Beneish M-Score Analysis"):
+        st.write("The Altman Z-Score is a measure of a company's financial health and bankruptcy risk. A score below 1.81 "
+                 "suggests a higher likelihood of bankruptcy.")
+        st.write("The Beneish M-Score is used to detect earnings manipulation. A score above -1.78 indicates potential manipulation.")
+        st.write("#### Companies with higher investment risk:")
+        if companies_to_avoid:
+            st.write(", ".join(companies_to_avoid))
+        else:
+            st.write("No companies to avoid based on the selected criteria.")
+
+    # Create expander with the trend of any metric over the same years
+    with st.expander(f"Metric Trends over Past {risk_window} Years"):
+        trend_metric = st.selectbox('Select metric', cube.metrics, index=int(cube.metric_index['zscore']),
+                                    key='trend_metric')
+        st.write(f"Statistics of each company's {trend_metric} from {current_year - risk_window + 1} to {current_year}; "
+                 "the slope is the least-squares change per year.")
+        st.dataframe(rolling.table(trend_metric, risk_window, current_year, filter_companies),
+                     hide_index=True, use_container_width=True)
+
+
+# Section 6: Sector Comparison
+@st.fragment
+def sector_comparison_section() -> None:
+    """
+    Renders the median and spread of a metric across sectors or subsectors.
+    """
+    st.header(f"Sector & Subsector Comparison in {years[1]}")
+    col1, col2 = st.columns(2)
+    with col1:
+        rollup_metric = st.selectbox('Select metric', cube.metrics, index=int(cube.metric_index['yoy_revenue_growth']),
+                                     key='rollup_metric')
+    with col2:
+        rollup_level = st.radio('Compare', ['Sector', 'Subsector'], horizontal=True).lower()
+
+    # Groups follow the sidebar filters: the selected sectors, or the selected (or offered) subsectors
+    if rollup_level == 'sector':
+        rollup_groups = selected_sector or None
+    else:
+        rollup_groups = selected_subsector or (filtered_subsectors if selected_sector else None)
+    rollup_df = load_rollups(data_version, rollup_level).table(rollup_metric, years[1], rollup_groups)
+
+    # Median of every group with its interquartile range, and the trimmed mean
+    fig6 = go.Figure()
+    fig6.add_trace(go.Bar(
+        x=rollup_df[rollup_level],
+        y=rollup_df['median'],
+        name='Median',
+        error_y=dict(type='data', symmetric=False,
+                     array=rollup_df['q75'] - rollup_df['median'],
+                     arrayminus=rollup_df['median'] - rollup_df['q25'])
+    ))
+    fig6.add_trace(go.Scatter(
+        x=rollup_df[rollup_level],
+        y=rollup_df['trimmed_mean'],
+        mode='markers',
+        name=f'Trimmed Mean ({int(TRIM * 100)}%)',
+        marker=dict(color='orange', size=9)
+    ))
+    fig6.update_layout(title_text=f"{rollup_metric.replace('_', ' ').title()} by {rollup_level.title()} "
+                                  f"(median and interquartile range)",
+                       yaxis_title=rollup_metric)
+
+    st.plotly_chart(fig6)
+
+    # Create expander with the full rollup table
+    with st.expander(f"{rollup_level.title()} Statistics for {rollup_metric} in {years[1]}"):
+        st.write(f"Number of companies with a value, mean, median, mean without the top and bottom {int(TRIM * 100)}%, "
+                 "and the 10th to 90th percentiles of each group.")
+        st.dataframe(rollup_df, hide_index=True, use_container_width=True)
+
+
+# Section 7: Metric Correlations
+@st.fragment
+def correlation_section() -> None:
+    """
+    Renders the correlation heatmap of all metrics over the selection.
+    """
+    st.header(f"Metric Correlations from {years[0]} to {years[1]}")
+    correlation_method = st.radio('Correlation method', ['Pearson', 'Spearman'], horizontal=True,
+                                  help="Spearman correlates the ranks of the values, so it is less sensitive to outliers.")
+
+    # Every (company, year) of the current selection is one observation of all metrics
+    correlation_matrix = load_correlations(data_version).matrix(filter_companies, years, correlation_method.lower())
+
+    fig7 = go.Figure(go.Heatmap(
+        z=correlation_matrix.to_numpy(),
+        x=correlation_matrix.columns,
+        y=correlation_matrix.index,
+        zmin=-1, zmax=1, zmid=0,
+        colorscale='RdBu',
+        hovertemplate='%{y} / %{x}: %{z:.2f}<extra></extra>'
+    ))
+    fig7.update_layout(title_text=f"{correlation_method} Correlation between Metrics", height=800,
+                       yaxis=dict(autorange='reversed'))
+
+    st.plotly_chart(fig7, use_container_width=True)
+
+    # Create expander with the most strongly correlated metric pairs
+    with st.expander("Most Strongly Correlated Metrics"):
+        st.write("Correlations use every company and year where both metrics have a value; pairs with fewer "
+                 "than 3 shared observations are left blank in the heatmap.")
+        st.dataframe(CorrelationEngine.strongest_pairs(correlation_matrix), hide_index=True, use_container_width=True)
+
+
+# Section 8: Stock Screener
+# Screen shown until the user enters one
+DEFAULT_SCREEN = 'price_to_earnings_ratio < 30 and zscore > 3 and yoy_revenue_growth > 10'
+
+@st.fragment
+def screener_section() -> None:
+    """
+    Renders the stock screener and the companies passing it.
+    """
+    st.header(f"Stock Screener for {years[1]}")
+    screen_expression = st.text_input(
+        'Screen',
+        value=st.session_state.get('screen_expression', DEFAULT_SCREEN),
+        help="Combine metric names and numbers with < <= > >= == !=, + - * /, and, or, not and parentheses. "
+             "Companies missing a metric the screen needs do not pass it."
+    )
+    # Kept outside the widget so that it survives while the section is hidden, and for the backtest
+    st.session_state['screen_expression'] = screen_expression
+
+    try:
+        screen_df = load_screener(data_version).table(screen_expression, years[1], filter_companies)
+    except ScreenError as error:
+        st.error(str(error))
     else:
-        st.write("No companies to avoid based on the selected criteria.")
\ No newline at end of file
+        st.write(f"{len(screen_df)} {'company passes' if len(screen_df) == 1 else 'companies pass'} "
+                 f"the screen in {years[1]}.")
+        st.dataframe(screen_df, hide_index=True, use_container_width=True)
+
+
+# Section 9: Composite Score
+# Weight of every factor family until the user moves its slider
+DEFAULT_FAMILY_WEIGHT = 50
+
+@st.fragment
+def composite_score_section() -> None:
+    """
+    Renders the factor weight sliders and the companies ranked by composite score.
+    """
+    st.header(f"Composite Score for {years[1]}")
+    st.write("Each factor is winsorized at its 5th and 95th percentiles and standardized across all companies, "
+             "so that higher is better; the score is the weighted mean of the factors a company has, in standard "
+             "deviations above the average company. Negative valuation multiples, which come from losses, count as "
+             "missing rather than as the cheapest.")
+
+    # One weight slider per factor family
+    weight_columns = st.columns(len(FACTORS))
+    stored_weights = st.session_state.get('family_weights', {})
+    family_weights = {}
+    for column, (family, factors) in zip(weight_columns, FACTORS.items()):
+        family_weights[family] = column.slider(f"{family.title()} weight", 0, 100,
+                                               stored_weights.get(family, DEFAULT_FAMILY_WEIGHT), step=5,
+                                               key=f'weight_{family}', help=', '.join(factors))
+    # Kept outside the widgets so that they survive while the section is hidden, and for the backtest
+    st.session_state['family_weights'] = family_weights
+
+    if sum(family_weights.values()) == 0:
+        st.warning("Give at least one factor family a weight to compute the composite score.")
+    else:
+        score_df = load_scorer(data_version).rank(family_weights, years[1], filter_companies)
+        st.dataframe(score_df, hide_index=True, use_container_width=True,
+                     column_config={column: st.column_config.NumberColumn(format='%.2f')
+                                    for column in ['score', *FACTORS]})
+
+
+# Section 10: Strategy Backtest
+@st.fragment
+def backtest_section() -> None:
+    """
+    Renders the equity curve and statistics of a strategy and the best metric strategies.
+    """
+    st.header(f"Strategy Backtest from {years[0]} to {years[1]}")
+    st.write("Every year the strategy holds the best companies by its rule with equal weights through the following "
+             "year and earns their rate of return; the benchmark holds every selected company. Companies without a return in "
+             "a year are left out of that year.")
+
+    backtester = load_backtester(data_version)
+    family_weights = st.session_state.get('family_weights', {family: DEFAULT_FAMILY_WEIGHT for family in FACTORS})
+    screen_expression = st.session_state.get('screen_expression', DEFAULT_SCREEN)
+    backtest_rule = st.radio('Select companies by', ['Metric', 'Composite score', 'Screen'], horizontal=True,
+                             help="The composite score uses the weights of the Composite Score section and the screen "
+                                  "the expression of the Stock Screener section.")
+    backtest_top = st.slider('Companies held', 1, 50, 20,
+                             help="The screen holds every company passing it, whatever this number.")
+
+    if backtest_rule == 'Metric':
+        backtest_metric = st.selectbox('Rank by', cube.metrics, index=list(cube.metrics).index('zscore'),
+                                       key='backtest_metric')
+        backtest_signals = metric_signals(cube, [backtest_metric])
+    elif backtest_rule == 'Composite score':
+        backtest_signals = composite_signals(load_scorer(data_version), [family_weights])
+    else:
+        screener = load_screener(data_version)
+        try:
+            backtest_signals = screen_signals(np.stack([screener.screen(screen_expression, year)
+                                                        for year in cube.years], axis=-1)[None])
+        except ScreenError as error:
+            st.error(str(error))
+            backtest_signals = np.full((1,) + backtester.returns.shape, np.nan)
+        backtest_top = np.inf
+
+    # Portfolios are formed from the first selected year on and held up to the last
+    holding = (backtester.periods > years[0]) & (backtester.periods <= years[1])
+    if not holding.any():
+        st.write("Select a range of at least two years to backtest.")
+    else:
+        period_returns = backtester.run(backtester.weights(backtest_signals, backtest_top, filter_companies))[:, holding]
+        benchmark_returns = backtester.benchmark(filter_companies)[holding]
+        holding_years = backtester.periods[holding]
+        curve_years = np.concatenate([[holding_years[0] - 1], holding_years])
+
+        fig10 = go.Figure()
+        for name, returns in [('Strategy', period_returns[0]), ('Benchmark', benchmark_returns)]:
+            fig10.add_trace(go.Scatter(x=curve_years, y=Backtester.equity(returns), mode='lines+markers', name=name))
+        fig10.update_layout(title_text="Growth of 1 Invested", xaxis=dict(dtick=1), yaxis_title='Equity')
+        st.plotly_chart(fig10)
+
+        backtest_df = backtester.summary(period_returns, benchmark_returns)
+        backtest_df.insert(0, 'portfolio', ['Strategy'])
+        benchmark_df = backtester.summary(benchmark_returns, benchmark_returns)
+        benchmark_df.insert(0, 'portfolio', ['Benchmark'])
+        st.dataframe(pd.concat([backtest_df, benchmark_df], ignore_index=True), hide_index=True,
+                     use_container_width=True,
+                     column_config={column: st.column_config.NumberColumn(format='%.2f%%')
+                                    for column in backtest_df.columns[1:]})
+
+        # Create expander with the best of every metric and portfolio size, backtested together
+        with st.expander("Best Metric Strategies"):
+            grid_df = load_strategy_grid(data_version, tuple(years),
+                                         None if filter_companies is None else tuple(filter_companies))
+            st.write(f"All {len(grid_df):,} combinations of a metric and 1 to 50 companies held, "
+                     "by compound annual return.")
+            st.dataframe(grid_df.dropna(subset=['cagr']).sort_values('cagr', ascending=False).head(20),
+                         hide_index=True, use_container_width=True,
+                         column_config={'top': st.column_config.NumberColumn(format='%d')} |
+                                       {column: st.column_config.NumberColumn(format='%.2f%%')
+                                        for column in backtest_df.columns[1:]})
+
+
+###############################################################################
+# Sections of the main panel: only the selected section is computed and rendered, and every
+# section is a fragment, so that its own widgets rerun it without rerunning the rest of the page
+SECTIONS = {
+    'Risk & Growth': risk_and_growth_section,
+    'Performance & Profitability': performance_section,
+    'Liquidity & Cash': liquidity_section,
+    'Debt & Leverage': debt_section,
+    'Risk Metrics': risk_metrics_section,
+    'Sector Comparison': sector_comparison_section,
+    'Metric Correlations': correlation_section,
+    'Stock Screener': screener_section,
+    'Composite Score': composite_score_section,
+    'Strategy Backtest': backtest_section,
+}
+
+section = st.radio('Section', list(SECTIONS), horizontal=True, key='section', label_visibility='collapsed')
+SECTIONS[section]()
\ No newline at end of file
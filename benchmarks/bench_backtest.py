@@ -0,0 +1,58 @@
+###############################################################################
+# Latency of backtesting many strategies at once
+#
+# Runs grids of top-N metric strategies and composite-score weightings through
+# `dashboard.backtest.Backtester` in one batch, and compares them with
+# backtesting the same strategies one at a time.
+#
+# Usage: python benchmarks/bench_backtest.py [path/to/cleaned_data.csv]
+import itertools
+import os
+import sys
+import timeit
+from typing import Callable
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+from dashboard.backtest import Backtester, composite_signals, metric_signals
+from dashboard.cube import MetricCube
+from dashboard.data_store import load_dataset
+from dashboard.scoring import CompositeScorer
+
+
+def time_ms(func: Callable, repeat: int = 5, number: int = 3) -> float:
+    """
+    Returns the best-of-`repeat` wall time of one call, in milliseconds.
+    """
+    return min(timeit.repeat(func, repeat=repeat, number=number)) * 1000. / number
+
+def main(csv_path: str) -> None:
+    cube = MetricCube.from_frame(load_dataset(csv_path))
+    backtester = Backtester(cube)
+    scorer = CompositeScorer(cube)
+
+    # 43 metrics x 23 portfolio sizes, and a 10 x 10 x 10 grid of family weights
+    metrics, tops = list(cube.metrics), list(range(3, 26))
+    family_weights = [dict(zip(scorer.families, w)) for w in itertools.product(range(10), repeat=3)]
+
+    def metric_loop():
+        for metric, top in itertools.product(metrics, tops):
+            backtester.summary(backtester.run(backtester.weights(metric_signals(cube, [metric]), top)))
+
+    def composite_batch():
+        signals = composite_signals(scorer, family_weights)
+        backtester.summary(backtester.run(backtester.weights(signals, np.full(len(signals), 0.2))))
+
+    print(f'{"":44s}{"strategies":>12s}{"ms":>10s}')
+    for label, strategies, func in [
+        ('metric x top-N grid, one batch', len(metrics) * len(tops), lambda: backtester.grid(metrics, tops)),
+        ('metric x top-N grid, one at a time', len(metrics) * len(tops), metric_loop),
+        ('composite weight grid, one batch', len(family_weights), composite_batch),
+    ]:
+        print(f'{label:44s}{strategies:12d}{time_ms(func):10.1f}')
+
+
+if __name__ == '__main__':
+    main(sys.argv[1] if len(sys.argv) > 1 else
+         os.path.join(os.path.dirname(__file__), '..', 'cleaned_data.csv'))
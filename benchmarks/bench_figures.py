@@ -0,0 +1,111 @@
+###############################################################################
+# Build time of the per-company trend figures
+#
+# Times `dashboard.figures.create_financial_plot`, which groups the wide table
+# by company once, against the previous per-company filtering loop, on wide
+# tables of 5, 100 and 1,000 companies over the years of the dataset. The
+# larger tables repeat the real companies under new names.
+#
+# Also times `create_risk_plot`, one bar trace per risk score, against the
+# previous one bar trace per company and score, and the size of their JSON.
+#
+# Usage: python benchmarks/bench_figures.py [path/to/cleaned_data.csv]
+import os
+import sys
+import timeit
+from typing import Callable, Dict, List, Tuple
+
+import pandas as pd
+import plotly.graph_objects as go
+from plotly.subplots import make_subplots
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+from dashboard.cube import MetricCube, WideTable
+from dashboard.data_store import load_dataset
+from dashboard.figures import create_financial_plot, create_risk_plot
+from dashboard.risk import RiskScreen
+
+
+def time_ms(func: Callable, repeat: int = 3, number: int = 1) -> float:
+    """
+    Returns the best-of-`repeat` wall time of one call, in milliseconds.
+    """
+    return min(timeit.repeat(func, repeat=repeat, number=number)) * 1000. / number
+
+def filter_per_company(pivot_df: pd.DataFrame, unique_companies: List[str], color_map: Dict[str, str],
+                       metric1: str, metric2: str, years: Tuple[int, int]) -> go.Figure:
+    """
+    The previous figure builder: one boolean filter of the table per company and subplot.
+    """
+    fig = make_subplots(rows=1, cols=2)
+    filtered_df = pivot_df[pivot_df['year'].between(years[0], years[1])]
+    for col, (metric, showlegend) in enumerate([(metric1, None), (metric2, False)], start=1):
+        for company in unique_companies:
+            company_data = filtered_df[filtered_df['company'] == company]
+            if not company_data.empty:
+                fig.add_trace(go.Scatter(x=company_data['year'], y=company_data[metric], mode='lines',
+                                         name=company, legendgroup=company, showlegend=showlegend,
+                                         line=dict(color=color_map[company])), row=1, col=col)
+    return fig
+
+def bars_per_company(agg_df: pd.DataFrame, color_map: Dict[str, str]) -> go.Figure:
+    """
+    The previous risk score figure: one bar trace per company and score, with threshold lines.
+    """
+    fig = make_subplots(rows=1, cols=2)
+    for col, (metric, showlegend) in enumerate([('zscore', True), ('mscore', False)], start=1):
+        for company, score in zip(agg_df['company'], agg_df[metric]):
+            fig.add_trace(go.Bar(x=[''], y=[score], name=company, legendgroup=company, showlegend=showlegend,
+                                 marker_color=color_map[company]), row=1, col=col)
+    fig.add_trace(go.Scatter(x=[''], y=[1.81], mode='lines', line=dict(color='red', dash='dash')), row=1, col=1)
+    fig.add_trace(go.Scatter(x=[''], y=[-1.78], mode='lines', line=dict(color='red', dash='dash')), row=1, col=2)
+    return fig
+
+def wide_table(pivot_df: pd.DataFrame, n_companies: int) -> pd.DataFrame:
+    """
+    Returns a (year, company) table of `n_companies` companies, copying the real ones under new names.
+    """
+    companies = pivot_df['company'].astype(str).unique()
+    copies = []
+    for i in range(-(-n_companies // len(companies))):
+        copy = pivot_df.copy()
+        copy['company'] = copy['company'].astype(str) + f' #{i}'
+        copies.append(copy)
+    table = pd.concat(copies, ignore_index=True)
+    kept = table['company'].unique()[:n_companies]
+    table = table[table['company'].isin(kept)].sort_values(['year', 'company'], kind='stable')
+    table['company'] = table['company'].astype('category')
+    return table.reset_index(drop=True)
+
+def main(csv_path: str) -> None:
+    cube = MetricCube.from_frame(load_dataset(csv_path))
+    pivot_df = WideTable(cube).select()
+    years = (int(cube.years[0]), int(cube.years[-1]))
+
+    print(f'{"companies":>10s}{"rows":>8s}{"grouped (ms)":>16s}{"per company (ms)":>20s}{"ms per company":>17s}')
+    for n_companies in [5, 100, 1000]:
+        table = wide_table(pivot_df, n_companies)
+        unique_companies = list(table['company'].unique())
+        color_map = {company: 'rgba(31, 119, 180, 1.0)' for company in unique_companies}
+        args = (table, unique_companies, color_map, 'cash_ratio', 'current_ratio', years)
+        grouped = time_ms(lambda: create_financial_plot(*args, ['', ''], ''))
+        looped = time_ms(lambda: filter_per_company(*args), repeat=1)
+        print(f'{n_companies:10d}{len(table):8d}{grouped:16.1f}{looped:20.1f}{grouped / n_companies:17.2f}')
+
+    averages = RiskScreen(cube).table()
+    print()
+    print(f'{"companies":>10s}{"one trace (ms)":>16s}{"JSON (kB)":>11s}{"per company (ms)":>18s}{"JSON (kB)":>11s}')
+    for n_companies in [5, 100, 1000]:
+        agg_df = wide_table(averages.assign(year=0), n_companies).drop(columns='year')
+        agg_df['company'] = agg_df['company'].astype(str)
+        color_map = {company: 'rgba(31, 119, 180, 1.0)' for company in agg_df['company']}
+        single = time_ms(lambda: create_risk_plot(agg_df, color_map))
+        looped = time_ms(lambda: bars_per_company(agg_df, color_map), repeat=1)
+        single_kb = len(create_risk_plot(agg_df, color_map).to_json()) / 1000
+        looped_kb = len(bars_per_company(agg_df, color_map).to_json()) / 1000
+        print(f'{n_companies:10d}{single:16.1f}{single_kb:11.1f}{looped:18.1f}{looped_kb:11.1f}')
+
+
+if __name__ == '__main__':
+    main(sys.argv[1] if len(sys.argv) > 1 else
+         os.path.join(os.path.dirname(__file__), '..', 'cleaned_data.csv'))
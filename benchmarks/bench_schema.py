@@ -0,0 +1,57 @@
+###############################################################################
+# Memory and latency of the categorical dataset schema
+#
+# Compares the object-dtype frame returned by a plain `pd.read_csv` with the
+# dictionary-encoded frame returned by `dashboard.data_store.read_csv` on the
+# operations app.py performs on every rerun.
+#
+# Usage: python benchmarks/bench_schema.py [path/to/cleaned_data.csv]
+import os
+import sys
+import timeit
+from typing import Callable, Dict
+
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+from dashboard.data_store import read_csv
+
+
+def time_ms(func: Callable, repeat: int = 7, number: int = 20) -> float:
+    """
+    Returns the best-of-`repeat` wall time of one call, in milliseconds.
+    """
+    return min(timeit.repeat(func, repeat=repeat, number=number)) * 1000. / number
+
+def operations(df: pd.DataFrame) -> Dict[str, Callable]:
+    """
+    Returns the per-rerun operations of app.py, bound to a frame.
+    """
+    sectors = ['Information Technology', 'Health Care']
+    return {
+        "df['metric'] == 'mscore'": lambda: df['metric'] == 'mscore',
+        "df['sector'].isin(sectors)": lambda: df['sector'].isin(sectors),
+        "df['year'].between(2019, 2021)": lambda: df['year'].between(2019, 2021),
+        "groupby('company') mean": lambda: df.groupby('company', observed=True)['value'].mean(),
+        "pivot_table(year, company)": lambda: df.pivot_table(index=['year', 'company'], columns='metric',
+                                                              values='value', observed=True),
+    }
+
+def main(csv_path: str) -> None:
+    frames = {'object': pd.read_csv(csv_path), 'categorical': read_csv(csv_path)}
+
+    print(f'{"":36s}{"object":>12s}{"categorical":>14s}{"ratio":>8s}')
+    memory = {name: frame.memory_usage(deep=True).sum() / 2 ** 20 for name, frame in frames.items()}
+    print(f'{"resident memory (MiB)":36s}{memory["object"]:12.2f}{memory["categorical"]:14.2f}'
+          f'{memory["object"] / memory["categorical"]:7.1f}x')
+
+    timings = {name: {label: time_ms(op) for label, op in operations(frame).items()}
+               for name, frame in frames.items()}
+    for label in timings['object']:
+        before, after = timings['object'][label], timings['categorical'][label]
+        print(f'{label + " (ms)":36s}{before:12.3f}{after:14.3f}{before / after:7.1f}x')
+
+
+if __name__ == '__main__':
+    main(sys.argv[1] if len(sys.argv) > 1 else
+         os.path.join(os.path.dirname(__file__), '..', 'cleaned_data.csv'))
@@ -0,0 +1,7 @@
+"""
+Data and analytics helpers for the NASDAQ-100 financial dashboard.
+
+The modules in this package are free of Streamlit calls so they can be
+imported from the app, the notebook or the command line alike; `app.py`
+is responsible for wrapping them in the Streamlit caches.
+"""
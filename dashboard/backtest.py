@@ -0,0 +1,240 @@
+###############################################################################
+# Vectorized annual-rebalance backtests on rate_of_return
+#
+# A strategy ranks the companies by a signal at the end of every year,
+# holds the best of them with equal weights through the following year, and
+# earns their `rate_of_return` of that year. Many strategies are evaluated
+# together: their signals are stacked into a (strategy, company, year)
+# array, ranked along the company axis in one sort, turned into weights,
+# and multiplied with the (company, year) returns in a single product
+#
+#     period_return[s, t] = sum_c weight[s, c, t] * return[c, t + 1]
+#
+# Holdings without a return in the holding year are dropped and the rest
+# re-weighted, so a missing value never counts as a zero return. Signals are
+# oriented so that higher is better; NaN signals are never held, and neither
+# are metric values outside the ranked range of their metric.
+from typing import Dict, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+from dashboard.cube import MetricCube
+from dashboard.leaderboard import metric_direction, ranked_values
+from dashboard.scoring import CompositeScorer
+
+
+# Metric holding the yearly return of every company, in percent
+RETURN_METRIC = 'rate_of_return'
+
+# Statistics of every strategy reported by `Backtester.summary`
+SUMMARY_COLUMNS = ['total_return', 'cagr', 'volatility', 'max_drawdown', 'excess_cagr']
+
+
+def metric_signals(cube: MetricCube, metrics: Sequence[str]) -> np.ndarray:
+    """
+    Returns metrics as selection signals, with lower-is-better metrics negated and values
+    outside the ranked range of their metric (see RANKED_RANGES) left out as NaN.
+
+    Parameters:
+    cube (MetricCube): The cube.
+    metrics (Sequence[str]): One metric per strategy.
+
+    Returns:
+    np.ndarray: Signals of shape (strategies, companies, years).
+    """
+    sign = np.array([-1. if metric_direction(m) == 'min' else 1. for m in metrics])
+    values = ranked_values(cube.values[:, [cube.metric_index[m] for m in metrics], :], metrics)
+    return values.transpose(1, 0, 2) * sign[:, None, None]
+
+def composite_signals(scorer: CompositeScorer, family_weights: Sequence[Dict[str, float]]) -> np.ndarray:
+    """
+    Returns composite scores as selection signals, one strategy per set of family weights.
+
+    Parameters:
+    scorer (CompositeScorer): The composite scorer.
+    family_weights (Sequence[Dict[str, float]]): Weight of each factor family, per strategy.
+
+    Returns:
+    np.ndarray: Signals of shape (strategies, companies, years).
+    """
+    weights = np.stack([scorer.weights(w) for w in family_weights], axis=1)
+    return np.stack([scorer.scores(weights, year) for year in scorer.years], axis=-1).transpose(1, 0, 2)
+
+def screen_signals(masks: np.ndarray) -> np.ndarray:
+    """
+    Returns screen results as selection signals: every company passing the screen is held.
+
+    Parameters:
+    masks (np.ndarray): Boolean masks of shape (strategies, companies, years).
+
+    Returns:
+    np.ndarray: Signals of shape (strategies, companies, years), 0 where the screen passes and NaN elsewhere.
+    """
+    return np.where(masks, 0., np.nan)
+
+
+class Backtester:
+    """
+    Equity curves of annually rebalanced, equally weighted top-N portfolios.
+
+    Attributes:
+        years (np.ndarray): Years of the cube; portfolios formed at the end of a year are held through the next.
+        periods (np.ndarray): Holding years, i.e. every year but the first.
+        returns (np.ndarray): Yearly returns of shape (companies, years), in percent.
+    """
+
+    def __init__(self, cube: MetricCube, return_metric: str = RETURN_METRIC):
+        self._cube = cube
+        self.years = cube.years
+        self.periods = cube.years[1:]
+        self.returns = cube.metric(return_metric)
+        self._known = ~np.isnan(self.returns[:, 1:])
+        self._held_returns = np.where(self._known, self.returns[:, 1:], 0.)
+
+    def _universe(self, companies: Optional[Sequence[str]]) -> np.ndarray:
+        # Mask of the companies a portfolio may hold
+        if companies is None:
+            return np.ones(len(self._cube.companies), dtype=bool)
+        return np.isin(self._cube.companies, list(companies))
+
+    def weights(self, signals: np.ndarray, top: np.ndarray, companies: Optional[Sequence[str]] = None) -> np.ndarray:
+        """
+        Returns the equal portfolio weights of every strategy and formation year.
+
+        Parameters:
+        signals (np.ndarray): Signals of shape (strategies, companies, years), higher is better.
+        top (np.ndarray): Companies held per strategy: a count (1 or more, np.inf for all with a
+            signal), or a fraction below 1 of the companies with a signal, rounded up.
+        companies (Sequence[str], optional): Companies that may be held; all companies when omitted.
+
+        Returns:
+        np.ndarray: Weights of shape (strategies, companies, years), each (strategy, year) summing to 1
+        or to 0 when nothing is held.
+        """
+        top = np.broadcast_to(np.asarray(top, dtype=float), signals.shape[:1])
+        valid = ~np.isnan(signals) & self._universe(companies)[None, :, None]
+        count = valid.sum(axis=1)
+
+        # Position of every company in the descending order of its strategy and year; ties keep company order
+        order = np.argsort(np.where(valid, -signals, np.inf), axis=1, kind='stable')
+        rank = np.empty_like(order)
+        np.put_along_axis(rank, order, np.arange(signals.shape[1])[None, :, None], axis=1)
+
+        fraction = np.minimum(top, 1.)[:, None]
+        held_count = np.where(fraction < 1, np.ceil(fraction * count), top[:, None])
+        held = valid & (rank < held_count[:, None, :])
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return np.nan_to_num(held / held.sum(axis=1, keepdims=True))
+
+    def run(self, weights: np.ndarray) -> np.ndarray:
+        """
+        Returns the return of every strategy in every holding year.
+
+        Parameters:
+        weights (np.ndarray): Weights of shape (strategies, companies, years), see `weights`.
+
+        Returns:
+        np.ndarray: Returns of shape (strategies, periods), in percent; NaN when nothing with a
+        known return is held.
+        """
+        formed = weights[:, :, :-1]
+        earned = np.einsum('sct,ct->st', formed, self._held_returns)
+        invested = np.einsum('sct,ct->st', formed, self._known.astype(float))
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return np.where(invested > 0, earned / invested, np.nan)
+
+    def benchmark(self, companies: Optional[Sequence[str]] = None) -> np.ndarray:
+        """
+        Returns the return of the equally weighted universe in every holding year.
+
+        Parameters:
+        companies (Sequence[str], optional): Companies of the universe; all companies when omitted.
+
+        Returns:
+        np.ndarray: Returns per period, in percent.
+        """
+        universe = self._universe(companies)
+        weights = np.broadcast_to(universe[None, :, None] / max(universe.sum(), 1), (1,) + self.returns.shape)
+        return self.run(weights)[0]
+
+    @staticmethod
+    def equity(period_returns: np.ndarray) -> np.ndarray:
+        """
+        Returns the growth of 1 invested at the start, with years without a return held in cash.
+
+        Parameters:
+        period_returns (np.ndarray): Returns of shape (..., periods), in percent.
+
+        Returns:
+        np.ndarray: Equity of shape (..., periods + 1), starting at 1.
+        """
+        growth = np.cumprod(1 + np.nan_to_num(period_returns) / 100, axis=-1)
+        return np.concatenate([np.ones(growth.shape[:-1] + (1,)), growth], axis=-1)
+
+    def summary(self, period_returns: np.ndarray, benchmark: Optional[np.ndarray] = None) -> pd.DataFrame:
+        """
+        Returns the performance statistics of every strategy.
+
+        Parameters:
+        period_returns (np.ndarray): Returns of shape (strategies, periods), see `run`.
+        benchmark (np.ndarray, optional): Benchmark returns over the same periods; all periods of
+            `benchmark()` when omitted.
+
+        Returns:
+        pd.DataFrame: One row per strategy with `SUMMARY_COLUMNS`, all in percent: total return,
+        compound annual return, standard deviation of the yearly returns, largest fall of the
+        equity curve from a previous high, and the compound annual return above the benchmark;
+        NaN for strategies without any return.
+        """
+        period_returns = np.atleast_2d(period_returns)
+        equity = self.equity(period_returns)
+        years = period_returns.shape[1]
+        benchmark = self.benchmark() if benchmark is None else benchmark
+        benchmark_cagr = (self.equity(benchmark)[-1] ** (1 / years) - 1) * 100
+        cagr = (equity[:, -1] ** (1 / years) - 1) * 100
+
+        # Sample standard deviation over the years with a return
+        known = ~np.isnan(period_returns)
+        count = known.sum(axis=1)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            mean = np.where(known, period_returns, 0.).sum(axis=1) / count
+            deviation = np.where(known, period_returns - mean[:, None], 0.)
+            volatility = np.sqrt((deviation * deviation).sum(axis=1) / (count - 1))
+
+        table = pd.DataFrame({
+            'total_return': (equity[:, -1] - 1) * 100,
+            'cagr': cagr,
+            'volatility': np.where(count > 1, volatility, np.nan),
+            'max_drawdown': ((equity / np.maximum.accumulate(equity, axis=1)).min(axis=1) - 1) * 100,
+            'excess_cagr': cagr - benchmark_cagr,
+        }, columns=SUMMARY_COLUMNS)
+        # A strategy that never held anything has no performance, rather than a flat one
+        table.loc[count == 0] = np.nan
+        return table
+
+    def grid(self, metrics: Sequence[str], tops: Sequence[float], period: Optional[Tuple[int, int]] = None,
+             companies: Optional[Sequence[str]] = None) -> pd.DataFrame:
+        """
+        Backtests every combination of a signal metric and a portfolio size at once.
+
+        Parameters:
+        metrics (Sequence[str]): Metrics ranked by, each oriented with `metric_direction`.
+        tops (Sequence[float]): Portfolio sizes, see `weights`.
+        period (Tuple[int, int], optional): First and last holding year; all holding years when omitted.
+        companies (Sequence[str], optional): Companies that may be held, also the benchmark; all when omitted.
+
+        Returns:
+        pd.DataFrame: Columns 'metric' and 'top' followed by `SUMMARY_COLUMNS`, one row per combination.
+        """
+        metric_grid = np.repeat(np.asarray(metrics, dtype=object), len(tops))
+        top_grid = np.tile(np.asarray(tops, dtype=float), len(metrics))
+        signals = metric_signals(self._cube, metrics)
+        period_returns = self.run(self.weights(np.repeat(signals, len(tops), axis=0), top_grid, companies))
+        keep = np.ones(len(self.periods), dtype=bool)
+        if period is not None:
+            keep = (self.periods >= period[0]) & (self.periods <= period[1])
+        table = self.summary(period_returns[:, keep], self.benchmark(companies)[keep])
+        table.insert(0, 'top', top_grid)
+        table.insert(0, 'metric', metric_grid)
+        return table
@@ -0,0 +1,208 @@
+###############################################################################
+# Pairwise-complete metric correlations over the cube
+#
+# Every (company, year) of a selection is one observation of the ~40
+# metrics. With X the observation x metric matrix (missing values zeroed)
+# and W its 0/1 mask of present values, all the sums a pairwise-complete
+# Pearson correlation needs come out of four matrix products:
+#
+#     n   = W'W     (observations where both metrics are present)
+#     sx  = X'W     (sum of metric i where metric j is present)
+#     sxx = (X*X)'W
+#     sxy = X'X
+#
+# Spearman correlations are Pearson correlations of the ranks, with every
+# pair ranked over the observations it shares, like pandas does. For every
+# metric j, all metrics are ranked over the observations where j is present;
+# a pair (i, j) then correlates the ranks of i taken where j is present with
+# those of j taken where i is present, both over the same shared
+# observations. Each metric is sorted once: its rank among the observations
+# of any other metric is a running count of those observations along its
+# sorted order, averaged over ties. The ranks take one array of metrics x
+# observations x metrics values.
+# Matrices are cached per (company subset, year range, method).
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+from dashboard.cube import MetricCube
+
+
+# Correlation methods supported by `CorrelationEngine.matrix`
+METHODS = ('pearson', 'spearman')
+
+# Fewest shared observations for a pair to get a correlation
+MIN_PERIODS = 3
+
+# Matrices kept by the cache before the least recently used is dropped
+DEFAULT_CACHE_ENTRIES = 64
+
+
+def masked_corr(values: np.ndarray, min_periods: int = MIN_PERIODS) -> np.ndarray:
+    """
+    Pairwise-complete Pearson correlation of the columns of a matrix with missing values.
+
+    Equivalent to `DataFrame.corr(min_periods=min_periods)`, computed with matrix products.
+
+    Parameters:
+    values (np.ndarray): Observations (rows) x variables (columns), NaN where missing.
+    min_periods (int): Fewest shared observations for a pair to get a correlation. Default is 3.
+
+    Returns:
+    np.ndarray: Square correlation matrix, NaN where a pair has too few shared observations
+    or no variance over them.
+    """
+    mask = ~np.isnan(values)
+    weights = mask.astype(float)
+    # Centering every column on its own mean keeps the products well conditioned
+    with np.errstate(invalid='ignore', divide='ignore'):
+        center = np.where(mask.any(axis=0), np.nansum(values, axis=0) / mask.sum(axis=0), 0.)
+    x = np.where(mask, values - center, 0.)
+
+    n = weights.T @ weights
+    sx = x.T @ weights
+    sxx = (x * x).T @ weights
+    sxy = x.T @ x
+    with np.errstate(invalid='ignore', divide='ignore'):
+        covariance = sxy - sx * sx.T / n
+        variance = sxx - sx * sx / n
+        corr = covariance / np.sqrt(variance * variance.T)
+        # Variance lost to rounding counts as none; NaN compares False and is caught too
+        degenerate = ~(variance > 1e-12 * sxx)
+    corr = np.clip(corr, -1., 1.)
+    corr[(n < min_periods) | degenerate | degenerate.T] = np.nan
+    return corr
+
+
+def masked_spearman(values: np.ndarray, min_periods: int = MIN_PERIODS) -> np.ndarray:
+    """
+    Pairwise-complete Spearman correlation of the columns of a matrix with missing values.
+
+    Equivalent to `DataFrame.corr(method='spearman', min_periods=min_periods)`: every pair of
+    columns is ranked over the observations both have, ties sharing their average rank.
+
+    Parameters:
+    values (np.ndarray): Observations (rows) x variables (columns), NaN where missing.
+    min_periods (int): Fewest shared observations for a pair to get a correlation. Default is 3.
+
+    Returns:
+    np.ndarray: Square correlation matrix, NaN where a pair has too few shared observations
+    or no variance over them.
+    """
+    mask = ~np.isnan(values)
+    n_rows, n_columns = values.shape
+
+    # ranks[j, :, i]: ranks of column i over the rows where column j is present too
+    ranks = np.full((n_columns, n_rows, n_columns), np.nan)
+    for i in range(n_columns):
+        rows = np.flatnonzero(mask[:, i])
+        if not len(rows):
+            continue
+        order = rows[np.argsort(values[rows, i], kind='stable')]
+        ordered = values[order, i]
+        starts = np.flatnonzero(np.r_[True, ordered[1:] != ordered[:-1]])
+        # Per group of tied values and column j: rows of j before the group and within it
+        included = mask[order]
+        in_group = np.add.reduceat(included.astype(float), starts, axis=0)
+        before = np.cumsum(in_group, axis=0) - in_group
+        rank = np.repeat(before + (in_group + 1) / 2, np.diff(np.r_[starts, len(order)]), axis=0)
+        ranks[:, order, i] = np.where(included, rank, np.nan).T
+
+    x, y = ranks, ranks.transpose(2, 1, 0)
+    shared = ~np.isnan(x)
+
+    n = shared.sum(axis=1)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        dx = np.where(shared, x - np.nansum(x, axis=1, keepdims=True) / n[:, None, :], 0.)
+        dy = np.where(shared, y - np.nansum(y, axis=1, keepdims=True) / n[:, None, :], 0.)
+        variance_x, variance_y = (dx * dx).sum(axis=1), (dy * dy).sum(axis=1)
+        corr = (dx * dy).sum(axis=1) / np.sqrt(variance_x * variance_y)
+    corr = np.clip(corr, -1., 1.)
+    corr[(n < min_periods) | ~(variance_x > 0) | ~(variance_y > 0)] = np.nan
+    return corr
+
+
+class CorrelationEngine:
+    """
+    Metric correlation matrices of any company subset and year range, with an LRU cache.
+
+    Attributes:
+        metrics (np.ndarray): The metrics, along both axes of every matrix.
+    """
+
+    def __init__(self, cube: MetricCube, max_entries: int = DEFAULT_CACHE_ENTRIES):
+        self._cube = cube
+        self.metrics = cube.metrics
+        self._max_entries = max_entries
+        self._cache: 'OrderedDict[Tuple, pd.DataFrame]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _key(self, positions: np.ndarray, years: slice, method: str) -> Tuple:
+        subset = hashlib.blake2b(positions.astype(np.int64).tobytes(), digest_size=16).hexdigest()
+        return subset, years.start, years.stop, method
+
+    def matrix(self, companies: Optional[Sequence[str]] = None, years: Optional[Tuple[int, int]] = None,
+               method: str = 'pearson') -> pd.DataFrame:
+        """
+        Returns the correlation matrix of all metrics over the (company, year) observations of a selection.
+
+        Parameters:
+        companies (Sequence[str], optional): Companies to include; all companies when omitted.
+        years (Tuple[int, int], optional): The first and last year, both inclusive; all years when omitted.
+        method (str): 'pearson' or 'spearman'. Default is 'pearson'.
+
+        Returns:
+        pd.DataFrame: Metric x metric correlations; the cached frame is shared, so it must not be modified.
+        """
+        if method not in METHODS:
+            raise ValueError(f'Unknown correlation method {method!r}, expected one of {METHODS}')
+        if companies is None:
+            positions = np.arange(len(self._cube.companies))
+        else:
+            positions = np.unique([self._cube.company_index[c] for c in companies if c in self._cube.company_index])
+        year_range = self._cube.year_slice(*years) if years is not None else self._cube.year_slice()
+        key = self._key(positions, year_range, method)
+        with self._lock:
+            if key in self._cache:
+                self._cache.move_to_end(key)
+                return self._cache[key]
+
+        # (company, year) observations x metrics
+        block = self._cube.values[positions][:, :, year_range]
+        observations = block.transpose(0, 2, 1).reshape(-1, len(self.metrics))
+        corr = masked_spearman(observations) if method == 'spearman' else masked_corr(observations)
+        result = pd.DataFrame(corr,
+                              index=pd.Index(self.metrics, name='metric'), columns=pd.Index(self.metrics, name='metric'))
+
+        with self._lock:
+            self._cache[key] = result
+            while len(self._cache) > self._max_entries:
+                self._cache.popitem(last=False)
+        return result
+
+    @staticmethod
+    def strongest_pairs(matrix: pd.DataFrame, n: int = 10) -> pd.DataFrame:
+        """
+        Returns the most strongly correlated distinct metric pairs of a correlation matrix.
+
+        Parameters:
+        matrix (pd.DataFrame): A matrix returned by `matrix`.
+        n (int): Number of pairs. Default is 10.
+
+        Returns:
+        pd.DataFrame: Columns 'metric_1', 'metric_2' and 'correlation', strongest (by absolute value) first.
+        """
+        values = matrix.to_numpy()
+        upper_i, upper_j = np.triu_indices(len(values), k=1)
+        correlation = values[upper_i, upper_j]
+        keep = ~np.isnan(correlation)
+        order = np.argsort(-np.abs(correlation[keep]), kind='stable')[:n]
+        return pd.DataFrame({
+            'metric_1': matrix.index.to_numpy()[upper_i[keep][order]],
+            'metric_2': matrix.columns.to_numpy()[upper_j[keep][order]],
+            'correlation': correlation[keep][order],
+        })
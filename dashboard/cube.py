@@ -0,0 +1,204 @@
+###############################################################################
+# Dense company x metric x year representation of the long-format dataset
+#
+# The long frame has at most one value per (company, metric, year), so it fits
+# a dense 3-D float array with NaN for missing values. The array is built once
+# per dataset version from the categorical codes of the frame and shared
+# read-only; per-rerun questions ("the P/E of every company in 2023", "the
+# average M-score per company") become index and slice operations on it.
+from typing import Dict, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+
+class MetricCube:
+    """
+    Dense (company, metric, year) array of metric values with integer axis lookups.
+
+    Attributes:
+        values (np.ndarray): Read-only float64 array of shape (companies, metrics, years), NaN where missing.
+        companies (np.ndarray): Company names along axis 0, in the categorical order of the dataset.
+        metrics (np.ndarray): Metric names along axis 1.
+        years (np.ndarray): Consecutive years along axis 2.
+        symbols, sectors, subsectors (np.ndarray): Ticker attributes, aligned with `companies`.
+        company_index, metric_index (Dict[str, int]): Name to axis position lookups.
+    """
+
+    def __init__(self, values: np.ndarray, companies: np.ndarray, metrics: np.ndarray, years: np.ndarray,
+                 symbols: np.ndarray, sectors: np.ndarray, subsectors: np.ndarray):
+        values.flags.writeable = False
+        self.values = values
+        self.companies = companies
+        self.metrics = metrics
+        self.years = years
+        self.symbols = symbols
+        self.sectors = sectors
+        self.subsectors = subsectors
+        self.company_index: Dict[str, int] = {name: i for i, name in enumerate(companies)}
+        self.metric_index: Dict[str, int] = {name: i for i, name in enumerate(metrics)}
+
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame) -> 'MetricCube':
+        """
+        Builds the cube from a long-format frame following `dashboard.data_store.SCHEMA`.
+
+        Parameters:
+        df (pd.DataFrame): The long-format dataset with categorical label columns.
+
+        Returns:
+        MetricCube: The dense representation of `df`.
+        """
+        company_codes = df['company'].cat.codes.to_numpy()
+        metric_codes = df['metric'].cat.codes.to_numpy()
+        year = df['year'].to_numpy()
+        first_year = int(year.min())
+        years = np.arange(first_year, int(year.max()) + 1)
+
+        # Scatter every row into its cell; cells without a row stay NaN
+        companies = df['company'].cat.categories.to_numpy()
+        metrics = df['metric'].cat.categories.to_numpy()
+        values = np.full((len(companies), len(metrics), len(years)), np.nan)
+        values[company_codes, metric_codes, year - first_year] = df['value'].to_numpy()
+
+        # Symbol, sector and subsector are attributes of the company, taken from its first row
+        first_row = np.full(len(companies), -1)
+        first_row[company_codes[::-1]] = np.arange(len(df))[::-1]
+        symbols, sectors, subsectors = (df[col].to_numpy()[first_row] for col in ['symbol', 'sector', 'subsector'])
+        return cls(values, companies, metrics, years, symbols, sectors, subsectors)
+
+    @property
+    def shape(self) -> tuple:
+        return self.values.shape
+
+    def year_position(self, year: int) -> int:
+        """
+        Returns the position of a year along the year axis.
+
+        Raises:
+        KeyError: If the cube holds no such year.
+        """
+        position = int(year) - int(self.years[0])
+        if not 0 <= position < len(self.years):
+            raise KeyError(f'Year {year} is outside the years of the dataset, {self.years[0]} to {self.years[-1]}')
+        return position
+
+    def year_slice(self, start: Optional[int] = None, end: Optional[int] = None) -> slice:
+        """
+        Returns the slice of the year axis covering `start` to `end`, both inclusive.
+
+        Parameters:
+        start (int, optional): First year; the first year of the cube when omitted.
+        end (int, optional): Last year; the last year of the cube when omitted.
+
+        Returns:
+        slice: A slice clipped to the years held by the cube.
+        """
+        first = 0 if start is None else max(int(start) - int(self.years[0]), 0)
+        last = len(self.years) if end is None else min(int(end) - int(self.years[0]) + 1, len(self.years))
+        return slice(first, max(first, last))
+
+    def metric(self, metric: str) -> np.ndarray:
+        """
+        Returns the (company, year) view of one metric.
+        """
+        return self.values[:, self.metric_index[metric], :]
+
+    def get(self, metric: str, year: int) -> np.ndarray:
+        """
+        Returns the per-company values of one metric in one year as a view.
+
+        Raises:
+        KeyError: If the cube holds no such metric or year.
+        """
+        return self.values[:, self.metric_index[metric], self.year_position(year)]
+
+
+
+class WideTable:
+    """
+    The (year, company) x metric table of the dataset, materialized once from the cube.
+
+    This is the frame `pivot_table(index=['year', 'company'], columns='metric', values='value')`
+    produces, built for every company and year up front so that views of it are row selections.
+
+    Attributes:
+        frame (pd.DataFrame): 'year' and 'company' columns followed by one column per metric,
+            with one row per (year, company) pair in year-major order.
+    """
+
+    def __init__(self, cube: MetricCube):
+        n_companies, n_metrics, n_years = cube.shape
+        self._n_companies = n_companies
+        self._first_year = int(cube.years[0])
+        self._n_years = n_years
+        self._company_index = cube.company_index
+
+        # Row (y * n_companies + c) holds company c in year y
+        values = np.ascontiguousarray(cube.values.transpose(2, 0, 1)).reshape(n_years * n_companies, n_metrics)
+        self.frame = pd.DataFrame(values, columns=pd.Index(cube.metrics, name='metric'))
+        self.frame.insert(0, 'company', pd.Categorical.from_codes(np.tile(np.arange(n_companies), n_years),
+                                                                  cube.companies))
+        self.frame.insert(0, 'year', np.repeat(cube.years, n_companies))
+
+        # pivot_table drops (year, company) pairs without any value
+        self._has_data = ~np.isnan(values).all(axis=1)
+
+    def rows(self, companies: Optional[Sequence[str]] = None, years: Optional[Tuple[int, int]] = None,
+             by: str = 'year', dropna: bool = True) -> np.ndarray:
+        """
+        Returns the positions of the rows of the selected companies within a year range.
+
+        Parameters:
+        companies (Sequence[str], optional): Companies to select; all companies when omitted.
+        years (Tuple[int, int], optional): The first and last year, both inclusive; all years when omitted.
+        by (str): Row order, 'year' for (year, company) like pivot_table or 'company' for (company, year).
+        dropna (bool): Whether to leave out (year, company) pairs without any value. Default is True.
+
+        Returns:
+        np.ndarray: Row positions in `frame`.
+        """
+        if companies is None:
+            codes = np.arange(self._n_companies)
+        else:
+            codes = np.unique([self._company_index[c] for c in companies if c in self._company_index])
+        first, last = 0, self._n_years - 1
+        if years is not None:
+            first = max(int(years[0]) - self._first_year, 0)
+            last = min(int(years[1]) - self._first_year, self._n_years - 1)
+        year_positions = np.arange(first, last + 1)
+
+        # Outer sum of year and company offsets, flattened in the requested order
+        if by == 'year':
+            rows = (year_positions[:, None] * self._n_companies + codes[None, :]).ravel()
+        else:
+            rows = (codes[:, None] + year_positions[None, :] * self._n_companies).ravel()
+        return rows[self._has_data[rows]] if dropna else rows
+
+    def select(self, companies: Optional[Sequence[str]] = None, years: Optional[Tuple[int, int]] = None,
+               by: str = 'year', dropna: bool = True) -> pd.DataFrame:
+        """
+        Returns the rows of the selected companies within a year range, see `rows`.
+
+        Returns:
+        pd.DataFrame: The selected rows with a fresh RangeIndex.
+        """
+        return self.frame.take(self.rows(companies, years, by, dropna)).reset_index(drop=True)
+
+
+def nanmean(values: np.ndarray, axis: int) -> np.ndarray:
+    """
+    Mean over an axis ignoring NaN, returning NaN (without a warning) where every value is missing.
+
+    Parameters:
+    values (np.ndarray): Array possibly containing NaN.
+    axis (int): Axis to average over.
+
+    Returns:
+    np.ndarray: The NaN-aware mean with `axis` removed.
+    """
+    valid = ~np.isnan(values)
+    count = valid.sum(axis=axis)
+    total = np.where(valid, values, 0.).sum(axis=axis)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return np.where(count > 0, total / count, np.nan)
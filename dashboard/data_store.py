@@ -0,0 +1,328 @@
+###############################################################################
+# Loading of the long-format dataset behind a columnar on-disk snapshot
+#
+# Parsing `cleaned_data.csv` is the most expensive part of a cold start. The
+# first load of a CSV therefore writes an uncompressed Arrow IPC (Feather v2)
+# snapshot of the parsed frame into a `.cache` directory next to the CSV, and
+# every later cold start memory-maps that snapshot instead of parsing text.
+# Snapshots are keyed by the content hash of the CSV, so editing or replacing
+# the CSV transparently produces a new snapshot.
+#
+# The frame follows a fixed schema: the label columns are dictionary-encoded
+# categoricals with sorted categories and `year` is a small integer, so the
+# masks and groupbys in the app compare integer codes instead of strings.
+#
+# Rows are physically clustered on (company, year, metric): the rows of a
+# company are contiguous and ordered by year, so company and year-range
+# selections are slices of the frame (see `dashboard.layout`).
+import hashlib
+import json
+import os
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.feather as feather
+
+
+# Bump whenever the layout of the snapshot changes so old snapshots are rebuilt
+SNAPSHOT_FORMAT = 3
+
+# Label columns stored as dictionary-encoded categoricals
+CATEGORICAL_COLUMNS: List[str] = ['company', 'symbol', 'sector', 'subsector', 'metric']
+
+# Schema of the long-format dataset, in column order
+SCHEMA: Dict[str, str] = {
+    'company': 'category',
+    'symbol': 'category',
+    'sector': 'category',
+    'subsector': 'category',
+    'metric': 'category',
+    'year': 'int16',
+    'value': 'float64',
+}
+
+# Physical sort order of the rows
+CLUSTER_KEY: List[str] = ['company', 'year', 'metric']
+
+# Name of the directory (created next to the CSV) holding snapshots and manifests
+CACHE_DIR_NAME = '.cache'
+
+# Read size used while hashing the CSV
+_HASH_CHUNK_SIZE = 1 << 20
+
+
+def cache_dir(csv_path: str) -> str:
+    """
+    Returns the snapshot directory that belongs to a CSV file.
+
+    Parameters:
+    csv_path (str): Path to the source CSV file.
+
+    Returns:
+    str: Path of the `.cache` directory next to the CSV file.
+    """
+    return os.path.join(os.path.dirname(os.path.abspath(csv_path)), CACHE_DIR_NAME)
+
+def _manifest_path(csv_path: str) -> str:
+    stem = os.path.splitext(os.path.basename(csv_path))[0]
+    return os.path.join(cache_dir(csv_path), f'{stem}.manifest.json')
+
+def _content_hash(csv_path: str) -> str:
+    digest = hashlib.sha256()
+    with open(csv_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(_HASH_CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def _read_manifest(csv_path: str) -> Optional[Dict]:
+    try:
+        with open(_manifest_path(csv_path)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def _write_manifest(csv_path: str, manifest: Dict) -> None:
+    path = _manifest_path(csv_path)
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f'{path}.{os.getpid()}.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(manifest, f)
+        os.replace(tmp_path, path)
+    except OSError:
+        # A read-only checkout still works, it just rehashes on every cold start
+        pass
+
+def dataset_version(csv_path: str) -> str:
+    """
+    Computes a version key that changes whenever the content of the CSV changes.
+
+    The content hash is remembered in a small manifest together with the size and
+    modification time of the file, so the file is only rehashed when one of those changes.
+
+    Parameters:
+    csv_path (str): Path to the source CSV file.
+
+    Returns:
+    str: A short version string combining the content hash and the snapshot format.
+    """
+    stat = os.stat(csv_path)
+    manifest = _read_manifest(csv_path)
+    if (manifest is None or manifest.get('size') != stat.st_size
+            or manifest.get('mtime_ns') != stat.st_mtime_ns):
+        manifest = {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns,
+                    'sha256': _content_hash(csv_path)}
+        _write_manifest(csv_path, manifest)
+    return f"{manifest['sha256'][:16]}-v{SNAPSHOT_FORMAT}"
+
+def snapshot_path(csv_path: str, version: str) -> str:
+    """
+    Returns the location of the snapshot for a given CSV file and dataset version.
+
+    Parameters:
+    csv_path (str): Path to the source CSV file.
+    version (str): Dataset version as returned by `dataset_version`.
+
+    Returns:
+    str: Path of the Feather snapshot file.
+    """
+    stem = os.path.splitext(os.path.basename(csv_path))[0]
+    return os.path.join(cache_dir(csv_path), f'{stem}-{version}.feather')
+
+def apply_schema(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Casts a long-format frame to the dataset schema.
+
+    Categories are sorted so that the integer codes of a column are stable for a given
+    set of labels, whatever order the rows arrive in.
+
+    Parameters:
+    df (pd.DataFrame): Frame with at least the columns listed in `SCHEMA`.
+
+    Returns:
+    pd.DataFrame: A new frame with the columns of `SCHEMA`, in schema order and dtypes.
+    """
+    columns = {}
+    for name, dtype in SCHEMA.items():
+        column = df[name]
+        if dtype == 'category':
+            if not isinstance(column.dtype, pd.CategoricalDtype):
+                column = column.astype('category')
+            column = column.cat.remove_unused_categories()
+            categories = column.cat.categories
+            if not categories.is_monotonic_increasing:
+                column = column.cat.reorder_categories(categories.sort_values())
+        else:
+            column = column.astype(dtype)
+        columns[name] = column.reset_index(drop=True)
+    return pd.DataFrame(columns)
+
+def cluster_key(df: pd.DataFrame) -> np.ndarray:
+    """
+    Encodes the (company, year, metric) clustering key of every row as one integer.
+
+    Parameters:
+    df (pd.DataFrame): A frame following `SCHEMA`.
+
+    Returns:
+    np.ndarray: int64 keys that sort in (company, year, metric) order.
+    """
+    year = df['year'].to_numpy().astype(np.int64)
+    first_year = int(year.min()) if len(year) else 0
+    n_years = int(year.max()) - first_year + 1 if len(year) else 1
+    n_metrics = len(df['metric'].cat.categories)
+    company = df['company'].cat.codes.to_numpy().astype(np.int64)
+    metric = df['metric'].cat.codes.to_numpy().astype(np.int64)
+    return (company * n_years + (year - first_year)) * n_metrics + metric
+
+def cluster(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Sorts a frame following `SCHEMA` on `CLUSTER_KEY`, unless it already is.
+
+    Parameters:
+    df (pd.DataFrame): A frame following `SCHEMA`.
+
+    Returns:
+    pd.DataFrame: The clustered frame with a fresh RangeIndex (`df` itself if already clustered).
+    """
+    key = cluster_key(df)
+    if (np.diff(key) >= 0).all():
+        return df
+    return df.take(np.argsort(key, kind='stable')).reset_index(drop=True)
+
+def conforms_to_schema(df: pd.DataFrame) -> bool:
+    """
+    Checks whether a frame already has the columns and dtypes of `SCHEMA`.
+
+    Parameters:
+    df (pd.DataFrame): The frame to check.
+
+    Returns:
+    bool: True if `apply_schema` would not change the frame.
+    """
+    if list(df.columns) != list(SCHEMA):
+        return False
+    for name, dtype in SCHEMA.items():
+        if dtype == 'category':
+            if not (isinstance(df[name].dtype, pd.CategoricalDtype)
+                    and df[name].cat.categories.is_monotonic_increasing):
+                return False
+        elif df[name].dtype != dtype:
+            return False
+    return True
+
+def read_csv(csv_path: str) -> pd.DataFrame:
+    """
+    Parses a long-format CSV straight into the dataset schema and clustering order.
+
+    Parameters:
+    csv_path (str): Path to the CSV file.
+
+    Returns:
+    pd.DataFrame: The parsed frame following `SCHEMA`, sorted on `CLUSTER_KEY`.
+    """
+    return cluster(apply_schema(pd.read_csv(csv_path, dtype=SCHEMA)))
+
+def to_arrow(df: pd.DataFrame) -> pa.Table:
+    """
+    Converts a DataFrame to an Arrow table in the layout used by the snapshots.
+
+    Parameters:
+    df (pd.DataFrame): The frame to convert.
+
+    Returns:
+    pa.Table: The table, with NaN kept as a value in float columns.
+    """
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    # Keep NaN as a float value instead of an Arrow null, so float columns can be
+    # handed back to pandas without a copy when the snapshot is memory-mapped
+    for i, name in enumerate(table.column_names):
+        if pd.api.types.is_float_dtype(df[name]):
+            table = table.set_column(i, name, pa.array(df[name].to_numpy(), from_pandas=False))
+    return table
+
+def write_snapshot(df: pd.DataFrame, path: str) -> bool:
+    """
+    Atomically writes a DataFrame as an uncompressed Feather snapshot.
+
+    Parameters:
+    df (pd.DataFrame): The frame to store.
+    path (str): Destination path of the snapshot.
+
+    Returns:
+    bool: True if the snapshot was written, False if the location is not writable.
+    """
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Uncompressed buffers are required for the snapshot to be memory-mapped
+        feather.write_feather(to_arrow(df), tmp_path, compression='uncompressed')
+        os.replace(tmp_path, path)
+    except OSError:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        return False
+    return True
+
+def read_snapshot(path: str) -> pd.DataFrame:
+    """
+    Memory-maps a Feather snapshot and returns it as a DataFrame.
+
+    Parameters:
+    path (str): Path of the snapshot.
+
+    Returns:
+    pd.DataFrame: The stored frame; numeric columns without nulls share the mapped buffers.
+    """
+    table = feather.read_table(path, memory_map=True)
+    return table.to_pandas(split_blocks=True)
+
+def _remove_stale_snapshots(csv_path: str, keep: str) -> None:
+    stem = os.path.splitext(os.path.basename(csv_path))[0]
+    directory = cache_dir(csv_path)
+    for name in os.listdir(directory):
+        path = os.path.join(directory, name)
+        if name.startswith(f'{stem}-') and name.endswith('.feather') and path != keep:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+def load_dataset(csv_path: str, version: Optional[str] = None) -> pd.DataFrame:
+    """
+    Loads the long-format dataset, preferring the memory-mapped snapshot over the CSV.
+
+    A path ending in '.feather' (as written by `python -m dashboard.ingest -o data.feather`)
+    is itself a snapshot and is memory-mapped directly.
+
+    Parameters:
+    csv_path (str): Path to the source CSV (or Feather) file.
+    version (str, optional): Dataset version if already known; computed when omitted.
+
+    Returns:
+    pd.DataFrame: A pandas DataFrame containing the data from the CSV file, following `SCHEMA`
+    and sorted on `CLUSTER_KEY`.
+    """
+    if csv_path.endswith('.feather'):
+        df = read_snapshot(csv_path)
+        return cluster(df if conforms_to_schema(df) else apply_schema(df))
+
+    if version is None:
+        version = dataset_version(csv_path)
+    path = snapshot_path(csv_path, version)
+
+    # Warm start: map the binary snapshot instead of parsing text
+    if os.path.exists(path):
+        try:
+            return read_snapshot(path)
+        except (OSError, pa.ArrowInvalid):
+            # A truncated or foreign file is rebuilt below
+            pass
+
+    # Cold start: parse the CSV once and leave a snapshot behind for the next start
+    df = read_csv(csv_path)
+    if write_snapshot(df, path):
+        _remove_stale_snapshots(csv_path, keep=path)
+    return df
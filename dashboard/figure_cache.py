@@ -0,0 +1,146 @@
+###############################################################################
+# Byte-capped LRU cache of serialized Plotly figures
+#
+# A figure depends only on the view it shows: the dataset version, its
+# metrics, the set of companies, the year range and a few display options.
+# The cache keeps the JSON of every figure built under such a key, so that a
+# view seen before (in any session) is not constructed again. Entries are
+# immutable strings, safe to share between sessions, and their total size is
+# capped: the least recently used entries are dropped to stay under it.
+#
+# A cached figure is turned back into a `go.Figure` without re-validating
+# its properties, since it was validated when it was first built. A hit
+# saves building the traces only: `st.plotly_chart` accepts no prebuilt
+# JSON, and validates and serializes every figure it is given again.
+import hashlib
+import json
+import sys
+import threading
+from collections import OrderedDict
+from typing import Callable, Hashable, Optional, Sequence, Tuple
+
+import plotly.graph_objects as go
+
+
+# Total size of the cached figures before the least recently used are dropped
+DEFAULT_CACHE_BYTES = 64 * 2 ** 20
+
+
+def figure_from_json(spec: str) -> go.Figure:
+    """
+    Loads a figure serialized with `go.Figure.to_json`, skipping property validation.
+
+    Parameters:
+    spec (str): The figure JSON.
+
+    Returns:
+    go.Figure: The figure.
+    """
+    return go.Figure(json.loads(spec), _validate=False)
+
+
+class FigureCache:
+    """
+    Serialized figures keyed by the view they show, with LRU eviction under a byte budget.
+
+    Attributes:
+        max_bytes (int): Most bytes of figure JSON kept.
+        nbytes (int): Bytes of figure JSON currently kept.
+        hits (int): Lookups answered from the cache.
+        misses (int): Lookups that built the figure.
+    """
+
+    def __init__(self, max_bytes: int = DEFAULT_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries: 'OrderedDict[Tuple, str]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @staticmethod
+    def key(version: str, metrics: Sequence[str], companies: Optional[Sequence[str]],
+            years: Tuple[int, int], *options: Hashable) -> Tuple:
+        """
+        Returns the cache key of a view.
+
+        Parameters:
+        version (str): Dataset version.
+        metrics (Sequence[str]): Metrics shown, in subplot order.
+        companies (Sequence[str], optional): Companies shown, in any order; None for all companies.
+        years (Tuple[int, int]): The first and last year shown.
+        *options (Hashable): Anything else the figure depends on, such as titles or the render mode.
+
+        Returns:
+        Tuple: A hashable key; the company set is normalized and hashed.
+        """
+        subset = None
+        if companies is not None:
+            names = '\0'.join(sorted(set(map(str, companies))))
+            subset = hashlib.blake2b(names.encode(), digest_size=16).hexdigest()
+        return (version, tuple(metrics), subset, (int(years[0]), int(years[1]))) + options
+
+    def get(self, key: Tuple) -> Optional[str]:
+        """
+        Returns the JSON of a cached figure, marking it as recently used and counting the lookup.
+
+        Parameters:
+        key (Tuple): Key from `key`.
+
+        Returns:
+        str: The figure JSON, or None when it is not cached.
+        """
+        with self._lock:
+            spec = self._entries.get(key)
+            if spec is None:
+                self.misses += 1
+            else:
+                self._entries.move_to_end(key)
+                self.hits += 1
+            return spec
+
+    def put(self, key: Tuple, spec: str) -> None:
+        """
+        Stores the JSON of a figure, dropping the least recently used figures to stay under `max_bytes`.
+
+        A figure larger than `max_bytes` on its own is not stored.
+
+        Parameters:
+        key (Tuple): Key from `key`.
+        spec (str): The figure JSON.
+        """
+        size = sys.getsizeof(spec)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self.nbytes -= sys.getsizeof(self._entries.pop(key))
+            self._entries[key] = spec
+            self.nbytes += size
+            while self.nbytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self.nbytes -= sys.getsizeof(evicted)
+
+    def figure(self, key: Tuple, build: Callable[[], go.Figure]) -> go.Figure:
+        """
+        Returns the figure of a view, built only when it is not cached.
+
+        A hit skips building the traces, not the serialization: the figure is still
+        validated and turned into JSON again by `st.plotly_chart`.
+
+        Parameters:
+        key (Tuple): Key from `key`.
+        build (Callable[[], go.Figure]): Builds the figure on a miss.
+
+        Returns:
+        go.Figure: A figure of its own, which the caller may modify.
+        """
+        spec = self.get(key)
+        if spec is not None:
+            return figure_from_json(spec)
+        fig = build()
+        self.put(key, fig.to_json())
+        return fig
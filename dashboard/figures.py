@@ -0,0 +1,221 @@
+###############################################################################
+# Plotly figures of per-company metric trends
+#
+# A trend figure draws one line per company and metric. Instead of filtering
+# the wide (year, company) x metric table once per company and subplot, the
+# rows in the year range are grouped by company in a single pass: the
+# company labels are factorized, the rows stably sorted by company, and the
+# boundaries of every company found in the sorted codes. The x and y values
+# of each trace are then contiguous slices of the sorted arrays, and all
+# traces of the figure are added in one call, already pointing at their
+# subplot axes.
+#
+# Browsers slow down drawing hundreds of SVG lines, so large figures can be
+# drawn with WebGL (`scattergl`) traces instead; in 'auto' mode this happens
+# above a number of traces or points. Both trace types take the same
+# legend groups and colors, so the figures look and toggle the same.
+#
+# The risk score figure shows one bar per company and score, so each panel
+# is a single bar trace over the companies, colored per company, with the
+# screen threshold drawn as a line; its number of traces does not depend on
+# the number of companies.
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+import plotly.graph_objects as go
+from plotly.subplots import make_subplots
+
+from dashboard.risk import RISK_SCREENS
+
+
+# Rendering modes of the trend figures
+RENDER_MODES = ('auto', 'svg', 'webgl')
+
+# Largest figure drawn with SVG traces in 'auto' mode
+MAX_SVG_TRACES = 100
+MAX_SVG_POINTS = 5000
+
+
+def company_groups(pivot_df: pd.DataFrame, columns: Sequence[str],
+                   years: Tuple[int, int]) -> Tuple[Dict[str, slice], Dict[str, np.ndarray]]:
+    """
+    Groups the rows of a wide table within a year range by company, in one pass.
+
+    Parameters:
+    pivot_df (pd.DataFrame): Table with 'year' and 'company' columns and one column per metric.
+    columns (Sequence[str]): Columns to extract besides 'year'.
+    years (Tuple[int, int]): The first and last year, both inclusive.
+
+    Returns:
+    Tuple[Dict[str, slice], Dict[str, np.ndarray]]: The rows of every company as a slice, and the
+    'year' and requested columns sorted by company (in their original order within a company).
+    """
+    year = pivot_df['year'].to_numpy()
+    rows = np.flatnonzero((year >= years[0]) & (year <= years[1]))
+    codes, labels = pd.factorize(pivot_df['company'].to_numpy()[rows])
+    order = np.argsort(codes, kind='stable')
+    rows, codes = rows[order], codes[order]
+
+    # Start of every company's block in the sorted rows
+    starts = np.searchsorted(codes, np.arange(len(labels) + 1))
+    groups = {label: slice(starts[i], starts[i + 1]) for i, label in enumerate(labels)}
+    arrays = {column: pivot_df[column].to_numpy()[rows] for column in ['year', *columns]}
+    return groups, arrays
+
+def trace_type(render_mode: str, n_traces: int, n_points: int,
+               max_traces: int = MAX_SVG_TRACES, max_points: int = MAX_SVG_POINTS) -> str:
+    """
+    Returns the plotly trace type of a figure in a rendering mode.
+
+    Parameters:
+    render_mode (str): 'svg', 'webgl', or 'auto' for WebGL above `max_traces` traces or `max_points` points.
+    n_traces (int): Number of traces of the figure.
+    n_points (int): Number of points over all traces.
+    max_traces (int): Most traces drawn with SVG in 'auto' mode. Default is MAX_SVG_TRACES.
+    max_points (int): Most points drawn with SVG in 'auto' mode. Default is MAX_SVG_POINTS.
+
+    Returns:
+    str: 'scatter' or 'scattergl'.
+    """
+    if render_mode not in RENDER_MODES:
+        raise ValueError(f'Unknown render mode {render_mode!r}, expected one of {RENDER_MODES}')
+    if render_mode == 'auto':
+        render_mode = 'webgl' if n_traces > max_traces or n_points > max_points else 'svg'
+    return 'scattergl' if render_mode == 'webgl' else 'scatter'
+
+def create_financial_plot(
+    pivot_df: pd.DataFrame,
+    unique_companies: List[str],
+    color_map: Dict[str, str],
+    metric1: str,
+    metric2: str,
+    years: Tuple[int, int],
+    subplot_titles: List[str],
+    title: str,
+    render_mode: str = 'auto',
+    max_traces: int = MAX_SVG_TRACES,
+    max_points: int = MAX_SVG_POINTS
+) -> go.Figure:
+    """
+    Create a financial plot with two subplots for the specified metrics.
+
+    This function generates a 1x2 subplot figure displaying trends for two different
+    financial metrics across a specified year range for multiple companies.
+
+    Parameters:
+        pivot_df (pd.DataFrame): DataFrame containing financial data with 'year' and 'company' columns.
+        unique_companies (List[str]): List of unique company names to plot.
+        color_map (Dict[str, str]): Dictionary mapping company names to their respective colors for the plot.
+        metric1 (str): The first metric to be plotted on the first subplot.
+        metric2 (str): The second metric to be plotted on the second subplot.
+        years (Tuple[int, int]): A tuple containing the start and end years for filtering the data.
+        subplot_titles (List[str]): List of titles for the subplots.
+        title (str): The main title for the entire figure.
+        render_mode (str): 'svg', 'webgl' or 'auto', see `trace_type`. Default is 'auto'.
+        max_traces (int): Most traces drawn with SVG in 'auto' mode. Default is MAX_SVG_TRACES.
+        max_points (int): Most points drawn with SVG in 'auto' mode. Default is MAX_SVG_POINTS.
+
+    Returns:
+        go.Figure: A Plotly figure object containing the subplots with the specified metrics.
+    """
+    # Create a 1x2 subplot figure
+    fig = make_subplots(rows=1, cols=2, subplot_titles=subplot_titles)
+
+    # Group the rows of the year range by company once, for both metrics
+    groups, arrays = company_groups(pivot_df, [metric1, metric2], years)
+    companies = [company for company in unique_companies if company in groups]
+    scatter = trace_type(render_mode, 2 * len(companies),
+                         2 * sum(groups[company].stop - groups[company].start for company in companies),
+                         max_traces, max_points)
+
+    # Traces of the first metric, then of the second; both share the legend entry of the first.
+    # They are passed as dicts with their subplot axes so that plotly validates each trace only once
+    traces = []
+    for metric, axes, showlegend in [(metric1, ('x', 'y'), None), (metric2, ('x2', 'y2'), False)]:
+        for company in companies:
+            rows = groups[company]
+            trace = dict(
+                type=scatter,
+                x=arrays['year'][rows],
+                y=arrays[metric][rows],
+                mode='lines',
+                name=company,
+                legendgroup=company,
+                line=dict(color=color_map[company]),
+                xaxis=axes[0],
+                yaxis=axes[1]
+            )
+            if showlegend is not None:
+                trace['showlegend'] = showlegend
+            traces.append(trace)
+    fig.add_traces(traces)
+
+    # Update layout to ensure x-axis ticks are integers
+    fig.update_xaxes(tickmode='linear', dtick=1)
+
+    # Update layout title
+    fig.update_layout(
+        title_text=title,
+        showlegend=True
+    )
+
+    return fig
+
+def create_risk_plot(
+    agg_df: pd.DataFrame,
+    color_map: Dict[str, str],
+    companies: Optional[Sequence[str]] = None,
+    metrics: Sequence[str] = ('zscore', 'mscore'),
+    subplot_titles: Sequence[str] = ('Average Z-score', 'Average M-score'),
+    title: str = 'Average Z-scores and M-scores'
+) -> go.Figure:
+    """
+    Create a bar chart of average risk scores per company, one subplot per score.
+
+    Parameters:
+        agg_df (pd.DataFrame): DataFrame with a 'company' column and one column of averages per metric,
+            such as `RiskScreen.table`.
+        color_map (Dict[str, str]): Dictionary mapping company names to their respective colors for the plot.
+        companies (Sequence[str], optional): Companies to plot, in bar order; all companies of `agg_df`
+            in their order when omitted.
+        metrics (Sequence[str]): Score metrics, one subplot each, with their threshold from RISK_SCREENS.
+        subplot_titles (Sequence[str]): List of titles for the subplots.
+        title (str): The main title for the entire figure.
+
+    Returns:
+        go.Figure: A Plotly figure with one bar trace per subplot and a threshold line per screen.
+    """
+    fig = make_subplots(rows=1, cols=len(metrics), subplot_titles=list(subplot_titles))
+
+    if companies is not None:
+        agg_df = agg_df.set_index('company').reindex(list(companies)).reset_index()
+    companies = agg_df['company'].to_numpy()
+    colors = np.array([color_map.get(company, 'gray') for company in companies], dtype=object)
+    # One bar trace per subplot, passed as dicts with their axes so that plotly validates each only once
+    traces = []
+    for col, metric in enumerate(metrics, start=1):
+        # Companies without an average in the window get no bar
+        scores = agg_df[metric].to_numpy(dtype=float)
+        present = ~np.isnan(scores)
+        axis = '' if col == 1 else str(col)
+        traces.append(dict(
+            type='bar',
+            x=companies[present],
+            y=scores[present],
+            marker=dict(color=colors[present]),
+            showlegend=False,
+            hovertemplate='%{x}: %{y:.2f}<extra></extra>',
+            xaxis='x' + axis,
+            yaxis='y' + axis
+        ))
+    fig.add_traces(traces)
+
+    # Threshold of every screen, across its whole subplot
+    for col, metric in enumerate(metrics, start=1):
+        screen = RISK_SCREENS[metric]
+        fig.add_hline(y=screen.threshold, line=dict(color='red', dash='dash'), row=1, col=col,
+                      annotation_text=f'Threshold ({screen.threshold})', annotation_position='top left')
+
+    fig.update_layout(title_text=title, yaxis_title='Score')
+    return fig
@@ -0,0 +1,81 @@
+###############################################################################
+# Option index of the sidebar filters
+#
+# The sidebar offers cascading sector, subsector and company selections. The
+# option lists come from a sector -> subsector -> company hierarchy built
+# once per dataset version, instead of filtering the long frame on every
+# widget interaction. The rows of a selection are taken by
+# `dashboard.layout.RowLayout.select`.
+from typing import Dict, List, Optional, Sequence
+
+import pandas as pd
+
+
+# Columns of the hierarchy, from the coarsest
+FILTER_COLUMNS = ['sector', 'subsector', 'company']
+
+
+class FilterIndex:
+    """
+    Sector -> subsector -> company hierarchy of the long-format frame for the sidebar filters.
+
+    Attributes:
+        labels (Dict[str, List]): Values of every filter column, in order of first appearance.
+    """
+
+    def __init__(self, df: pd.DataFrame):
+        # Values in order of first appearance, like Series.unique()
+        self.labels: Dict[str, List] = {column: list(pd.unique(df[column].to_numpy())) for column in FILTER_COLUMNS}
+
+        self._rank = {column: {label: i for i, label in enumerate(self.labels[column])}
+                      for column in ['subsector', 'company']}
+        companies = df.drop_duplicates('company')[['company', 'sector', 'subsector']]
+        self._company_sector = dict(zip(companies['company'], companies['sector']))
+        self._subsectors_by_sector: Dict[str, List[str]] = {}
+        self._companies_by_sector: Dict[str, List[str]] = {}
+        self._companies_by_subsector: Dict[str, List[str]] = {}
+        for company, sector, subsector in companies.itertuples(index=False):
+            subsectors = self._subsectors_by_sector.setdefault(sector, [])
+            if subsector not in subsectors:
+                subsectors.append(subsector)
+            self._companies_by_sector.setdefault(sector, []).append(company)
+            self._companies_by_subsector.setdefault(subsector, []).append(company)
+        for subsectors in self._subsectors_by_sector.values():
+            subsectors.sort(key=self._rank['subsector'].__getitem__)
+
+    def subsector_options(self, sectors: Optional[Sequence[str]] = None) -> List[str]:
+        """
+        Returns the subsectors offered for a sector selection.
+
+        Parameters:
+        sectors (Sequence[str], optional): Selected sectors; all subsectors when empty.
+
+        Returns:
+        List[str]: Subsectors in order of first appearance in the dataset.
+        """
+        if not sectors:
+            return list(self.labels['subsector'])
+        options = [s for sector in sectors for s in self._subsectors_by_sector.get(sector, [])]
+        return sorted(set(options), key=self._rank['subsector'].__getitem__)
+
+    def company_options(self, sectors: Optional[Sequence[str]] = None,
+                        subsectors: Optional[Sequence[str]] = None) -> List[str]:
+        """
+        Returns the companies offered for a sector and/or subsector selection.
+
+        Parameters:
+        sectors (Sequence[str], optional): Selected sectors.
+        subsectors (Sequence[str], optional): Selected subsectors.
+
+        Returns:
+        List[str]: Companies in order of first appearance in the dataset.
+        """
+        if subsectors:
+            options = [c for s in subsectors for c in self._companies_by_subsector.get(s, [])]
+            if sectors:
+                options = [c for c in options if self._company_sector[c] in sectors]
+        elif sectors:
+            options = [c for s in sectors for c in self._companies_by_sector.get(s, [])]
+        else:
+            return list(self.labels['company'])
+        return sorted(set(options), key=self._rank['company'].__getitem__)
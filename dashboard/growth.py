@@ -0,0 +1,148 @@
+###############################################################################
+# Compound annual growth rates of the year-over-year growth metrics
+#
+# The dataset stores growth as yearly percentages (`yoy_eps_growth` etc.).
+# Compounding them over a window is a product of growth factors (1 + g/100),
+# which is turned into a sum of logarithms so that every window is the
+# difference of two cumulative sums along the year axis of the cube:
+#
+#     CAGR(start, end) = exp((L[end + 1] - L[start]) / n) - 1
+#
+# where L is the cumulative log factor and n the number of years with a
+# value in the window. Years without a value are skipped. A year with a
+# growth of -100% or less takes the underlying level to zero or below; the
+# compound rate of any window containing it is undefined and left NaN.
+from typing import List, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+from dashboard.cube import MetricCube, nanmean
+
+
+# Year-over-year growth metrics, in percent
+GROWTH_METRICS: List[str] = ['yoy_eps_growth', 'yoy_revenue_growth', 'yoy_ebitda_growth']
+
+
+def _log_accumulators(growth: np.ndarray):
+    # Cumulative log factors, valid-year counts and undefined-year counts along the last
+    # axis, with a leading zero so that a window is the difference of two entries
+    factor = 1 + growth / 100
+    valid = ~np.isnan(growth)
+    undefined = valid & (factor <= 0)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        log_factor = np.where(valid & ~undefined, np.log(np.where(factor > 0, factor, 1.)), 0.)
+    pad = [(0, 0)] * (growth.ndim - 1) + [(1, 0)]
+    return (np.pad(np.cumsum(log_factor, axis=-1), pad),
+            np.pad(np.cumsum(valid, axis=-1), pad),
+            np.pad(np.cumsum(undefined, axis=-1), pad))
+
+def _compound(log_sum: np.ndarray, count: np.ndarray, undefined: np.ndarray) -> np.ndarray:
+    # Annualized growth in percent from the window sums of the accumulators
+    with np.errstate(invalid='ignore', divide='ignore'):
+        rate = (np.exp(log_sum / count) - 1) * 100
+    return np.where((count > 0) & (undefined == 0), rate, np.nan)
+
+
+class GrowthCube:
+    """
+    Compound annual growth rates of every company and growth metric over any window of years.
+
+    Attributes:
+        metrics (List[str]): The growth metrics, along axis 1 of `rates`.
+        years (np.ndarray): Consecutive years of the cube.
+        windows (np.ndarray): Window lengths in years, along axis 2 of `rates`.
+        rates (np.ndarray): CAGR in percent of shape (companies, metrics, windows), for the
+            windows ending in the last year; NaN where undefined.
+    """
+
+    def __init__(self, cube: MetricCube, metrics: Sequence[str] = GROWTH_METRICS):
+        self._cube = cube
+        self.metrics = [m for m in metrics if m in cube.metric_index]
+        self._metric_position = {m: i for i, m in enumerate(self.metrics)}
+        self.years = cube.years
+        self.windows = np.arange(1, len(self.years) + 1)
+
+        # (company, metric, year + 1) accumulators of the company growth rates
+        growth = cube.values[:, [cube.metric_index[m] for m in self.metrics], :]
+        self._log, self._count, self._undefined = _log_accumulators(growth)
+
+        # (metric, year + 1) accumulators of the cross-sectional average growth of each year
+        self._universe = _log_accumulators(nanmean(growth, axis=0))
+
+        # Every window ending in the last year in one pass: the last accumulator minus the
+        # accumulator `window` years earlier
+        starts = len(self.years) - self.windows
+        self.rates = _compound(*(acc[..., -1:] - acc[..., starts]
+                                 for acc in (self._log, self._count, self._undefined)))
+
+    def cagr(self, metric: str, start: Optional[int] = None, end: Optional[int] = None) -> np.ndarray:
+        """
+        Returns the CAGR of every company for one metric between two years.
+
+        Parameters:
+        metric (str): The growth metric.
+        start (int, optional): First year of growth compounded; the first year of the data when omitted.
+        end (int, optional): Last year of growth compounded, inclusive; the last year of the data when omitted.
+
+        Returns:
+        np.ndarray: CAGR in percent per company, NaN where undefined.
+        """
+        m, years = self._metric_position[metric], self._cube.year_slice(start, end)
+        return _compound(*(acc[:, m, years.stop] - acc[:, m, years.start]
+                           for acc in (self._log, self._count, self._undefined)))
+
+    def universe_cagr(self, metric: str, start: Optional[int] = None, end: Optional[int] = None) -> float:
+        """
+        Returns the CAGR of the average company: the yearly growth averaged across companies, then compounded.
+
+        Parameters:
+        metric (str): The growth metric.
+        start (int, optional): First year of growth compounded; the first year of the data when omitted.
+        end (int, optional): Last year of growth compounded, inclusive; the last year of the data when omitted.
+
+        Returns:
+        float: CAGR in percent, NaN where undefined.
+        """
+        m, years = self._metric_position[metric], self._cube.year_slice(start, end)
+        return float(_compound(*(acc[m, years.stop] - acc[m, years.start] for acc in self._universe)))
+
+    def table(self, metric: str, companies: Optional[Sequence[str]] = None) -> pd.DataFrame:
+        """
+        Returns the CAGR of every window ending in the last year for a set of companies.
+
+        Parameters:
+        metric (str): The growth metric.
+        companies (Sequence[str], optional): Companies to include; all companies when omitted.
+
+        Returns:
+        pd.DataFrame: 'company', 'symbol', 'sector' and 'subsector' columns followed by one '<n>y' column per window length.
+        """
+        table = pd.DataFrame(self.rates[:, self._metric_position[metric], :],
+                             columns=[f'{n}y' for n in self.windows])
+        table.insert(0, 'subsector', self._cube.subsectors)
+        table.insert(0, 'sector', self._cube.sectors)
+        table.insert(0, 'symbol', self._cube.symbols)
+        table.insert(0, 'company', self._cube.companies)
+        if companies is not None:
+            table = table[table['company'].isin(companies)].reset_index(drop=True)
+        return table
+
+    def sector_table(self, metric: str, by: str = 'sector', companies: Optional[Sequence[str]] = None) -> pd.DataFrame:
+        """
+        Returns the median company CAGR of every window ending in the last year, per sector or subsector.
+
+        Parameters:
+        metric (str): The growth metric.
+        by (str): 'sector' or 'subsector'. Default is 'sector'.
+        companies (Sequence[str], optional): Companies to include; all companies when omitted.
+
+        Returns:
+        pd.DataFrame: The group column, the number of companies and one '<n>y' column per window length.
+        """
+        table = self.table(metric, companies)
+        windows = [f'{n}y' for n in self.windows]
+        grouped = table.groupby(by, sort=True)
+        result = grouped[windows].median()
+        result.insert(0, 'companies', grouped.size())
+        return result.reset_index()
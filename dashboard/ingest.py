@@ -0,0 +1,253 @@
+###############################################################################
+# Ingestion of the wide vendor export into the long-format dataset
+#
+# The vendor file has one row per ticker and one column per metric and year,
+# e.g. `asset_turnover_2017` ... `asset_turnover_latest`. The dashboard works
+# on a long table with one row per (company, metric, year). Header names are
+# parsed once per column and the long table is assembled with NumPy
+# repeat/tile, so no per-cell string work is done.
+#
+# Large universes are streamed: the wide file is read in batches of tickers,
+# each batch is reshaped and appended to the output, so peak memory depends on
+# the batch size and not on the number of tickers in the file.
+#
+# Usage:
+#     python -m dashboard.ingest nasdaq100_metrics_ratios.csv -o cleaned_data.csv
+import argparse
+import os
+import re
+import sys
+import time
+from typing import List, NamedTuple, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+from dashboard.data_store import SCHEMA, apply_schema, cluster, to_arrow, write_snapshot
+
+
+# Columns describing the ticker, repeated on every long row
+ID_COLUMNS: List[str] = ['company', 'symbol', 'sector', 'subsector']
+
+# Metric columns are named <metric>_<year>, with 'latest' for the most recent year
+METRIC_COLUMN_PATTERN = re.compile(r'(.+)_([0-9]{4}|latest)')
+
+# Year the vendor's 'latest' columns refer to
+LATEST_YEAR = 2023
+
+# Tickers read per batch by the streaming ingest
+DEFAULT_CHUNK_ROWS = 1000
+
+# Arrow schema of streamed Feather output; labels are plain strings because an
+# Arrow IPC file cannot change a column's dictionary from one batch to the next
+STREAM_SCHEMA = pa.schema(
+    [(name, pa.string()) for name, dtype in SCHEMA.items() if dtype == 'category']
+    + [('year', pa.int16()), ('value', pa.float64())]
+)
+
+
+class MetricColumn(NamedTuple):
+    """A wide metric column and the (metric, year) pair encoded in its name."""
+    column: str
+    metric: str
+    year: int
+
+
+def parse_header(columns: Sequence[str], latest_year: int = LATEST_YEAR) -> List[MetricColumn]:
+    """
+    Parses the metric and year out of every metric column name of a wide header.
+
+    Columns that do not follow the <metric>_<year> pattern (the ticker columns and
+    undated scores such as 'predictability') are skipped.
+
+    Parameters:
+    columns (Sequence[str]): Column names of the wide file.
+    latest_year (int): The year substituted for the 'latest' suffix. Default is 2023.
+
+    Returns:
+    List[MetricColumn]: One entry per metric column, in header order.
+    """
+    parsed = []
+    for column in columns:
+        match = METRIC_COLUMN_PATTERN.fullmatch(column)
+        if match is None or column in ID_COLUMNS:
+            continue
+        metric, year = match.groups()
+        parsed.append(MetricColumn(column, metric, latest_year if year == 'latest' else int(year)))
+    return parsed
+
+def _repeat_categorical(values: pd.Series, repeats: int) -> pd.Categorical:
+    # Encode the (short) wide column once and repeat its integer codes
+    categorical = pd.Categorical(values)
+    return pd.Categorical.from_codes(np.repeat(categorical.codes, repeats), categorical.categories)
+
+def melt_wide(wide: pd.DataFrame, metric_columns: Optional[List[MetricColumn]] = None,
+              latest_year: int = LATEST_YEAR) -> pd.DataFrame:
+    """
+    Reshapes a wide vendor frame into the long-format dataset.
+
+    This is the vectorized equivalent of the notebook's `melt` followed by
+    `str.extract(r'(.+)_([0-9]{4}|latest)')` and the 'latest' -> 2023 replacement.
+
+    Parameters:
+    wide (pd.DataFrame): One row per ticker with the ID columns and <metric>_<year> columns.
+    metric_columns (List[MetricColumn], optional): Pre-parsed header; parsed from `wide` when omitted.
+    latest_year (int): The year substituted for the 'latest' suffix. Default is 2023.
+
+    Returns:
+    pd.DataFrame: The long-format frame following `dashboard.data_store.SCHEMA`, sorted on
+    `dashboard.data_store.CLUSTER_KEY`.
+    """
+    if metric_columns is None:
+        metric_columns = parse_header(wide.columns, latest_year)
+    n_rows, n_cols = len(wide), len(metric_columns)
+
+    # Cell values in row-major order: every metric column of a ticker is contiguous
+    values = wide[[c.column for c in metric_columns]].to_numpy(dtype='float64').ravel()
+
+    # Metric and year only depend on the column, so they are tiled once per ticker
+    metric_labels = pd.Categorical([c.metric for c in metric_columns])
+    long = {col: _repeat_categorical(wide[col], n_cols) for col in ID_COLUMNS}
+    long['metric'] = pd.Categorical.from_codes(np.tile(metric_labels.codes, n_rows),
+                                               metric_labels.categories)
+    long['year'] = np.tile(np.array([c.year for c in metric_columns], dtype=SCHEMA['year']), n_rows)
+    long['value'] = values
+    return cluster(apply_schema(pd.DataFrame(long)))
+
+def write_long(df: pd.DataFrame, output_path: str) -> None:
+    """
+    Writes the long-format dataset to a file `load_dataset` can read.
+
+    Parameters:
+    df (pd.DataFrame): The long-format frame.
+    output_path (str): Destination; '.feather' writes a memory-mappable snapshot, anything else a CSV.
+    """
+    if output_path.endswith('.feather'):
+        if not write_snapshot(df, output_path):
+            raise OSError(f'Could not write {output_path}')
+    else:
+        df.to_csv(output_path, index=False)
+
+def ingest(source_path: str, output_path: str, latest_year: int = LATEST_YEAR) -> pd.DataFrame:
+    """
+    Converts a wide vendor CSV into the long-format dataset file used by the app.
+
+    Parameters:
+    source_path (str): Path to the wide vendor CSV.
+    output_path (str): Path of the long-format output file.
+    latest_year (int): The year substituted for the 'latest' suffix. Default is 2023.
+
+    Returns:
+    pd.DataFrame: The long-format frame that was written.
+    """
+    wide = pd.read_csv(source_path)
+    df = melt_wide(wide, latest_year=latest_year)
+    write_long(df, output_path)
+    return df
+
+
+class LongWriter:
+    """
+    Appends batches of the long-format dataset to a CSV or Feather file.
+
+    Use as a context manager; the file is complete once the block exits.
+    """
+
+    def __init__(self, output_path: str):
+        self.output_path = output_path
+        self.rows = 0
+        self._file = None
+        self._arrow_writer = None
+
+    def __enter__(self) -> 'LongWriter':
+        if self.output_path.endswith('.feather'):
+            # Uncompressed Arrow IPC, so the result can be memory-mapped like a snapshot
+            self._arrow_writer = pa.ipc.new_file(
+                self.output_path, STREAM_SCHEMA,
+                options=pa.ipc.IpcWriteOptions(compression=None))
+        else:
+            self._file = open(self.output_path, 'w', newline='')
+        return self
+
+    def write(self, df: pd.DataFrame) -> None:
+        """
+        Appends one batch of long-format rows.
+
+        Parameters:
+        df (pd.DataFrame): A long-format frame following `dashboard.data_store.SCHEMA`.
+        """
+        if self._arrow_writer is not None:
+            self._arrow_writer.write_table(to_arrow(df).cast(STREAM_SCHEMA))
+        else:
+            df.to_csv(self._file, header=self.rows == 0, index=False)
+        self.rows += len(df)
+
+    def __exit__(self, *exc_info) -> None:
+        if self._arrow_writer is not None:
+            self._arrow_writer.close()
+        if self._file is not None:
+            self._file.close()
+
+
+def ingest_chunked(source_path: str, output_path: str, chunk_rows: int = DEFAULT_CHUNK_ROWS,
+                   latest_year: int = LATEST_YEAR) -> int:
+    """
+    Streams a wide vendor CSV into the long-format dataset file, one batch of tickers at a time.
+
+    Only one batch of wide rows and its long-format reshape are held in memory at any
+    time, so peak memory stays flat however many tickers the file has.
+
+    Parameters:
+    source_path (str): Path to the wide vendor CSV.
+    output_path (str): Path of the long-format output file, .csv or .feather.
+    chunk_rows (int): Number of tickers per batch. Default is 1000.
+    latest_year (int): The year substituted for the 'latest' suffix. Default is 2023.
+
+    Returns:
+    int: The number of long-format rows written.
+    """
+    # Parse the header once; every batch shares the same column mapping
+    header = pd.read_csv(source_path, nrows=0).columns
+    metric_columns = parse_header(header, latest_year)
+
+    # Skip undated columns entirely and read the metric cells straight into float64
+    reader = pd.read_csv(
+        source_path,
+        usecols=ID_COLUMNS + [c.column for c in metric_columns],
+        dtype={**{col: str for col in ID_COLUMNS}, **{c.column: 'float64' for c in metric_columns}},
+        chunksize=chunk_rows,
+    )
+    with LongWriter(output_path) as writer:
+        for chunk in reader:
+            writer.write(melt_wide(chunk, metric_columns, latest_year))
+    return writer.rows
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    """
+    Command-line entry point, see `python -m dashboard.ingest --help`.
+    """
+    parser = argparse.ArgumentParser(
+        prog='python -m dashboard.ingest',
+        description='Convert a wide vendor metrics file into the long-format dataset read by app.py.')
+    parser.add_argument('source', help='wide CSV with one row per ticker and <metric>_<year> columns')
+    parser.add_argument('-o', '--output', default=os.path.join(os.path.dirname(__file__), '..', 'cleaned_data.csv'),
+                        help='long-format output file, .csv or .feather (default: cleaned_data.csv)')
+    parser.add_argument('--latest-year', type=int, default=LATEST_YEAR,
+                        help=f"year used for the vendor's 'latest' columns (default: {LATEST_YEAR})")
+    parser.add_argument('--chunk-rows', type=int, default=DEFAULT_CHUNK_ROWS,
+                        help=f'tickers per streamed batch, 0 to load the whole file at once '
+                             f'(default: {DEFAULT_CHUNK_ROWS})')
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    if args.chunk_rows > 0:
+        rows = ingest_chunked(args.source, args.output, args.chunk_rows, args.latest_year)
+    else:
+        rows = len(ingest(args.source, args.output, args.latest_year))
+    print(f'Wrote {rows:,} rows to {args.output} in {time.perf_counter() - start:.2f}s')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
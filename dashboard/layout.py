@@ -0,0 +1,85 @@
+###############################################################################
+# Slice-based row selection on the clustered long-format dataset
+#
+# `dashboard.data_store` keeps the rows sorted on (company, year, metric), so
+# the rows of one company in a year range form one contiguous block. The block
+# boundaries of every (company, year) pair are found once with searchsorted;
+# selecting companies and a year range then only needs those boundaries.
+# A selection that is one contiguous block (one company, or adjacent companies
+# over the full year range) is returned as a zero-copy slice of the frame.
+from typing import Optional, Sequence, Tuple, Union
+
+import numpy as np
+import pandas as pd
+
+
+class RowLayout:
+    """
+    Per-company, per-year row boundaries of a frame sorted on `dashboard.data_store.CLUSTER_KEY`.
+
+    Attributes:
+        df (pd.DataFrame): The clustered frame the boundaries refer to.
+        years (np.ndarray): Consecutive years covered by the frame.
+    """
+
+    def __init__(self, df: pd.DataFrame):
+        self.df = df
+        self._company_code = {name: code for code, name in enumerate(df['company'].cat.categories)}
+        year = df['year'].to_numpy().astype(np.int64)
+        self.years = np.arange(year.min(), year.max() + 1)
+        self._n_years = len(self.years)
+
+        # bounds[c * n_years + k] is the first row of company c in its k-th year; the
+        # rows of (c, k) end where the next (company, year) pair starts
+        key = df['company'].cat.codes.to_numpy().astype(np.int64) * self._n_years + (year - self.years[0])
+        if (np.diff(key) < 0).any():
+            raise ValueError('RowLayout needs a frame sorted on (company, year, metric)')
+        self._bounds = np.searchsorted(key, np.arange(len(self._company_code) * self._n_years + 1))
+
+    def rows(self, companies: Optional[Sequence[str]] = None,
+             years: Optional[Tuple[int, int]] = None) -> Union[slice, np.ndarray]:
+        """
+        Returns the rows of the selected companies within a year range.
+
+        Parameters:
+        companies (Sequence[str], optional): Companies to select; all companies when omitted.
+        years (Tuple[int, int], optional): The first and last year, both inclusive; all years when omitted.
+
+        Returns:
+        Union[slice, np.ndarray]: A slice when the rows are contiguous, otherwise sorted row positions.
+        """
+        if companies is None:
+            codes = np.arange(len(self._company_code))
+        else:
+            codes = np.unique([self._company_code[c] for c in companies if c in self._company_code]).astype(np.int64)
+        first, last = 0, self._n_years - 1
+        if years is not None:
+            first = max(int(years[0]) - int(self.years[0]), 0)
+            last = min(int(years[1]) - int(self.years[0]), self._n_years - 1)
+        if len(codes) == 0 or first > last:
+            return slice(0, 0)
+
+        starts = self._bounds[codes * self._n_years + first]
+        ends = self._bounds[codes * self._n_years + last + 1]
+        if (starts[1:] == ends[:-1]).all():
+            return slice(int(starts[0]), int(ends[-1]))
+        lengths = ends - starts
+        offsets = np.repeat(starts - np.concatenate([[0], np.cumsum(lengths)[:-1]]), lengths)
+        return np.arange(lengths.sum()) + offsets
+
+    def select(self, companies: Optional[Sequence[str]] = None,
+               years: Optional[Tuple[int, int]] = None) -> pd.DataFrame:
+        """
+        Returns the rows of the selected companies within a year range as a frame.
+
+        Parameters:
+        companies (Sequence[str], optional): Companies to select; all companies when omitted.
+        years (Tuple[int, int], optional): The first and last year, both inclusive; all years when omitted.
+
+        Returns:
+        pd.DataFrame: A view of the frame when the rows are contiguous, otherwise a copy.
+        """
+        rows = self.rows(companies, years)
+        if isinstance(rows, slice):
+            return self.df.iloc[rows]
+        return self.df.take(rows)
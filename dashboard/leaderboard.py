@@ -0,0 +1,192 @@
+###############################################################################
+# Per-year leaderboards of every metric
+#
+# The KPI cards and top-N tables only ever need the few best or worst
+# companies of one metric in one year. Those are computed for every
+# (metric, year) pair at once when the dataset is loaded: a partial sort
+# (argpartition) along the company axis of the cube picks the N extreme
+# companies, and only those N are fully sorted. Looking a leaderboard up is
+# then an index into the precomputed arrays.
+#
+# Some metrics are only comparable within a range: a negative debt to equity
+# comes from negative equity, and a negative valuation multiple from negative
+# earnings, the most fragile companies rather than the least leveraged or the
+# cheapest. Values outside the range of such a metric never enter its
+# leaderboards; the scores, backtests and percentiles rank within the same
+# ranges.
+from typing import Dict, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+from dashboard.cube import MetricCube
+
+
+# Number of companies kept at each end of every leaderboard
+DEFAULT_DEPTH = 10
+
+# Metrics where a lower value ranks better; every other metric ranks higher-is-better
+LOWER_IS_BETTER = {
+    'cogs_to_revenue', 'days_inventory', 'debt_to_assets', 'debt_to_ebitda', 'debt_to_equity',
+    'debt_to_revenue', 'effective_interest_rate', 'enterprise_value_to_ebit', 'enterprise_value_to_ebitda',
+    'enterprise_value_to_revenue', 'financial_distress', 'goodwill_to_asset', 'inventory_to_revenue',
+    'liabilities_to_assets', 'longterm_debt_to_assets', 'mscore', 'price_earnings_growth_ratio',
+    'price_to_book_ratio', 'price_to_earnings_ratio', 'price_to_earnings_ratio_nri',
+    'price_to_free_cashflow', 'price_to_operating_cashflow',
+}
+
+# Ranges of ranked values, both ends inclusive: zero and above, or strictly above zero
+NON_NEGATIVE = (0., np.inf)
+POSITIVE = (np.finfo(float).tiny, np.inf)
+
+# Range of the values ranked for some metrics; every other metric ranks all its values
+RANKED_RANGES: Dict[str, Tuple[float, float]] = {
+    'debt_to_ebitda': NON_NEGATIVE,
+    'debt_to_equity': NON_NEGATIVE,
+    'enterprise_value_to_ebit': POSITIVE,
+    'enterprise_value_to_ebitda': POSITIVE,
+    'enterprise_value_to_revenue': POSITIVE,
+    'price_earnings_growth_ratio': POSITIVE,
+    'price_to_book_ratio': POSITIVE,
+    'price_to_earnings_ratio': POSITIVE,
+    'price_to_earnings_ratio_nri': POSITIVE,
+    'price_to_free_cashflow': POSITIVE,
+    'price_to_operating_cashflow': POSITIVE,
+}
+
+
+def metric_direction(metric: str) -> str:
+    """
+    Returns the ranking direction of a metric.
+
+    Parameters:
+    metric (str): The metric name.
+
+    Returns:
+    str: 'min' if a lower value ranks better, otherwise 'max'.
+    """
+    return 'min' if metric in LOWER_IS_BETTER else 'max'
+
+def ranked_values(values: np.ndarray, metrics: Sequence[str],
+                  ranges: Dict[str, Tuple[float, float]] = RANKED_RANGES) -> np.ndarray:
+    """
+    Returns metric values with those outside the ranked range of their metric set to NaN.
+
+    Parameters:
+    values (np.ndarray): Values of shape (companies, metrics, ...), such as `MetricCube.values`.
+    metrics (Sequence[str]): The metric of every entry of the second axis.
+    ranges (Dict[str, Tuple[float, float]]): Range of the values ranked per metric. Default is RANKED_RANGES.
+
+    Returns:
+    np.ndarray: The values, copied when any of the metrics has a range.
+    """
+    bounded = [(i, ranges[metric]) for i, metric in enumerate(metrics) if metric in ranges]
+    if not bounded:
+        return values
+    values = np.array(values, dtype=float)
+    for i, (low, high) in bounded:
+        with np.errstate(invalid='ignore'):
+            values[:, i] = np.where((values[:, i] >= low) & (values[:, i] <= high), values[:, i], np.nan)
+    return values
+
+def _extremes(values: np.ndarray, depth: int) -> Dict[str, np.ndarray]:
+    # values: (companies, metrics, years) with NaN; ranks the largest `depth` per (metric, year).
+    # NaN is pushed below every number so missing companies never enter the leaderboard
+    keyed = np.where(np.isnan(values), -np.inf, values)
+    n_companies = keyed.shape[0]
+    if depth < n_companies:
+        # Partial sort: the `depth` largest values end up in the first `depth` slots, unordered
+        candidates = np.argpartition(-keyed, depth - 1, axis=0)[:depth]
+    else:
+        candidates = np.broadcast_to(np.arange(n_companies)[:, None, None], keyed.shape).copy()
+    candidate_values = np.take_along_axis(keyed, candidates, axis=0)
+
+    # Full sort of the few candidates only: by value, ties going to the lower company position
+    order = np.lexsort((candidates, -candidate_values), axis=0)
+    companies = np.take_along_axis(candidates, order, axis=0)
+    ranked = np.take_along_axis(candidate_values, order, axis=0)
+    missing = np.isneginf(ranked)
+    return {
+        'company': np.where(missing, -1, companies).transpose(1, 2, 0),
+        'value': np.where(missing, np.nan, ranked).transpose(1, 2, 0),
+    }
+
+
+class Leaderboards:
+    """
+    Top-N and bottom-N companies for every (metric, year) pair of the cube.
+
+    Attributes:
+        depth (int): Number of companies kept at each end of every leaderboard.
+        ranges (Dict[str, Tuple[float, float]]): Range of the values ranked per metric, see RANKED_RANGES.
+    """
+
+    def __init__(self, cube: MetricCube, depth: int = DEFAULT_DEPTH,
+                 ranges: Dict[str, Tuple[float, float]] = RANKED_RANGES):
+        self.depth = min(depth, cube.shape[0])
+        self.ranges = {metric: bounds for metric, bounds in ranges.items() if metric in cube.metric_index}
+        self._cube = cube
+
+        # Values outside the ranked range of their metric are left out like missing ones
+        values = ranked_values(cube.values, cube.metrics, self.ranges)
+        highest = _extremes(values, self.depth)
+        lowest = _extremes(-values, self.depth)
+        lowest['value'] = -lowest['value']
+
+        # Arrays of shape (metrics, years, depth); company -1 and NaN mark missing ranks
+        self._ranked = {'max': highest, 'min': lowest}
+
+    def table(self, metric: str, year: int, direction: Optional[str] = None,
+              n: Optional[int] = None) -> pd.DataFrame:
+        """
+        Returns the leaderboard of one metric in one year.
+
+        Parameters:
+        metric (str): The metric to rank.
+        year (int): The year to rank.
+        direction (str, optional): 'max' for the highest values first, 'min' for the lowest;
+            defaults to the metric's own direction (see `metric_direction`).
+        n (int, optional): Number of companies, at most `depth`; `depth` when omitted.
+
+        Returns:
+        pd.DataFrame: Columns 'rank', 'company', 'symbol', 'sector' and 'value', best first.
+
+        Raises:
+        KeyError: If the cube holds no such metric or year.
+        """
+        direction = direction or metric_direction(metric)
+        ranked = self._ranked[direction]
+        m, y = self._cube.metric_index[metric], self._cube.year_position(year)
+        companies = ranked['company'][m, y, :n]
+        values = ranked['value'][m, y, :n]
+        companies, values = companies[companies >= 0], values[companies >= 0]
+        return pd.DataFrame({
+            'rank': np.arange(1, len(companies) + 1),
+            'company': self._cube.companies[companies],
+            'symbol': self._cube.symbols[companies],
+            'sector': self._cube.sectors[companies],
+            'value': values,
+        })
+
+    def leader(self, metric: str, year: int, direction: Optional[str] = None) -> Optional[pd.Series]:
+        """
+        Returns the first company of a leaderboard.
+
+        Parameters:
+        metric (str): The metric to rank.
+        year (int): The year to rank.
+        direction (str, optional): 'max' or 'min'; defaults to the metric's own direction.
+
+        Returns:
+        pd.Series: The 'company' and 'value' of the leader, or None if no company has a value.
+
+        Raises:
+        KeyError: If the cube holds no such metric or year.
+        """
+        direction = direction or metric_direction(metric)
+        m, y = self._cube.metric_index[metric], self._cube.year_position(year)
+        company = self._ranked[direction]['company'][m, y, 0]
+        if company < 0:
+            return None
+        return pd.Series({'company': self._cube.companies[company],
+                          'value': self._ranked[direction]['value'][m, y, 0]})
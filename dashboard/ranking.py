@@ -0,0 +1,147 @@
+###############################################################################
+# Cross-sectional percentiles and sector-relative z-scores
+#
+# Every value of the cube is placed against the other companies of the same
+# metric and year: its percentile within the whole universe, within its
+# sector and within its subsector, and its z-score against its sector and
+# subsector peers. Percentiles rank like the leaderboards: the best value of
+# a metric's direction is at the top, and values outside the ranked range
+# of their metric are not ranked. The cube is viewed as one (company, metric x year) table,
+# so each measure is a single column-wise pass: one rank for the universe,
+# one grouped rank per peer level, and group sums taken as an indicator
+# matrix product for the z-scores.
+from typing import Dict, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+from dashboard.cube import MetricCube
+from dashboard.leaderboard import metric_direction, ranked_values
+
+
+# Peer groups ranked against besides the whole universe, and the company attribute defining them
+PEER_LEVELS = ('sector', 'subsector')
+
+
+def ordinal(value: float) -> str:
+    """
+    Formats a percentile as an ordinal, e.g. 92 -> '92nd'.
+
+    Parameters:
+    value (float): The percentile, rounded to a whole number.
+
+    Returns:
+    str: The ordinal, or 'n/a' for a missing value.
+    """
+    if np.isnan(value):
+        return 'n/a'
+    n = int(round(value))
+    suffix = 'th' if 10 <= n % 100 <= 20 else {1: 'st', 2: 'nd', 3: 'rd'}.get(n % 10, 'th')
+    return f'{n}{suffix}'
+
+def _group_zscores(values: np.ndarray, codes: np.ndarray, n_groups: int) -> np.ndarray:
+    # z-scores of the (company, column) table against the mean and sample std of each company's group
+    valid = ~np.isnan(values)
+    x = np.where(valid, values, 0.)
+    membership = np.zeros((n_groups, len(codes)))
+    membership[codes, np.arange(len(codes))] = 1.
+
+    # Group counts, means and sums of squared deviations, broadcast back to the companies
+    count = (membership @ valid)[codes]
+    mean = (membership @ x)[codes] / np.maximum(count, 1)
+    deviation = np.where(valid, values - mean, 0.)
+    variance = (membership @ (deviation * deviation))[codes] / np.maximum(count - 1, 1)
+    std = np.sqrt(variance)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return np.where(valid & (count >= 2) & (std > 0), deviation / std, np.nan)
+
+
+class Rankings:
+    """
+    Per-year percentiles and peer-relative z-scores of every company and metric.
+
+    Percentiles follow `DataFrame.rank(pct=True)` in the direction of each metric (see
+    `metric_direction`): ties share their average rank, the best company is at 100, and missing
+    values and values outside RANKED_RANGES are not ranked. Z-scores are taken on the raw values,
+    use the sample standard deviation of the peer group and are NaN for groups with fewer than
+    two values.
+
+    Attributes:
+        percentiles (Dict[str, np.ndarray]): Percentiles of shape (companies, metrics, years),
+            keyed by 'universe', 'sector' and 'subsector'.
+        zscores (Dict[str, np.ndarray]): Peer-relative z-scores, keyed by 'sector' and 'subsector'.
+    """
+
+    def __init__(self, cube: MetricCube):
+        self._cube = cube
+        n_companies = cube.shape[0]
+        table = pd.DataFrame(cube.values.reshape(n_companies, -1))
+
+        # Ranked values, negated for lower-is-better metrics so that the best always ranks highest
+        sign = np.array([-1. if metric_direction(m) == 'min' else 1. for m in cube.metrics])
+        oriented = ranked_values(cube.values, cube.metrics) * sign[None, :, None]
+        ranked = pd.DataFrame(oriented.reshape(n_companies, -1))
+
+        self.percentiles: Dict[str, np.ndarray] = {
+            'universe': ranked.rank(pct=True).to_numpy().reshape(cube.shape) * 100,
+        }
+        self.zscores: Dict[str, np.ndarray] = {}
+        for level in PEER_LEVELS:
+            codes, groups = pd.factorize(getattr(cube, level + 's'))
+            self.percentiles[level] = ranked.groupby(codes).rank(pct=True).to_numpy().reshape(cube.shape) * 100
+            self.zscores[level] = _group_zscores(table.to_numpy(), codes, len(groups)).reshape(cube.shape)
+        for array in [*self.percentiles.values(), *self.zscores.values()]:
+            array.flags.writeable = False
+
+    def percentile(self, metric: str, year: int, within: str = 'universe') -> np.ndarray:
+        """
+        Returns the percentile of every company for one metric and year.
+
+        Parameters:
+        metric (str): The metric.
+        year (int): The year.
+        within (str): 'universe', 'sector' or 'subsector'. Default is 'universe'.
+
+        Returns:
+        np.ndarray: Percentiles from 0 to 100 per company, best at 100, NaN where the company has no
+        ranked value.
+        """
+        return self.percentiles[within][:, self._cube.metric_index[metric], self._cube.year_position(year)]
+
+    def zscore(self, metric: str, year: int, within: str = 'sector') -> np.ndarray:
+        """
+        Returns the peer-relative z-score of every company for one metric and year.
+
+        Parameters:
+        metric (str): The metric.
+        year (int): The year.
+        within (str): 'sector' or 'subsector'. Default is 'sector'.
+
+        Returns:
+        np.ndarray: z-scores per company, NaN where undefined.
+        """
+        return self.zscores[within][:, self._cube.metric_index[metric], self._cube.year_position(year)]
+
+    def table(self, metric: str, year: int, companies: Optional[Sequence[str]] = None) -> pd.DataFrame:
+        """
+        Returns the value, percentiles and z-scores of one metric and year.
+
+        Parameters:
+        metric (str): The metric.
+        year (int): The year.
+        companies (Sequence[str], optional): Companies to include; all companies when omitted.
+
+        Returns:
+        pd.DataFrame: 'company', 'sector' and 'value' columns, a '<level>_pct' column per
+        percentile and a '<level>_z' column per z-score, in dataset order.
+        """
+        table = pd.DataFrame({
+            'company': self._cube.companies,
+            'sector': self._cube.sectors,
+            'value': self._cube.get(metric, year),
+            **{f'{level}_pct': self.percentile(metric, year, level) for level in self.percentiles},
+            **{f'{level}_z': self.zscore(metric, year, level) for level in self.zscores},
+        })
+        if companies is not None:
+            table = table[table['company'].isin(companies)].reset_index(drop=True)
+        return table
@@ -0,0 +1,202 @@
+###############################################################################
+# Risk screens over per-company window averages
+#
+# The dashboard flags companies whose average risk score over a window of
+# years crosses a published cutoff: a Beneish M-score above -1.78 (likely
+# earnings manipulation), an Altman Z-score below 1.81 (likely distress), and
+# so on. All screens share the same shape, so they are evaluated together:
+# the score metrics of the window are taken out of the cube as one
+# (company, screen, year) block, averaged along the year axis, and compared
+# against a vector of thresholds. One pass yields the averages, the
+# per-company flags, the flagged share and the flagged companies of every
+# screen.
+#
+# The averages of every screen are also kept sorted, so that the number of
+# companies flagged at any other threshold is a binary search into them;
+# sweeping a threshold across its range never re-averages the window. The
+# range and curve swept by the dashboard are computed once per screen.
+from typing import Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+from dashboard.cube import MetricCube, nanmean
+
+
+class Screen(NamedTuple):
+    """A risk screen: a company is flagged when its average `metric` is `operator` `threshold`."""
+    metric: str
+    operator: str
+    threshold: float
+    label: str
+
+
+# Screens evaluated by `RiskScreen`, keyed by metric
+RISK_SCREENS: Dict[str, Screen] = {
+    'mscore': Screen('mscore', '>', -1.78, 'Beneish M-score above -1.78: likely earnings manipulation'),
+    'zscore': Screen('zscore', '<', 1.81, 'Altman Z-score below 1.81: likely heading to bankruptcy'),
+    'fscore': Screen('fscore', '<', 4, 'Average Piotroski F-score below 4: weak financial position'),
+    'financial_distress': Screen('financial_distress', '>', 1.0,
+                                 'Probability of financial distress above 1%'),
+}
+
+
+class RiskScreen:
+    """
+    The risk screens evaluated on per-company averages over a trailing window of years.
+
+    Attributes:
+        screens (Dict[str, Screen]): The evaluated screens, keyed by metric.
+        years (np.ndarray): The years averaged over.
+        averages (pd.DataFrame): Average score per company (rows) and screen metric (columns).
+        flags (pd.DataFrame): Whether each company is flagged by each screen.
+        percentages (Dict[str, float]): Share of all companies flagged by each screen, rounded to a whole percent.
+        flagged (Dict[str, List[str]]): Flagged companies of each screen, in dataset order.
+    """
+
+    def __init__(self, cube: MetricCube, window: Optional[int] = None,
+                 screens: Dict[str, Screen] = RISK_SCREENS):
+        self.screens = {metric: screen for metric, screen in screens.items() if metric in cube.metric_index}
+        metrics = list(self.screens)
+        last = int(cube.years[-1])
+        years = cube.year_slice(None if window is None else last - window + 1, last)
+        self.years = cube.years[years]
+
+        # (company, screen) averages of the window, compared against every threshold at once
+        averages = nanmean(cube.values[:, [cube.metric_index[m] for m in metrics], years], axis=2)
+        thresholds = np.array([self.screens[m].threshold for m in metrics], dtype=float)
+        above = np.array([self.screens[m].operator == '>' for m in metrics])
+        flags = np.where(above, averages > thresholds, averages < thresholds)
+
+        companies = pd.Index(cube.companies, name='company')
+        self.averages = pd.DataFrame(averages, index=companies, columns=metrics)
+        self.flags = pd.DataFrame(flags, index=companies, columns=metrics)
+        self.percentages = {m: round(flags[:, i].sum() * 100. / len(companies), 0) for i, m in enumerate(metrics)}
+        self.flagged = {m: cube.companies[flags[:, i]].tolist() for i, m in enumerate(metrics)}
+
+        # Companies with an average, in ascending order of it, per screen
+        self._companies = cube.companies
+        self._order = {m: np.argsort(averages[:, i], kind='stable')[:(~np.isnan(averages[:, i])).sum()]
+                       for i, m in enumerate(metrics)}
+        self._sorted = {m: averages[self._order[m], i] for i, m in enumerate(metrics)}
+        self._sweeps: Dict[Tuple, Tuple[float, float, pd.DataFrame]] = {}
+
+    def _flagged_slice(self, metric: str, threshold) -> Tuple[np.ndarray, np.ndarray]:
+        # Bounds of the flagged companies in the sorted averages: the tail above a '>' threshold,
+        # the head below a '<' one
+        ordered = self._sorted[metric]
+        if self.screens[metric].operator == '>':
+            return np.searchsorted(ordered, threshold, side='right'), np.full(np.shape(threshold), len(ordered))
+        return np.zeros(np.shape(threshold), dtype=int), np.searchsorted(ordered, threshold, side='left')
+
+    def flagged_count(self, metric: str, threshold: float) -> int:
+        """
+        Returns the number of companies a screen flags at another threshold, with a binary search.
+
+        Parameters:
+        metric (str): The screen.
+        threshold (float): The threshold, compared with the screen's operator.
+
+        Returns:
+        int: Number of flagged companies.
+        """
+        start, stop = self._flagged_slice(metric, threshold)
+        return int(stop - start)
+
+    def companies_at(self, metric: str, threshold: float) -> List[str]:
+        """
+        Returns the companies a screen flags at another threshold.
+
+        Parameters:
+        metric (str): The screen.
+        threshold (float): The threshold, compared with the screen's operator.
+
+        Returns:
+        List[str]: The flagged companies, in dataset order.
+        """
+        start, stop = self._flagged_slice(metric, threshold)
+        return self._companies[np.sort(self._order[metric][start:stop])].tolist()
+
+    def sensitivity(self, metric: str, thresholds: Optional[Sequence[float]] = None, points: int = 101) -> pd.DataFrame:
+        """
+        Returns the share of companies a screen flags across a range of thresholds.
+
+        Parameters:
+        metric (str): The screen.
+        thresholds (Sequence[float], optional): Thresholds to evaluate; `points` evenly spaced
+            thresholds spanning the averages when omitted.
+        points (int): Number of thresholds when they are omitted. Default is 101.
+
+        Returns:
+        pd.DataFrame: Columns 'threshold', 'flagged' (number of companies) and 'percentage'
+        (share of all companies, like `percentages`).
+        """
+        if thresholds is None:
+            ordered = self._sorted[metric]
+            thresholds = np.linspace(ordered[0], ordered[-1], points) if len(ordered) else np.array([])
+        thresholds = np.asarray(thresholds, dtype=float)
+        start, stop = self._flagged_slice(metric, thresholds)
+        return pd.DataFrame({
+            'threshold': thresholds,
+            'flagged': stop - start,
+            'percentage': (stop - start) * 100. / len(self._companies),
+        })
+
+    def sweep(self, metric: str, points: int = 201,
+              percentiles: Tuple[float, float] = (2, 98)) -> Tuple[float, float, pd.DataFrame]:
+        """
+        Returns a threshold range of a screen and its sensitivity curve, computed once per screen.
+
+        The range spans the bulk of the averages and the screen's own threshold, so that a few
+        extreme averages do not flatten the curve.
+
+        Parameters:
+        metric (str): The screen.
+        points (int): Number of evenly spaced thresholds of the curve. Default is 201.
+        percentiles (Tuple[float, float]): Percentiles of the averages bounding the range,
+            rounded to 2 decimals. Default is (2, 98).
+
+        Returns:
+        Tuple[float, float, pd.DataFrame]: The lowest and highest threshold, and the `sensitivity` table
+        over the range. The table is shared between calls and must not be modified.
+        """
+        key = (metric, points, tuple(percentiles))
+        if key not in self._sweeps:
+            threshold = self.screens[metric].threshold
+            low, high = np.percentile(self._sorted[metric], percentiles).round(2) if len(self._sorted[metric]) \
+                else (threshold, threshold)
+            low, high = float(min(low, threshold)), float(max(high, threshold))
+            self._sweeps[key] = low, high, self.sensitivity(metric, np.linspace(low, high, points))
+        return self._sweeps[key]
+
+    def table(self, companies: Optional[Sequence[str]] = None) -> pd.DataFrame:
+        """
+        Returns the averages and flags of a set of companies.
+
+        Parameters:
+        companies (Sequence[str], optional): Companies to include; all companies when omitted.
+
+        Returns:
+        pd.DataFrame: A 'company' column, the average of every screen metric and a boolean
+        '<metric>_flag' column per screen, in dataset order.
+        """
+        table = self.averages.join(self.flags.add_suffix('_flag'))
+        if companies is not None:
+            table = table[table.index.isin(companies)]
+        return table.reset_index()
+
+    def companies_flagged(self, metrics: Sequence[str], companies: Optional[Sequence[str]] = None) -> List[str]:
+        """
+        Returns the companies flagged by any of several screens.
+
+        Parameters:
+        metrics (Sequence[str]): Screens to combine.
+        companies (Sequence[str], optional): Companies to consider; all companies when omitted.
+
+        Returns:
+        List[str]: The flagged companies, in dataset order.
+        """
+        flagged = self.flags[list(metrics)].any(axis=1)
+        if companies is not None:
+            flagged &= flagged.index.isin(companies)
+        return flagged.index[flagged].tolist()
@@ -0,0 +1,136 @@
+###############################################################################
+# Trailing-window statistics of every company and metric
+#
+# For each window length, the mean, standard deviation, minimum, maximum and
+# least-squares slope of every (company, metric) over the trailing years are
+# precomputed for every end year. Mean, standard deviation and slope come
+# from cumulative sums along the year axis of the cube (count, sum of x,
+# sum of x^2, sum of t, sum of t^2 and sum of t*x over the years with a
+# value), so each window is a difference of two entries. Minimum and maximum
+# are reduced over a strided sliding-window view of the year axis. Any
+# "trend over N years" question is then an index into these arrays.
+from typing import Dict, Iterable, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
+
+from dashboard.cube import MetricCube
+
+
+# Statistics computed for every window
+STATISTICS = ('mean', 'std', 'min', 'max', 'slope')
+
+# Window lengths in years precomputed when none are given
+DEFAULT_WINDOWS = (3, 5, 10)
+
+
+def _window_sums(values: np.ndarray, window: int) -> np.ndarray:
+    # Trailing sums over `window` years along the last axis, from a cumulative sum with a leading zero
+    pad = [(0, 0)] * (values.ndim - 1) + [(1, 0)]
+    cumulative = np.pad(np.cumsum(values, axis=-1), pad)
+    sums = np.zeros_like(cumulative[..., 1:])
+    sums[..., window - 1:] = cumulative[..., window:] - cumulative[..., :-window]
+    return sums
+
+def _window_extreme(values: np.ndarray, window: int, reducer) -> np.ndarray:
+    # Trailing min or max over `window` years along the last axis; `values` has its gaps
+    # already filled with the reducer's identity (+inf for min, -inf for max)
+    views = sliding_window_view(values, window, axis=-1)
+    result = np.full(values.shape, np.nan)
+    result[..., window - 1:] = reducer(views, axis=-1)
+    return result
+
+
+class RollingStats:
+    """
+    Trailing-window mean, standard deviation, minimum, maximum and slope of every company and metric.
+
+    A statistic is NaN where the window reaches back before the first year of the data or
+    holds too few values: one for mean, minimum and maximum, two for standard deviation
+    (sample, ddof=1) and slope (change per year).
+
+    Attributes:
+        windows (List[int]): The precomputed window lengths in years.
+        years (np.ndarray): Consecutive years of the cube, the possible window end years.
+    """
+
+    def __init__(self, cube: MetricCube, windows: Iterable[int] = DEFAULT_WINDOWS):
+        self._cube = cube
+        self.years = cube.years
+        self.windows = sorted({int(w) for w in windows if 1 <= w <= len(cube.years)})
+
+        values = cube.values
+        valid = ~np.isnan(values)
+        # Centering each series on its own mean keeps the sums of squares small; std and slope
+        # do not depend on the shift and the mean gets it added back
+        with np.errstate(invalid='ignore', divide='ignore'):
+            center = np.where(valid.any(axis=-1), np.nansum(values, axis=-1) / valid.sum(axis=-1), 0.)[..., None]
+        x = np.where(valid, values - center, 0.)
+        t = np.where(valid, np.arange(len(self.years), dtype=float), 0.)
+        lowest = np.where(valid, values, np.inf)
+        highest = np.where(valid, values, -np.inf)
+
+        self._stats: Dict[int, Dict[str, np.ndarray]] = {}
+        for window in self.windows:
+            n, sx, sxx, st, stt, stx = (_window_sums(a, window) for a in (valid.astype(float), x, x * x, t, t * t, t * x))
+            with np.errstate(invalid='ignore', divide='ignore'):
+                mean = sx / n
+                variance = np.maximum(sxx - sx * mean, 0.) / (n - 1)
+                slope = (n * stx - st * sx) / (n * stt - st * st)
+            full = np.arange(len(self.years)) >= window - 1
+            stats = {
+                'mean': np.where(full & (n >= 1), mean + center, np.nan),
+                'std': np.where(full & (n >= 2), np.sqrt(variance), np.nan),
+                'min': _window_extreme(lowest, window, np.min),
+                'max': _window_extreme(highest, window, np.max),
+                'slope': np.where(full & (n >= 2), slope, np.nan),
+            }
+            for name in ('min', 'max'):
+                stats[name][np.isinf(stats[name])] = np.nan
+            for array in stats.values():
+                array.flags.writeable = False
+            self._stats[window] = stats
+
+    def get(self, statistic: str, window: int, metric: Optional[str] = None,
+            year: Optional[int] = None) -> np.ndarray:
+        """
+        Returns one statistic of one window length.
+
+        Parameters:
+        statistic (str): One of `STATISTICS`.
+        window (int): A precomputed window length in years.
+        metric (str, optional): Restrict to one metric.
+        year (int, optional): Restrict to the window ending in this year.
+
+        Returns:
+        np.ndarray: A read-only view of shape (companies, metrics, years), with the metric
+        and/or year axes dropped when restricted.
+        """
+        values = self._stats[window][statistic]
+        if year is not None:
+            values = values[..., self._cube.year_position(year)]
+        if metric is not None:
+            values = values[:, self._cube.metric_index[metric]]
+        return values
+
+    def table(self, metric: str, window: int, year: Optional[int] = None,
+              companies: Optional[Sequence[str]] = None) -> pd.DataFrame:
+        """
+        Returns every statistic of one metric over the window ending in a year.
+
+        Parameters:
+        metric (str): The metric.
+        window (int): A precomputed window length in years.
+        year (int, optional): Last year of the window; the last year of the data when omitted.
+        companies (Sequence[str], optional): Companies to include; all companies when omitted.
+
+        Returns:
+        pd.DataFrame: A 'company' column followed by one column per statistic, in dataset order.
+        """
+        year = self.years[-1] if year is None else year
+        table = pd.DataFrame({name: self.get(name, window, metric, year) for name in STATISTICS})
+        table.insert(0, 'company', self._cube.companies)
+        if companies is not None:
+            table = table[table['company'].isin(companies)].reset_index(drop=True)
+        return table
@@ -0,0 +1,149 @@
+###############################################################################
+# Materialized sector and subsector rollups
+#
+# Summary statistics of every peer group (sector or subsector) for every
+# metric and year: the number of companies with a value, mean, median,
+# trimmed mean and a set of quantiles. Each group's block of the cube is
+# sorted once along the company axis (missing values last), and every
+# statistic is read from the sorted block with index arithmetic on the
+# per-(metric, year) counts, so all metrics and years of a group are
+# summarized together.
+#
+# Groups are summarized independently, so when the values of a few companies
+# change only the groups holding those companies are re-sorted and re-summarized.
+from typing import Dict, Iterable, List, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+from dashboard.cube import MetricCube
+
+
+# Quantiles materialized for every group, metric and year
+QUANTILES = (0.1, 0.25, 0.5, 0.75, 0.9)
+
+# Share of the values cut from each end for the trimmed mean
+TRIM = 0.1
+
+# Statistics of a group block, in the order they are stored
+STATISTICS = ['count', 'mean', 'median', 'trimmed_mean'] + [f'q{int(q * 100)}' for q in QUANTILES]
+
+
+def _summarize(block: np.ndarray, trim: float = TRIM) -> np.ndarray:
+    # Statistics of a (companies, metrics, years) block along the company axis, stacked as
+    # (len(STATISTICS), metrics, years); NaN where the group has no value
+    ordered = np.sort(block, axis=0)
+    count = (~np.isnan(block)).sum(axis=0)
+    cumulative = np.concatenate([np.zeros((1,) + block.shape[1:]), np.cumsum(np.nan_to_num(ordered), axis=0)])
+
+    def value_at(position: np.ndarray) -> np.ndarray:
+        # Linear interpolation between the sorted values around a fractional position, like np.quantile
+        lower = np.clip(np.floor(position).astype(int), 0, len(ordered) - 1)
+        upper = np.clip(lower + 1, 0, np.maximum(count - 1, 0))
+        fraction = position - lower
+        below = np.take_along_axis(ordered, lower[None], axis=0)[0]
+        above = np.take_along_axis(ordered, upper[None], axis=0)[0]
+        return below + (above - below) * fraction
+
+    def window_sum(start: np.ndarray, stop: np.ndarray) -> np.ndarray:
+        return (np.take_along_axis(cumulative, stop[None], axis=0)[0]
+                - np.take_along_axis(cumulative, start[None], axis=0)[0])
+
+    # Trimmed mean like scipy.stats.trim_mean: int(trim * n) values cut from each end
+    cut = np.floor(trim * count).astype(int)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean = window_sum(np.zeros_like(count), count) / count
+        trimmed = window_sum(cut, count - cut) / (count - 2 * cut)
+        stats = [count.astype(float), mean, value_at(0.5 * (count - 1)), trimmed]
+        stats += [value_at(q * (count - 1)) for q in QUANTILES]
+    stats = np.stack(stats)
+    stats[1:, count == 0] = np.nan
+    return stats
+
+
+class Rollups:
+    """
+    Count, mean, median, trimmed mean and quantiles of every sector or subsector, metric and year.
+
+    Attributes:
+        level (str): 'sector' or 'subsector'.
+        groups (List[str]): Group names, sorted.
+        values (np.ndarray): Statistics of shape (groups, len(STATISTICS), metrics, years).
+    """
+
+    def __init__(self, cube: MetricCube, level: str = 'sector'):
+        self.level = level
+        self._cube = cube
+        labels = getattr(cube, level + 's')
+        self.groups: List[str] = sorted(set(labels))
+        self._members: Dict[str, np.ndarray] = {g: np.flatnonzero(labels == g) for g in self.groups}
+        self._group_index = {g: i for i, g in enumerate(self.groups)}
+        self.values = np.full((len(self.groups), len(STATISTICS)) + cube.shape[1:], np.nan)
+        self._refresh(self.groups)
+
+    def _refresh(self, groups: Iterable[str]) -> None:
+        for group in groups:
+            self.values[self._group_index[group]] = _summarize(self._cube.values[self._members[group]])
+
+    def update(self, cube: MetricCube, companies: Sequence[str]) -> List[str]:
+        """
+        Brings the rollups up to date with a new version of the cube where only some companies changed.
+
+        Only the groups holding those companies are recomputed. A cube with different
+        metrics, years or group memberships is rolled up again from scratch.
+
+        Parameters:
+        cube (MetricCube): The updated cube.
+        companies (Sequence[str]): Companies whose values changed.
+
+        Returns:
+        List[str]: The groups that were recomputed.
+        """
+        labels = getattr(cube, self.level + 's')
+        same_layout = (cube.shape == self._cube.shape
+                       and np.array_equal(cube.metrics, self._cube.metrics)
+                       and np.array_equal(cube.years, self._cube.years)
+                       and np.array_equal(cube.companies, self._cube.companies)
+                       and np.array_equal(labels, getattr(self._cube, self.level + 's')))
+        if not same_layout:
+            self.__init__(cube, self.level)
+            return list(self.groups)
+        self._cube = cube
+        changed = sorted({labels[cube.company_index[c]] for c in companies if c in cube.company_index})
+        self._refresh(changed)
+        return changed
+
+    def get(self, statistic: str, metric: str, year: int) -> np.ndarray:
+        """
+        Returns one statistic of every group for one metric and year.
+
+        Parameters:
+        statistic (str): One of `STATISTICS`.
+        metric (str): The metric.
+        year (int): The year.
+
+        Returns:
+        np.ndarray: The statistic per group, in the order of `groups`.
+        """
+        return self.values[:, STATISTICS.index(statistic), self._cube.metric_index[metric],
+                           self._cube.year_position(year)]
+
+    def table(self, metric: str, year: int, groups: Optional[Sequence[str]] = None) -> pd.DataFrame:
+        """
+        Returns every statistic of every group for one metric and year.
+
+        Parameters:
+        metric (str): The metric.
+        year (int): The year.
+        groups (Sequence[str], optional): Groups to include; all groups when omitted.
+
+        Returns:
+        pd.DataFrame: The group column followed by one column per statistic, with 'count' as an integer.
+        """
+        table = pd.DataFrame(self.values[:, :, self._cube.metric_index[metric], self._cube.year_position(year)],
+                             columns=STATISTICS)
+        table['count'] = table['count'].astype(int)
+        table.insert(0, self.level, self.groups)
+        if groups is not None:
+            table = table[table[self.level].isin(groups)].reset_index(drop=True)
+        return table
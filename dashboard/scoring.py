@@ -0,0 +1,154 @@
+###############################################################################
+# Multi-factor composite scores
+#
+# A composite score blends standardized factors from three families:
+# valuation, quality and risk. Every factor is standardized once per year
+# across companies: winsorized at its 5th and 95th percentiles, turned into
+# a z-score, and oriented so that higher is always better (the sign is
+# flipped for lower-is-better metrics such as P/E or the M-score). Values
+# outside the ranked range of their metric, such as the negative EV/EBITDA
+# of a loss-making company, count as missing rather than as the cheapest.
+# The result is kept as a (year, company, factor) array with a presence mask.
+#
+# A set of weights then scores the whole universe with two matrix-vector
+# products: the weighted sum of the present factors, and the weight those
+# factors carry, which rescales companies with missing factors. Changing
+# the weights only repeats those two products.
+import warnings
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+from dashboard.cube import MetricCube
+from dashboard.leaderboard import metric_direction, ranked_values
+
+
+# Factors of every family
+FACTORS: Dict[str, List[str]] = {
+    'valuation': ['price_to_earnings_ratio', 'enterprise_value_to_ebitda'],
+    'quality': ['fscore', 'gross_profit_to_assets'],
+    'risk': ['zscore', 'mscore'],
+}
+
+# Percentiles the factors are winsorized at before standardizing
+WINSOR_LIMITS = (5, 95)
+
+# Smallest share of the total weight a company must have factors for to be scored
+MIN_COVERAGE = 0.5
+
+
+class CompositeScorer:
+    """
+    Standardized factor values of every year, and weighted composite scores over them.
+
+    Attributes:
+        families (Dict[str, List[str]]): Factors of every family, limited to metrics in the cube.
+        factors (List[str]): All factors, in the column order of the standardized arrays.
+        years (np.ndarray): Consecutive years of the cube.
+    """
+
+    def __init__(self, cube: MetricCube, families: Dict[str, List[str]] = FACTORS):
+        self._cube = cube
+        self.years = cube.years
+        self.families = {family: [m for m in metrics if m in cube.metric_index] for family, metrics in families.items()}
+        self.factors = [m for metrics in self.families.values() for m in metrics]
+
+        # (company, factor, year) values within their ranked range, winsorized per (factor, year) across companies
+        values = ranked_values(cube.values[:, [cube.metric_index[m] for m in self.factors], :], self.factors)
+        present = ~np.isnan(values)
+        with warnings.catch_warnings(), np.errstate(invalid='ignore', divide='ignore'):
+            # Factors without any value in a year are all-NaN slices; they stay NaN
+            warnings.simplefilter('ignore', RuntimeWarning)
+            low, high = np.nanpercentile(values, WINSOR_LIMITS, axis=0)
+            clipped = np.clip(values, low, high)
+            count = present.sum(axis=0)
+            mean = np.where(present, clipped, 0.).sum(axis=0) / count
+            deviation = np.where(present, clipped - mean, 0.)
+            std = np.sqrt((deviation * deviation).sum(axis=0) / count)
+            z = deviation / std
+        present &= (count >= 2) & (std > 0)
+
+        # Higher is better for every factor
+        sign = np.array([-1. if metric_direction(m) == 'min' else 1. for m in self.factors])
+        z = z * sign[:, None]
+
+        # (year, company, factor) layout, so that scoring one year is a matrix-vector product
+        self._z = np.ascontiguousarray(np.where(present, z, 0.).transpose(2, 0, 1))
+        self._present = np.ascontiguousarray(present.transpose(2, 0, 1)).astype(float)
+
+    def weights(self, family_weights: Dict[str, float]) -> np.ndarray:
+        """
+        Spreads family weights evenly over the factors of each family.
+
+        Parameters:
+        family_weights (Dict[str, float]): Non-negative weight of each family; missing families weigh 0.
+
+        Returns:
+        np.ndarray: Factor weights in the order of `factors`, summing to 1 (all zero if every weight is 0).
+        """
+        weights = np.array([family_weights.get(family, 0.) / len(metrics)
+                            for family, metrics in self.families.items() for _ in metrics], dtype=float)
+        weights = np.maximum(weights, 0.)
+        total = weights.sum()
+        return weights / total if total > 0 else weights
+
+    def scores(self, weights: np.ndarray, year: int) -> np.ndarray:
+        """
+        Returns the composite score of every company in one year.
+
+        The score is the weighted mean of the company's standardized factors, over the factors it
+        has; it is NaN when those factors carry less than `MIN_COVERAGE` of the total weight.
+
+        Parameters:
+        weights (np.ndarray): Factor weights in the order of `factors`, see `weights`; a
+            (factors, n) matrix scores n weightings at once.
+        year (int): The year.
+
+        Returns:
+        np.ndarray: Composite scores per company (per company and weighting for a weight matrix),
+        in standard deviations above the average.
+        """
+        y = self._cube.year_position(year)
+        coverage = self._present[y] @ weights
+        with np.errstate(invalid='ignore', divide='ignore'):
+            score = (self._z[y] @ weights) / coverage
+        covered = (coverage >= MIN_COVERAGE * weights.sum(axis=0)) & (coverage > 0)
+        return np.where(covered, score, np.nan)
+
+    def family_scores(self, year: int) -> pd.DataFrame:
+        """
+        Returns the equally weighted score of every family, per company, in one year.
+
+        Parameters:
+        year (int): The year.
+
+        Returns:
+        pd.DataFrame: One column per family, indexed like the companies of the cube.
+        """
+        return pd.DataFrame({family: self.scores(self.weights({family: 1.}), year) for family in self.families})
+
+    def rank(self, family_weights: Dict[str, float], year: int,
+             companies: Optional[Sequence[str]] = None) -> pd.DataFrame:
+        """
+        Ranks the companies by composite score.
+
+        Parameters:
+        family_weights (Dict[str, float]): Weight of each family.
+        year (int): The year.
+        companies (Sequence[str], optional): Companies to rank; all companies when omitted.
+
+        Returns:
+        pd.DataFrame: Columns 'rank', 'company', 'sector', 'score' and one score column per family,
+        best first; companies without a score are left out.
+        """
+        table = self.family_scores(year)
+        table.insert(0, 'score', self.scores(self.weights(family_weights), year))
+        table.insert(0, 'sector', self._cube.sectors)
+        table.insert(0, 'company', self._cube.companies)
+        keep = table['score'].notna()
+        if companies is not None:
+            keep &= table['company'].isin(companies)
+        table = table[keep].sort_values('score', ascending=False, kind='stable').reset_index(drop=True)
+        table.insert(0, 'rank', np.arange(1, len(table) + 1))
+        return table
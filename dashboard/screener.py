@@ -0,0 +1,272 @@
+###############################################################################
+# Stock screener expressions compiled to vectorized array operations
+#
+# A screen is a Python-like boolean expression over metric names, e.g.
+#
+#     price_to_earnings_ratio < 30 and zscore > 3 and yoy_revenue_growth > 10
+#
+# It is parsed once with `ast`, checked against a small grammar (metric
+# names, numbers, + - * /, comparisons, and/or/not, parentheses) and turned
+# into a tree of closures over NumPy arrays. Evaluating a screen for a year
+# reads one (company,) slice of the cube per referenced metric and combines
+# them with element-wise operations; no string is evaluated per row.
+#
+# Missing values follow three-valued logic: a comparison involving a
+# missing value is unknown, `not` keeps it unknown, `and`/`or` resolve it
+# where the other side decides, and a company passes only if the whole
+# screen is known to be true. Compiled screens are cached by their
+# normalized text, and results by (normalized text, year).
+import ast
+import difflib
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Callable, Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+from dashboard.cube import MetricCube
+
+
+# Screen results kept per screener before the least recently used is dropped
+DEFAULT_CACHE_ENTRIES = 256
+
+# Longest screen expression and deepest nesting of its syntax tree, so that a deeply nested
+# expression is rejected before it exhausts the recursion of the parser or the compiler
+MAX_EXPRESSION_LENGTH = 2000
+MAX_EXPRESSION_DEPTH = 50
+
+# Comparison and arithmetic operators of the screen language
+_COMPARISONS = {ast.Lt: np.less, ast.LtE: np.less_equal, ast.Gt: np.greater, ast.GtE: np.greater_equal,
+                ast.Eq: np.equal, ast.NotEq: np.not_equal}
+_ARITHMETIC = {ast.Add: np.add, ast.Sub: np.subtract, ast.Mult: np.multiply, ast.Div: np.true_divide}
+
+# An evaluator maps a metric lookup to a (company,) array: values for numeric
+# expressions, and 1.0 / 0.0 / NaN (true / false / unknown) for conditions
+Evaluator = Callable[[Callable[[str], np.ndarray]], np.ndarray]
+
+
+class ScreenError(ValueError):
+    """Raised for a screen expression that cannot be parsed or refers to unknown metrics."""
+
+
+class CompiledScreen(NamedTuple):
+    """A parsed screen: its normalized text, the metrics it reads and its evaluator."""
+    expression: str
+    metrics: Tuple[str, ...]
+    evaluate: Evaluator
+
+
+def _kleene_and(left: np.ndarray, right: np.ndarray) -> np.ndarray:
+    return np.where((left == 0) | (right == 0), 0., np.where(np.isnan(left) | np.isnan(right), np.nan, 1.))
+
+def _kleene_or(left: np.ndarray, right: np.ndarray) -> np.ndarray:
+    return np.where((left == 1) | (right == 1), 1., np.where(np.isnan(left) | np.isnan(right), np.nan, 0.))
+
+def _compile_node(node: ast.AST, metrics: List[str]) -> Tuple[str, Evaluator]:
+    # Returns the kind of the node ('number' or 'condition') and its evaluator
+    if isinstance(node, ast.Name):
+        metrics.append(node.id)
+        return 'number', lambda lookup, name=node.id: lookup(name)
+
+    if isinstance(node, ast.Constant) and isinstance(node.value, (int, float)) and not isinstance(node.value, bool):
+        return 'number', lambda lookup, value=float(node.value): value
+
+    if isinstance(node, ast.UnaryOp) and isinstance(node.op, (ast.USub, ast.UAdd)):
+        kind, operand = _compile_node(node.operand, metrics)
+        _expect(kind, 'number', node.operand)
+        sign = -1. if isinstance(node.op, ast.USub) else 1.
+        return 'number', lambda lookup: sign * operand(lookup)
+
+    if isinstance(node, ast.BinOp) and type(node.op) in _ARITHMETIC:
+        (left_kind, left), (right_kind, right) = _compile_node(node.left, metrics), _compile_node(node.right, metrics)
+        _expect(left_kind, 'number', node.left)
+        _expect(right_kind, 'number', node.right)
+        operator = _ARITHMETIC[type(node.op)]
+
+        def arithmetic(lookup):
+            with np.errstate(invalid='ignore', divide='ignore', over='ignore'):
+                result = operator(left(lookup), right(lookup))
+            # Division by zero has no meaningful value for screening
+            return np.where(np.isinf(result), np.nan, result)
+        return 'number', arithmetic
+
+    if isinstance(node, ast.Compare) and all(type(op) in _COMPARISONS for op in node.ops):
+        # Chained comparisons (1 < x < 3) are the conjunction of their links
+        operands = [_compile_node(n, metrics) for n in [node.left, *node.comparators]]
+        for (kind, _), child in zip(operands, [node.left, *node.comparators]):
+            _expect(kind, 'number', child)
+        links = [(operands[i][1], _COMPARISONS[type(op)], operands[i + 1][1]) for i, op in enumerate(node.ops)]
+
+        def compare(lookup):
+            result = None
+            for left, operator, right in links:
+                a, b = left(lookup), right(lookup)
+                with np.errstate(invalid='ignore'):
+                    link = np.where(np.isnan(a) | np.isnan(b), np.nan, operator(a, b).astype(float))
+                result = link if result is None else _kleene_and(result, link)
+            return result
+        return 'condition', compare
+
+    if isinstance(node, ast.BoolOp):
+        operands = [_compile_node(n, metrics) for n in node.values]
+        for (kind, _), child in zip(operands, node.values):
+            _expect(kind, 'condition', child)
+        combine = _kleene_and if isinstance(node.op, ast.And) else _kleene_or
+
+        def boolean(lookup):
+            result = operands[0][1](lookup)
+            for _, operand in operands[1:]:
+                result = combine(result, operand(lookup))
+            return result
+        return 'condition', boolean
+
+    if isinstance(node, ast.UnaryOp) and isinstance(node.op, ast.Not):
+        kind, operand = _compile_node(node.operand, metrics)
+        _expect(kind, 'condition', node.operand)
+        return 'condition', lambda lookup: 1. - operand(lookup)
+
+    raise ScreenError(f"Unsupported syntax in screen: '{ast.unparse(node)}'")
+
+def _depth(tree: ast.AST) -> int:
+    # Depth of a syntax tree, walked without recursion
+    deepest, stack = 0, [(tree, 1)]
+    while stack:
+        node, depth = stack.pop()
+        deepest = max(deepest, depth)
+        stack.extend((child, depth + 1) for child in ast.iter_child_nodes(node))
+    return deepest
+
+def _expect(kind: str, expected: str, node: ast.AST) -> None:
+    if kind != expected:
+        what = 'a number or metric' if expected == 'number' else 'a condition such as zscore > 3'
+        raise ScreenError(f"'{ast.unparse(node)}' should be {what}")
+
+@lru_cache(maxsize=DEFAULT_CACHE_ENTRIES)
+def compile_screen(expression: str) -> CompiledScreen:
+    """
+    Parses and compiles a screen expression.
+
+    Parameters:
+    expression (str): A boolean expression over metric names, numbers, + - * /,
+        comparisons (< <= > >= == !=), and/or/not and parentheses.
+
+    Returns:
+    CompiledScreen: The normalized expression, the metrics it reads and its evaluator.
+
+    Raises:
+    ScreenError: If the expression is empty, too long or too deeply nested, not valid syntax or not a condition.
+    """
+    if not expression.strip():
+        raise ScreenError('The screen is empty')
+    if len(expression) > MAX_EXPRESSION_LENGTH:
+        raise ScreenError(f'The screen is longer than {MAX_EXPRESSION_LENGTH} characters')
+    try:
+        tree = ast.parse(expression.strip(), mode='eval')
+        if _depth(tree) > MAX_EXPRESSION_DEPTH:
+            raise ScreenError(f'The screen is nested more than {MAX_EXPRESSION_DEPTH} levels deep')
+        metrics: List[str] = []
+        kind, evaluate = _compile_node(tree.body, metrics)
+        _expect(kind, 'condition', tree.body)
+        return CompiledScreen(ast.unparse(tree), tuple(dict.fromkeys(metrics)), evaluate)
+    except SyntaxError as error:
+        raise ScreenError(f'Invalid screen syntax: {error.msg}') from None
+    except (RecursionError, MemoryError):
+        raise ScreenError('The screen is too deeply nested') from None
+
+
+class Screener:
+    """
+    Evaluates screen expressions on one year of the cube, caching results by normalized expression.
+    """
+
+    def __init__(self, cube: MetricCube, max_entries: int = DEFAULT_CACHE_ENTRIES):
+        self._cube = cube
+        self._max_entries = max_entries
+        self._cache: 'OrderedDict[Tuple[str, int], np.ndarray]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    def compile(self, expression: str) -> CompiledScreen:
+        """
+        Compiles a screen and checks that every metric it reads exists.
+
+        Parameters:
+        expression (str): The screen expression.
+
+        Returns:
+        CompiledScreen: The compiled screen.
+
+        Raises:
+        ScreenError: If the expression is invalid or names an unknown metric.
+        """
+        screen = compile_screen(expression)
+        for metric in screen.metrics:
+            if metric not in self._cube.metric_index:
+                suggestions = difflib.get_close_matches(metric, list(self._cube.metrics), n=3)
+                hint = f"; did you mean {', '.join(suggestions)}?" if suggestions else ''
+                raise ScreenError(f"Unknown metric '{metric}'{hint}")
+        return screen
+
+    def screen(self, expression: str, year: int) -> np.ndarray:
+        """
+        Returns which companies pass a screen in one year.
+
+        Parameters:
+        expression (str): The screen expression.
+        year (int): The year whose metrics are screened.
+
+        Returns:
+        np.ndarray: Read-only boolean mask over the companies of the cube.
+
+        Raises:
+        ScreenError: If the expression is invalid or names an unknown metric.
+        KeyError: If the cube holds no such year.
+        """
+        screen = self.compile(expression)
+        y = self._cube.year_position(year)
+        key = (screen.expression, int(year))
+        with self._lock:
+            if key in self._cache:
+                self._cache.move_to_end(key)
+                return self._cache[key]
+
+        lookup = lambda metric: self._cube.values[:, self._cube.metric_index[metric], y]
+        passed = np.broadcast_to(screen.evaluate(lookup) == 1., (len(self._cube.companies),)).copy()
+        passed.flags.writeable = False
+
+        with self._lock:
+            self._cache[key] = passed
+            while len(self._cache) > self._max_entries:
+                self._cache.popitem(last=False)
+        return passed
+
+    def table(self, expression: str, year: int, companies: Optional[Sequence[str]] = None) -> pd.DataFrame:
+        """
+        Returns the companies passing a screen with the values of the metrics it reads.
+
+        Parameters:
+        expression (str): The screen expression.
+        year (int): The year whose metrics are screened.
+        companies (Sequence[str], optional): Companies to consider; all companies when omitted.
+
+        Returns:
+        pd.DataFrame: 'company', 'symbol' and 'sector' columns followed by one column per
+        referenced metric, in dataset order.
+
+        Raises:
+        ScreenError: If the expression is invalid or names an unknown metric.
+        KeyError: If the cube holds no such year.
+        """
+        screen = self.compile(expression)
+        passed = self.screen(expression, year)
+        if companies is not None:
+            passed = passed & np.isin(self._cube.companies, list(companies))
+        table: Dict[str, np.ndarray] = {
+            'company': self._cube.companies[passed],
+            'symbol': self._cube.symbols[passed],
+            'sector': self._cube.sectors[passed],
+        }
+        for metric in screen.metrics:
+            table[metric] = self._cube.get(metric, year)[passed] if passed.any() else np.array([])
+        return pd.DataFrame(table)
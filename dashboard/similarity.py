@@ -0,0 +1,121 @@
+###############################################################################
+# Peer similarity search over the standardized metric space
+#
+# In every year each company is a vector of its metrics, standardized
+# across companies (z-scores, clipped so a single extreme ratio cannot
+# dominate). Missing metrics are compared only where both companies have a
+# value: with Z the zero-filled z-scores and W the presence mask, the
+# similarity of a query q to every company is a handful of matrix-vector
+# products,
+#
+#     dot       = Z q            (over metrics both companies have)
+#     |z|^2     = (Z*Z) w_q      (each company's norm over the query's metrics)
+#     |q|^2     = W (q*q)        (the query's norm over each company's metrics)
+#
+# from which the cosine similarity and the (per-metric) Euclidean distance
+# follow. A query is O(companies x metrics) plus a partial sort for the top k.
+from typing import Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+from dashboard.cube import MetricCube
+
+
+# Similarity measures supported by `SimilarityIndex.query`
+MEASURES = ('cosine', 'euclidean')
+
+# z-scores are clipped to +/- this many standard deviations
+CLIP = 3.0
+
+# Fewest metrics two companies must share to be compared
+MIN_SHARED = 5
+
+
+class SimilarityIndex:
+    """
+    Standardized company x metric vectors of every year, for nearest-peer queries.
+
+    Attributes:
+        years (np.ndarray): Consecutive years of the cube.
+    """
+
+    def __init__(self, cube: MetricCube, clip: float = CLIP):
+        self._cube = cube
+        self.years = cube.years
+        values = cube.values
+        present = ~np.isnan(values)
+
+        # z-scores across companies of every (metric, year); constant or empty columns carry no information
+        with np.errstate(invalid='ignore', divide='ignore'):
+            count = present.sum(axis=0)
+            mean = np.where(present, values, 0.).sum(axis=0) / count
+            deviation = np.where(present, values - mean, 0.)
+            std = np.sqrt((deviation * deviation).sum(axis=0) / count)
+            z = np.clip(deviation / std, -clip, clip)
+        present &= (count >= 2) & (std > 0)
+
+        # (year, company, metric) layout, so that one year is a contiguous matrix
+        self._z = np.ascontiguousarray(np.where(present, z, 0.).transpose(2, 0, 1))
+        self._present = np.ascontiguousarray(present.transpose(2, 0, 1)).astype(float)
+        self._z2 = self._z * self._z
+
+    def query(self, company: str, year: int, k: int = 5, measure: str = 'cosine',
+              exclude: Optional[Sequence[str]] = None, min_shared: int = MIN_SHARED) -> pd.DataFrame:
+        """
+        Returns the companies most similar to one company in one year.
+
+        Parameters:
+        company (str): The company to find peers of.
+        year (int): The year whose metrics are compared.
+        k (int): Number of peers. Default is 5.
+        measure (str): 'cosine' (higher is closer) or 'euclidean' (root mean squared z-score
+            difference per shared metric, lower is closer). Default is 'cosine'.
+        exclude (Sequence[str], optional): Companies never suggested; the company itself always is.
+        min_shared (int): Fewest metrics a peer must share with the company. Default is 5.
+
+        Returns:
+        pd.DataFrame: Columns 'company', 'sector', 'subsector', the measure and 'shared_metrics',
+        closest first; empty when the company has no data in that year or is unknown.
+
+        Raises:
+        ValueError: If the measure is unknown.
+        KeyError: If the cube holds no such year.
+        """
+        if measure not in MEASURES:
+            raise ValueError(f'Unknown similarity measure {measure!r}, expected one of {MEASURES}')
+        columns = ['company', 'sector', 'subsector', measure, 'shared_metrics']
+        y = self._cube.year_position(year)
+        position = self._cube.company_index.get(company)
+        if position is None:
+            return pd.DataFrame(columns=columns)
+
+        z, present, z2 = self._z[y], self._present[y], self._z2[y]
+        q, q_present = z[position], present[position]
+        shared = present @ q_present
+        dot = z @ q
+        own_norm = z2 @ q_present
+        query_norm = present @ (q * q)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            if measure == 'cosine':
+                score = dot / np.sqrt(own_norm * query_norm)
+            else:
+                score = -np.sqrt(np.maximum(own_norm + query_norm - 2 * dot, 0.) / shared)
+
+        # Rank only eligible peers: enough shared metrics, a defined score, not excluded
+        eligible = (shared >= min_shared) & ~np.isnan(score)
+        eligible[position] = False
+        if exclude:
+            eligible[[self._cube.company_index[c] for c in exclude if c in self._cube.company_index]] = False
+        candidates = np.flatnonzero(eligible)
+        if len(candidates) > k:
+            candidates = candidates[np.argpartition(-score[candidates], k - 1)[:k]]
+        candidates = candidates[np.lexsort((candidates, -score[candidates]))]
+
+        return pd.DataFrame({
+            'company': self._cube.companies[candidates],
+            'sector': self._cube.sectors[candidates],
+            'subsector': self._cube.subsectors[candidates],
+            measure: score[candidates] if measure == 'cosine' else -score[candidates],
+            'shared_metrics': shared[candidates].astype(int),
+        }, columns=columns)